@@ -0,0 +1,35 @@
+"""transferring status
+
+Revision ID: 5f0e3c1a9b27
+Revises: d692cc93e2dd
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5f0e3c1a9b27"
+down_revision = "d692cc93e2dd"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A new enum value cannot be used in the transaction that adds it, and later revisions index on it
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TYPE transactionstatus ADD VALUE IF NOT EXISTS 'TRANSFERRING' AFTER 'ON_APPROVE'")
+
+
+def downgrade():
+    # Postgres cannot drop a value from an enum, so the type is recreated without it
+    op.execute("UPDATE transaction SET status = 'ON_APPROVE' WHERE status = 'TRANSFERRING'")
+    op.execute("ALTER TYPE transactionstatus RENAME TO transactionstatus_old")
+    op.execute(
+        "CREATE TYPE transactionstatus AS ENUM "
+        "('CREATED', 'ON_PAYMENT_WAIT', 'ON_APPROVE', 'EXPIRED', 'SUCCESS', 'CANCELED')"
+    )
+    op.execute(
+        "ALTER TABLE transaction ALTER COLUMN status TYPE transactionstatus "
+        "USING status::text::transactionstatus"
+    )
+    op.execute("DROP TYPE transactionstatus_old")
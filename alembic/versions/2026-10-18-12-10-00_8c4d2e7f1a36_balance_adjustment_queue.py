@@ -0,0 +1,72 @@
+"""balance adjustment queue
+
+Revision ID: 8c4d2e7f1a36
+Revises: 5f0e3c1a9b27
+Create Date: 2026-10-18 12:10:00.000000
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "8c4d2e7f1a36"
+down_revision = "5f0e3c1a9b27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "balanceadjustment",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("transaction_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("idempotency_key", sa.String(), nullable=False),
+        sa.Column("kind", sa.Enum("INCREASE", "REVERT_REDUCE", name="adjustmentkind"), nullable=False),
+        sa.Column("seller_email", sa.String(), nullable=False),
+        sa.Column("amount", sa.Numeric(precision=14, scale=6), nullable=False),
+        sa.Column(
+            "crypto_type",
+            postgresql.ENUM("ERC20", "ETH", name="cryptotype", create_type=False),
+            nullable=False,
+        ),
+        sa.Column(
+            "sell_type",
+            postgresql.ENUM("SELL", "BUY", name="selltype", create_type=False),
+            nullable=False,
+        ),
+        sa.Column(
+            "status",
+            sa.Enum("PENDING", "DONE", "FAILED", name="adjustmentstatus"),
+            nullable=False,
+        ),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("next_attempt_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("last_error", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("idempotency_key"),
+    )
+    op.create_index(
+        op.f("ix_balanceadjustment_transaction_id"),
+        "balanceadjustment",
+        ["transaction_id"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_balanceadjustment_pending",
+        "balanceadjustment",
+        ["next_attempt_at"],
+        unique=False,
+        postgresql_where=sa.text("status = 'PENDING'"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_balanceadjustment_pending", table_name="balanceadjustment")
+    op.drop_index(op.f("ix_balanceadjustment_transaction_id"), table_name="balanceadjustment")
+    op.drop_table("balanceadjustment")
+    sa.Enum(name="adjustmentstatus").drop(op.get_bind())
+    sa.Enum(name="adjustmentkind").drop(op.get_bind())
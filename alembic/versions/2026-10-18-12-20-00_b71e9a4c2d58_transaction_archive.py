@@ -0,0 +1,81 @@
+"""transaction archive
+
+Revision ID: b71e9a4c2d58
+Revises: 8c4d2e7f1a36
+Create Date: 2026-10-18 12:20:00.000000
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "b71e9a4c2d58"
+down_revision = "8c4d2e7f1a36"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "transactionarchive",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("initiator", sa.String(), nullable=True),
+        sa.Column("seller_wallet", sa.String(), nullable=True),
+        sa.Column("buyer_wallet", sa.String(), nullable=True),
+        sa.Column("seller_email", sa.String(), nullable=False),
+        sa.Column("buyer_email", sa.String(), nullable=False),
+        sa.Column("amount", sa.Numeric(precision=14, scale=6), nullable=False),
+        sa.Column(
+            "crypto_type",
+            postgresql.ENUM(name="cryptotype", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("fiat_amount", sa.Numeric(precision=14, scale=6), nullable=False),
+        sa.Column(
+            "fiat_type",
+            postgresql.ENUM(name="fiattype", create_type=False),
+            nullable=False,
+        ),
+        sa.Column(
+            "sell_type",
+            postgresql.ENUM(name="selltype", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("lot_id", sa.Integer(), nullable=False),
+        sa.Column(
+            "status",
+            postgresql.ENUM(name="transactionstatus", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("updated_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("closed_on", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("hash", sa.String(), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    for column in ["initiator", "seller_wallet", "buyer_wallet", "seller_email", "buyer_email"]:
+        op.create_index(op.f(f"ix_transactionarchive_{column}"), "transactionarchive", [column], unique=False)
+    op.create_index(op.f("ix_transactionarchive_hash"), "transactionarchive", ["hash"], unique=True)
+
+    op.create_index(
+        "ix_transaction_closed_on_terminal",
+        "transaction",
+        ["closed_on"],
+        unique=False,
+        postgresql_where=sa.text("status IN ('EXPIRED', 'SUCCESS', 'CANCELED')"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_transaction_closed_on_terminal", table_name="transaction")
+    op.execute(
+        "INSERT INTO transaction (id, initiator, seller_wallet, buyer_wallet, seller_email, buyer_email, "
+        "amount, crypto_type, fiat_amount, fiat_type, sell_type, lot_id, status, created_at, updated_at, "
+        "closed_on, hash) "
+        "SELECT id, initiator, seller_wallet, buyer_wallet, seller_email, buyer_email, amount, crypto_type, "
+        "fiat_amount, fiat_type, sell_type, lot_id, status, created_at, updated_at, closed_on, hash "
+        "FROM transactionarchive"
+    )
+    op.drop_table("transactionarchive")
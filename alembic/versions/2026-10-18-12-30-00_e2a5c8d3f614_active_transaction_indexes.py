@@ -0,0 +1,34 @@
+"""active transaction indexes
+
+Revision ID: e2a5c8d3f614
+Revises: b71e9a4c2d58
+Create Date: 2026-10-18 12:30:00.000000
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "e2a5c8d3f614"
+down_revision = "b71e9a4c2d58"
+branch_labels = None
+depends_on = None
+
+ACTIVE_PREDICATE = sa.text("status IN ('CREATED', 'ON_PAYMENT_WAIT', 'ON_APPROVE', 'TRANSFERRING')")
+
+
+def upgrade():
+    for column in ["buyer_email", "seller_email", "initiator"]:
+        op.create_index(
+            f"ix_transaction_{column}_active",
+            "transaction",
+            [column],
+            unique=False,
+            postgresql_where=ACTIVE_PREDICATE,
+        )
+
+
+def downgrade():
+    for column in ["initiator", "seller_email", "buyer_email"]:
+        op.drop_index(f"ix_transaction_{column}_active", table_name="transaction")
@@ -0,0 +1,44 @@
+"""transaction listing indexes
+
+Revision ID: 4d9b1f6e8a27
+Revises: e2a5c8d3f614
+Create Date: 2026-10-18 12:40:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "4d9b1f6e8a27"
+down_revision = "e2a5c8d3f614"
+branch_labels = None
+depends_on = None
+
+LISTING_INDEX_PREFIXES = [
+    [],
+    ["status"],
+    ["buyer_email"],
+    ["seller_email"],
+    ["buyer_email", "status"],
+    ["seller_email", "status"],
+]
+
+
+def upgrade():
+    for table in ["transaction", "transactionarchive"]:
+        # Superseded by the composite indexes leading with the same column
+        op.drop_index(f"ix_{table}_buyer_email", table_name=table)
+        op.drop_index(f"ix_{table}_seller_email", table_name=table)
+
+        for prefix in LISTING_INDEX_PREFIXES:
+            columns = prefix + ["created_at"]
+            op.create_index(f"ix_{table}_{'_'.join(columns)}", table, columns, unique=False)
+
+
+def downgrade():
+    for table in ["transactionarchive", "transaction"]:
+        for prefix in reversed(LISTING_INDEX_PREFIXES):
+            columns = prefix + ["created_at"]
+            op.drop_index(f"ix_{table}_{'_'.join(columns)}", table_name=table)
+
+        op.create_index(f"ix_{table}_seller_email", table, ["seller_email"], unique=False)
+        op.create_index(f"ix_{table}_buyer_email", table, ["buyer_email"], unique=False)
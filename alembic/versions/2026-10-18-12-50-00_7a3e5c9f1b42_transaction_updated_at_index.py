@@ -0,0 +1,22 @@
+"""transaction updated_at index
+
+Revision ID: 7a3e5c9f1b42
+Revises: 4d9b1f6e8a27
+Create Date: 2026-10-18 12:50:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "7a3e5c9f1b42"
+down_revision = "4d9b1f6e8a27"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_transaction_updated_at", "transaction", ["updated_at"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_transaction_updated_at", table_name="transaction")
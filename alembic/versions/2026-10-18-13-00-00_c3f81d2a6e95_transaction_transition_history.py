@@ -0,0 +1,56 @@
+"""transaction transition history
+
+Revision ID: c3f81d2a6e95
+Revises: 7a3e5c9f1b42
+Create Date: 2026-10-18 13:00:00.000000
+
+"""
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "c3f81d2a6e95"
+down_revision = "7a3e5c9f1b42"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "transactiontransition",
+        sa.Column("id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column("transaction_id", postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column(
+            "from_status",
+            postgresql.ENUM(name="transactionstatus", create_type=False),
+            nullable=True,
+        ),
+        sa.Column(
+            "to_status",
+            postgresql.ENUM(name="transactionstatus", create_type=False),
+            nullable=False,
+        ),
+        sa.Column("actor", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_transactiontransition_timeline",
+        "transactiontransition",
+        ["transaction_id", "created_at"],
+        unique=False,
+    )
+    op.create_index(
+        "ix_transactiontransition_exit",
+        "transactiontransition",
+        ["from_status", "created_at"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_transactiontransition_exit", table_name="transactiontransition")
+    op.drop_index("ix_transactiontransition_timeline", table_name="transactiontransition")
+    op.drop_table("transactiontransition")
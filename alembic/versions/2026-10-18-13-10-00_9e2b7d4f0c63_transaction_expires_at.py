@@ -0,0 +1,42 @@
+"""transaction expires_at
+
+Revision ID: 9e2b7d4f0c63
+Revises: c3f81d2a6e95
+Create Date: 2026-10-18 13:10:00.000000
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+from core.config import app_settings
+
+# revision identifiers, used by Alembic.
+revision = "9e2b7d4f0c63"
+down_revision = "c3f81d2a6e95"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("transaction", sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True))
+    op.add_column("transactionarchive", sa.Column("expires_at", sa.DateTime(timezone=True), nullable=True))
+    # Trades waiting for payment get the deadline their expiry task was scheduled with
+    op.execute(
+        sa.text(
+            "UPDATE transaction SET expires_at = created_at + make_interval(mins => :minutes) "
+            "WHERE status = 'ON_PAYMENT_WAIT'"
+        ).bindparams(minutes=app_settings.TRANSACTION_EXPIRE_TIME)
+    )
+    op.create_index(
+        "ix_transaction_expires_at_waiting",
+        "transaction",
+        ["expires_at"],
+        unique=False,
+        postgresql_where=sa.text("status = 'ON_PAYMENT_WAIT'"),
+    )
+
+
+def downgrade():
+    op.drop_index("ix_transaction_expires_at_waiting", table_name="transaction")
+    op.drop_column("transactionarchive", "expires_at")
+    op.drop_column("transaction", "expires_at")
@@ -0,0 +1,24 @@
+"""transaction lot_id index
+
+Revision ID: 5f8c2a7d1e39
+Revises: 9e2b7d4f0c63
+Create Date: 2026-10-18 13:20:00.000000
+
+"""
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "5f8c2a7d1e39"
+down_revision = "9e2b7d4f0c63"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index("ix_transaction_lot_id", "transaction", ["lot_id"], unique=False)
+    op.create_index("ix_transactionarchive_lot_id", "transactionarchive", ["lot_id"], unique=False)
+
+
+def downgrade():
+    op.drop_index("ix_transactionarchive_lot_id", table_name="transactionarchive")
+    op.drop_index("ix_transaction_lot_id", table_name="transaction")
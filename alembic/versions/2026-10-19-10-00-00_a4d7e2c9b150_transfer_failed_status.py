@@ -0,0 +1,61 @@
+"""transfer failed status
+
+Revision ID: a4d7e2c9b150
+Revises: 5f8c2a7d1e39
+Create Date: 2026-10-19 10:00:00.000000
+
+"""
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "a4d7e2c9b150"
+down_revision = "5f8c2a7d1e39"
+branch_labels = None
+depends_on = None
+
+# Columns of the transactionstatus type
+COLUMNS = {
+    "transaction": ["status"],
+    "transactionarchive": ["status"],
+    "transactiontransition": ["from_status", "to_status"],
+}
+
+
+def upgrade():
+    # Committed on its own: a new enum value cannot be used in the transaction that adds it
+    with op.get_context().autocommit_block():
+        op.execute(
+            "ALTER TYPE transactionstatus ADD VALUE IF NOT EXISTS 'TRANSFER_FAILED' AFTER 'TRANSFERRING'"
+        )
+
+
+def downgrade():
+    # Postgres cannot drop a value from an enum, so the type is recreated without it. Partial indexes
+    # comparing status against the old type are dropped meanwhile and recreated from their definitions.
+    connection = op.get_bind()
+    op.execute("UPDATE transaction SET status = 'CANCELED' WHERE status = 'TRANSFER_FAILED'")
+    op.execute("UPDATE transactionarchive SET status = 'CANCELED' WHERE status = 'TRANSFER_FAILED'")
+    op.execute("DELETE FROM transactiontransition WHERE 'TRANSFER_FAILED' IN (from_status, to_status)")
+    partial_indexes = connection.execute(
+        sa.text(
+            "SELECT indexname, indexdef FROM pg_indexes "
+            "WHERE tablename IN ('transaction', 'transactionarchive') AND indexdef LIKE '%WHERE%status%'"
+        )
+    ).all()
+    for name, _ in partial_indexes:
+        op.execute(f"DROP INDEX {name}")
+    op.execute("ALTER TYPE transactionstatus RENAME TO transactionstatus_old")
+    op.execute(
+        "CREATE TYPE transactionstatus AS ENUM "
+        "('CREATED', 'ON_PAYMENT_WAIT', 'ON_APPROVE', 'TRANSFERRING', 'EXPIRED', 'SUCCESS', 'CANCELED')"
+    )
+    for table, columns in COLUMNS.items():
+        for column in columns:
+            op.execute(
+                f"ALTER TABLE {table} ALTER COLUMN {column} TYPE transactionstatus "
+                f"USING {column}::text::transactionstatus"
+            )
+    op.execute("DROP TYPE transactionstatus_old")
+    for _, definition in partial_indexes:
+        op.execute(definition)
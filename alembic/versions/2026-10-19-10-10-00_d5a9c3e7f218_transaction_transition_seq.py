@@ -0,0 +1,44 @@
+"""transaction transition seq
+
+Revision ID: d5a9c3e7f218
+Revises: a4d7e2c9b150
+Create Date: 2026-10-19 10:10:00.000000
+
+"""
+import sqlalchemy as sa
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision = "d5a9c3e7f218"
+down_revision = "a4d7e2c9b150"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column("transactiontransition", sa.Column("seq", sa.BigInteger(), sa.Identity(), nullable=False))
+    # Existing rows are numbered in the order the timeline used to be read in
+    op.execute(
+        "UPDATE transactiontransition SET seq = ordered.seq FROM ("
+        "SELECT id, row_number() OVER (ORDER BY created_at, to_status) AS seq FROM transactiontransition"
+        ") AS ordered WHERE transactiontransition.id = ordered.id"
+    )
+    op.drop_index("ix_transactiontransition_timeline", table_name="transactiontransition")
+    op.create_index(
+        "ix_transactiontransition_timeline",
+        "transactiontransition",
+        ["transaction_id", "seq"],
+        unique=False,
+    )
+
+
+def downgrade():
+    op.drop_index("ix_transactiontransition_timeline", table_name="transactiontransition")
+    op.create_index(
+        "ix_transactiontransition_timeline",
+        "transactiontransition",
+        ["transaction_id", "created_at"],
+        unique=False,
+    )
+    op.drop_column("transactiontransition", "seq")
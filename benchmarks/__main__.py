@@ -0,0 +1,112 @@
+"""
+Micro-benchmarks of the per-trade serialization and model hot paths.
+
+Run from the repository root with the application on the path:
+
+    PYTHONPATH=src python -m benchmarks                      # run and print
+    PYTHONPATH=src python -m benchmarks --save out.json      # keep the results
+    PYTHONPATH=src python -m benchmarks --compare benchmarks/baseline.json
+
+--compare exits with 1 when a benchmark got slower than the baseline by more than
+--threshold. Timings are compared by their fastest measurement, the one least disturbed
+by other load. Compare only results taken on the same machine and Python version.
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+import timeit
+from typing import Any, Optional
+
+import fastapi
+import pydantic
+
+from benchmarks.fixtures import FIXTURE_SIZE
+from benchmarks.paths import BENCHMARKS
+
+
+def run(name: str, *, repeat: int, rounds: int) -> dict[str, float]:
+    per_round = BENCHMARKS[name]()
+    per_round()  # warm-up: imports, caches, validators
+    timings = timeit.repeat(per_round, repeat=repeat, number=rounds, timer=time.perf_counter)
+    per_op = [timing / rounds / FIXTURE_SIZE * 1e9 for timing in timings]
+    return {
+        "median_ns": statistics.median(per_op),
+        "min_ns": min(per_op),
+        "stdev_ns": statistics.stdev(per_op) if len(per_op) > 1 else 0.0,
+    }
+
+
+def environment() -> dict[str, str]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "pydantic": pydantic.VERSION,
+        "pydantic_compiled": str(pydantic.compiled),
+        "fastapi": fastapi.__version__,
+    }
+
+
+def compare(results: dict[str, Any], baseline: dict[str, Any], threshold: float) -> bool:
+    if baseline["environment"] != results["environment"]:
+        print(f"warning: baseline environment differs: {baseline['environment']}")
+
+    regressed = False
+    print(f"{'benchmark':<36}{'baseline ns':>14}{'current ns':>14}{'change':>10}")
+    for name, current in results["benchmarks"].items():
+        previous = baseline["benchmarks"].get(name)
+        if previous is None:
+            print(f"{name:<36}{'-':>14}{current['min_ns']:>14.0f}{'new':>10}")
+            continue
+        change = current["min_ns"] / previous["min_ns"] - 1
+        marker = ""
+        if change > threshold:
+            regressed = True
+            marker = "  slower"
+        print(f"{name:<36}{previous['min_ns']:>14.0f}{current['min_ns']:>14.0f}{change:>+10.1%}{marker}")
+    return not regressed
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description=__doc__.split("\n\n")[0])
+    parser.add_argument("names", nargs="*", help=f"benchmarks to run, all by default: {', '.join(BENCHMARKS)}")
+    parser.add_argument("--repeat", type=int, default=15, help="measurements per benchmark")
+    parser.add_argument("--rounds", type=int, default=3, help="passes over the fixture per measurement")
+    parser.add_argument("--save", metavar="PATH", help="write the results as JSON")
+    parser.add_argument("--compare", metavar="PATH", help="compare against saved results")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown, 0.15 is 15%%")
+    args = parser.parse_args(argv)
+
+    names = args.names or list(BENCHMARKS)
+    unknown = set(names) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    results: dict[str, Any] = {"environment": environment(), "fixture_size": FIXTURE_SIZE, "benchmarks": {}}
+    for name in names:
+        result = results["benchmarks"][name] = run(name, repeat=args.repeat, rounds=args.rounds)
+        print(
+            f"{name:<36}{result['min_ns']:>12.0f} ns/op"
+            f"  (median {result['median_ns']:.0f}, sd {result['stdev_ns']:.0f})"
+        )
+
+    if args.save:
+        with open(args.save, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+            file.write("\n")
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        print()
+        if not compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
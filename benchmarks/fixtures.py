@@ -0,0 +1,90 @@
+import datetime
+import os
+import random
+import uuid
+from decimal import Decimal
+from typing import Any
+
+# Settings are read at import time of the application modules; none of these are contacted
+for _name, _value in {
+    "SECRET_KEY": "benchmark",
+    "DATABASE_BACKEND": "sqlite",
+    "SQLITE_PATH": "/tmp/trade-benchmark.sqlite3",
+    "CRYPTO_SERVICE_API": "http://crypto/api/v1/",
+    "WALLET_SERVICE_API": "http://wallets/api/v1/",
+    "LOT_SERVICE_API": "http://lots/api/v1/",
+    "AUTH_SERVICE_API": "http://auth/api/v1/",
+    "REDIS_HOST": "localhost",
+    "BROKER_HOST": "redis://localhost:6379",
+    "TRANSACTION_EXPIRE_TIME": "15",
+}.items():
+    os.environ.setdefault(_name, _value)
+
+from db.models.transaction import (  # noqa: E402
+    CryptoType,
+    FiatType,
+    SellType,
+    Transaction,
+    TransactionStatus,
+)
+
+# Trades per benchmark round; a busy pod sees about this many creations per second
+FIXTURE_SIZE = 1000
+SEED = 20220606
+
+
+def _email(rng: random.Random) -> str:
+    return f"user{rng.randrange(100_000)}@example.com"
+
+
+def _wallet(rng: random.Random) -> str:
+    return "0x" + "".join(rng.choice("0123456789abcdef") for _ in range(40))
+
+
+def trade_payloads(size: int = FIXTURE_SIZE, seed: int = SEED) -> list[dict[str, Any]]:
+    """Bodies of `POST /trade/` as they arrive, before validation."""
+    rng = random.Random(seed)
+    return [
+        {
+            "seller_wallet": _wallet(rng),
+            "seller_email": _email(rng),
+            "amount": f"{rng.uniform(0.001, 5):.6f}",
+            "price": f"{rng.uniform(100_000, 1_500_000):.2f}",
+            "crypto_type": rng.choice(list(CryptoType)).value,
+            "fiat_type": rng.choice(list(FiatType)).value,
+            "sell_type": rng.choice(list(SellType)).value,
+            "lot_id": rng.randrange(1, 50_000),
+        }
+        for _ in range(size)
+    ]
+
+
+def transactions(size: int = FIXTURE_SIZE, seed: int = SEED) -> list[Transaction]:
+    """Fully populated, transient ORM transactions, like the ones returned after a commit."""
+    rng = random.Random(seed)
+    created_at = datetime.datetime(2022, 6, 6, tzinfo=datetime.timezone.utc)
+    result = []
+    for _ in range(size):
+        amount = Decimal(f"{rng.uniform(0.001, 5):.6f}")
+        result.append(
+            Transaction(
+                id=uuid.UUID(int=rng.getrandbits(128), version=4),
+                initiator=_email(rng),
+                seller_wallet=_wallet(rng),
+                buyer_wallet=_wallet(rng),
+                seller_email=_email(rng),
+                buyer_email=_email(rng),
+                amount=amount,
+                crypto_type=rng.choice(list(CryptoType)),
+                fiat_amount=(amount * Decimal(f"{rng.uniform(100_000, 1_500_000):.4f}")).quantize(
+                    Decimal(".0001")
+                ),
+                fiat_type=rng.choice(list(FiatType)),
+                sell_type=rng.choice(list(SellType)),
+                lot_id=rng.randrange(1, 50_000),
+                status=TransactionStatus.ON_PAYMENT_WAIT,
+                created_at=created_at + datetime.timedelta(seconds=rng.randrange(86_400)),
+                updated_at=created_at,
+            )
+        )
+    return result
@@ -0,0 +1,54 @@
+from typing import Any, Callable
+
+import orjson
+from fastapi.encoders import jsonable_encoder
+
+import schemas
+from benchmarks.fixtures import trade_payloads, transactions
+from crud.crud_transaction import CRUDTransaction
+
+# name -> setup returning the per-round callable; each round processes the whole fixture
+BENCHMARKS: dict[str, Callable[[], Callable[[], Any]]] = {}
+
+
+def benchmark(name: str) -> Callable[[Callable[[], Callable[[], Any]]], Callable[[], Callable[[], Any]]]:
+    def register(setup: Callable[[], Callable[[], Any]]) -> Callable[[], Callable[[], Any]]:
+        BENCHMARKS[name] = setup
+        return setup
+
+    return register
+
+
+@benchmark("transaction_create_validation")
+def transaction_create_validation() -> Callable[[], Any]:
+    """Request body validation of `POST /trade/`, EmailStr included."""
+    payloads = trade_payloads()
+    return lambda: [schemas.TransactionCreate.parse_obj(payload) for payload in payloads]
+
+
+@benchmark("transaction_create_encoding")
+def transaction_create_encoding() -> Callable[[], Any]:
+    """`jsonable_encoder` of the validated body when the trade's row is built."""
+    objs_in = [schemas.TransactionCreate.parse_obj(payload) for payload in trade_payloads()]
+    return lambda: [jsonable_encoder(obj_in) for obj_in in objs_in]
+
+
+@benchmark("transaction_data_quantization")
+def transaction_data_quantization() -> Callable[[], Any]:
+    """Enum coercion and Decimal quantization in `CRUDTransaction.create_transaction`."""
+    rows = [jsonable_encoder(schemas.TransactionCreate.parse_obj(payload)) for payload in trade_payloads()]
+    return lambda: [CRUDTransaction._prepare_transaction_data(dict(row)) for row in rows]
+
+
+@benchmark("transaction_response_from_orm")
+def transaction_response_from_orm() -> Callable[[], Any]:
+    """orm_mode conversion of a Transaction into the `schemas.Transaction` response."""
+    objs = transactions()
+    return lambda: [schemas.Transaction.from_orm(obj) for obj in objs]
+
+
+@benchmark("status_notification_payload")
+def status_notification_payload() -> Callable[[], Any]:
+    """Payload of `send_transaction_status_notification`: jsonable_encoder, then orjson."""
+    objs = transactions()
+    return lambda: [orjson.dumps(jsonable_encoder(obj, exclude_none=True)) for obj in objs]
@@ -1,6 +1,7 @@
 from fastapi import APIRouter
 
-from api.v1.endpoints import trade
+from api.v1.endpoints import internal, trade
 
 api_router = APIRouter()
 api_router.include_router(trade.router, tags=["Trades"], prefix="/trade")
+api_router.include_router(internal.router, tags=["Internal"], prefix="/internal/trade")
@@ -0,0 +1,39 @@
+from typing import Any, AsyncIterator
+
+import orjson
+from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import schemas
+from api.v1.trade_service import TradeService
+from core import dependencies
+
+# Service-to-service API of the lot and wallet services, not exposed to users
+router = APIRouter(dependencies=[Depends(dependencies.verify_internal_service)])
+
+
+@router.post(
+    "/transactions/lookup",
+    response_class=StreamingResponse,
+    responses={200: {"content": {"application/x-ndjson": {}}, "description": "TransactionSummary per line"}},
+)
+async def lookup_transactions(
+    *,
+    lookup: schemas.TransactionLookup,
+    db: AsyncSession = Depends(dependencies.get_session),
+    trade_service: TradeService = Depends(),
+) -> Any:
+    chunks = trade_service.lookup_transactions(db=db, lookup=lookup)
+
+    async def encode() -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            yield b"".join(
+                orjson.dumps(
+                    schemas.TransactionSummary.from_orm(transaction).dict(exclude_none=True), default=str
+                )
+                + b"\n"
+                for transaction in chunk
+            )
+
+    return StreamingResponse(encode(), media_type="application/x-ndjson")
@@ -1,13 +1,15 @@
+import datetime
 import uuid
-from typing import Any
+from typing import Any, Optional
 from uuid import UUID
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 
 import schemas
 from api.v1.trade_service import TradeService
 from core import dependencies
+from db.models.transaction import TransactionStatus
 from exceptions import NotFound
 
 router = APIRouter()
@@ -19,7 +21,7 @@ async def create_transaction(
     db: AsyncSession = Depends(dependencies.get_session),
     current_user_wallet: tuple[str, str, str] = Depends(dependencies.get_current_user_wallet),
     transaction_in: schemas.TransactionCreate,
-    trade_service: TradeService = Depends()
+    trade_service: TradeService = Depends(),
 ) -> Any:
     transaction = await trade_service.create_transaction(
         db=db, obj_in=transaction_in, active_user_wallet=current_user_wallet
@@ -27,17 +29,101 @@ async def create_transaction(
     return transaction
 
 
+@router.post("/batch", response_model=list[schemas.TransactionBatchItem])
+async def create_transactions(
+    *,
+    db: AsyncSession = Depends(dependencies.get_session),
+    current_user_wallet: tuple[str, str, str] = Depends(dependencies.get_current_user_wallet),
+    transactions_in: list[schemas.TransactionCreate],
+    trade_service: TradeService = Depends(),
+) -> Any:
+    return await trade_service.create_transactions(
+        db=db, objs_in=transactions_in, active_user_wallet=current_user_wallet
+    )
+
+
+@router.get("/active", response_model=list[schemas.Transaction])
+async def get_active_transactions(
+    *,
+    db: AsyncSession = Depends(dependencies.get_session),
+    current_user: dict[str, Any] = Depends(dependencies.get_current_user),
+    trade_service: TradeService = Depends(),
+) -> Any:
+    try:
+        email = current_user["user_id"]
+    except KeyError:
+        raise NotFound()
+
+    return await trade_service.get_active_transactions(db=db, email=email)
+
+
+@router.get("/active/awaiting", response_model=list[schemas.Transaction])
+async def get_awaiting_transactions(
+    *,
+    db: AsyncSession = Depends(dependencies.get_session),
+    current_user: dict[str, Any] = Depends(dependencies.get_current_user),
+    trade_service: TradeService = Depends(),
+) -> Any:
+    try:
+        email = current_user["user_id"]
+    except KeyError:
+        raise NotFound()
+
+    return await trade_service.get_awaiting_transactions(db=db, email=email)
+
+
+@router.get("/count", response_model=schemas.TransactionCount)
+async def count_transactions(
+    *,
+    filters: schemas.TransactionFilter = Depends(dependencies.get_transaction_filter),
+    db: AsyncSession = Depends(dependencies.get_session),
+    current_user_wallet: dict[str, Any] = Depends(dependencies.get_current_user),
+    trade_service: TradeService = Depends(),
+) -> Any:
+    try:
+        return await trade_service.count_transactions(
+            db=db, email=current_user_wallet["user_id"], role=current_user_wallet["role"], filters=filters
+        )
+    except KeyError:
+        raise NotFound()
+
+
+@router.get("/analytics/time_in_state", response_model=schemas.StateDuration)
+async def get_time_in_state(
+    *,
+    status: str = Query(..., regex=f"^({'|'.join(TransactionStatus.__members__)})$"),
+    since: Optional[datetime.datetime] = None,
+    until: Optional[datetime.datetime] = None,
+    db: AsyncSession = Depends(dependencies.get_session),
+    current_user_wallet: dict[str, Any] = Depends(dependencies.get_current_user),
+    trade_service: TradeService = Depends(),
+) -> Any:
+    try:
+        role = current_user_wallet["role"]
+    except KeyError:
+        raise NotFound()
+
+    return await trade_service.get_time_in_state(
+        db=db, role=role, status=TransactionStatus[status], since=since, until=until
+    )
+
+
 @router.get("/{offset}", response_model=list[schemas.Transaction])
 async def get_transactions(
     *,
     offset: int = 0,
+    filters: schemas.TransactionFilter = Depends(dependencies.get_transaction_filter),
     db: AsyncSession = Depends(dependencies.get_session),
     current_user_wallet: dict[str, Any] = Depends(dependencies.get_current_user),
-    trade_service: TradeService = Depends()
+    trade_service: TradeService = Depends(),
 ) -> Any:
     try:
         transactions = await trade_service.get_transactions(
-            db=db, email=current_user_wallet["user_id"], role=current_user_wallet["role"], offset=offset
+            db=db,
+            email=current_user_wallet["user_id"],
+            role=current_user_wallet["role"],
+            offset=offset,
+            filters=filters,
         )
     except NotFound:
         return []
@@ -53,7 +139,7 @@ async def get_certain_transaction(
     transaction_id: UUID = uuid.uuid4(),
     db: AsyncSession = Depends(dependencies.get_session),
     current_user_wallet: dict[str, Any] = Depends(dependencies.get_current_user),
-    trade_service: TradeService = Depends()
+    trade_service: TradeService = Depends(),
 ) -> Any:
     try:
         transaction = await trade_service.get_certain_transaction(
@@ -68,6 +154,24 @@ async def get_certain_transaction(
     return transaction
 
 
+@router.get("/transaction/{transaction_id}/timeline", response_model=list[schemas.TransactionTransition])
+async def get_transaction_timeline(
+    *,
+    transaction_id: UUID,
+    db: AsyncSession = Depends(dependencies.get_session),
+    current_user_wallet: dict[str, Any] = Depends(dependencies.get_current_user),
+    trade_service: TradeService = Depends(),
+) -> Any:
+    try:
+        email, role = current_user_wallet["user_id"], current_user_wallet["role"]
+    except KeyError:
+        raise NotFound()
+
+    return await trade_service.get_transaction_timeline(
+        db=db, transaction_id=transaction_id, email=email, role=role
+    )
+
+
 @router.post("/approve_payment/{trade_id}", response_model=schemas.Transaction)
 async def approve_payment(
     trade_id: UUID,
@@ -1,5 +1,8 @@
+import asyncio
 import datetime
+import uuid
 from decimal import Decimal
+from typing import Any, AsyncIterator, Optional
 from urllib.parse import urljoin
 from uuid import UUID
 
@@ -10,39 +13,91 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.requests import Request
 
 import crud
-from core.celery_app import set_transaction_expire_timer
+import schemas
+from core import upstream
+from core.celery_app import process_balance_adjustments, transfer_on_success
+from core.compensation import (
+    is_ambiguous_failure,
+    reduce_idempotency_key,
+    stage_balance_restore,
+)
 from core.config import app_settings
-from core.dependencies import get_async_client, send_transaction_status_notification
+from core.dependencies import (
+    get_async_client,
+    get_lot_cache,
+    get_reservations,
+    send_transaction_status_notification,
+    send_transaction_status_notifications,
+)
 from core.logger_config import service_logger
-from db.models.transaction import CryptoType, Transaction, TransactionStatus
+from core.lot_cache import LotCache
+from core.reservations import ReservationLedger
+from core.tracing import traced_methods
+from core.wallets import get_p2p_wallet_id, reduce_p2p_balance
+from db.instrumentation import tagged_methods
+from db.models.balance_adjustment import AdjustmentKind
+from db.models.transaction import Transaction, TransactionStatus
+from db.models.transaction_transition import SYSTEM_ACTOR, TransactionTransition
 from exceptions import (
     AccessDenied,
     APIException,
+    BatchTooLargeException,
+    LookupTooLargeException,
+    LotMismatchException,
+    LotOversubscribedException,
     NotFound,
+    SomethingWentWrongException,
     TradeForYourselfException,
     TransactionInitiatorException,
     TransactionPaymentTimeExpired,
     TransactionStatusPermitted,
 )
-from schemas import TransactionCreate
-from schemas.transaction import SellType, TransactionUpdate
-
-
+from schemas import (
+    LotSnapshot,
+    StateDuration,
+    TransactionBatchItem,
+    TransactionCount,
+    TransactionCreate,
+    TransactionFilter,
+    TransactionLookup,
+)
+from schemas.transaction import CountMode, SellType, TransactionUpdate
+
+
+# Private helpers calling the wallet and lot services or Redis get spans of their own
+@traced_methods(
+    "trade_service",
+    private=(
+        "_is_balance_enough",
+        "_get_seller_id",
+        "_reduce_seller_wallet_balance",
+        "_price_from_lot",
+        "_reserve_trade",
+    ),
+)
+@tagged_methods
 class TradeService:
     def __init__(
         self,
         request: Request,
         async_client: httpx.AsyncClient = Depends(get_async_client),
+        lot_cache: LotCache = Depends(get_lot_cache),
+        reservations: ReservationLedger = Depends(get_reservations),
     ):
         self.request = request
         self._async_client = async_client
+        self._lot_cache = lot_cache
+        self._reservations = reservations
+        # Wallet ids resolved during this request, shared by the trades of a batch
+        self._wallet_ids: dict[str, asyncio.Task[str]] = {}
 
     async def _is_balance_enough(
         self, amount: Decimal, blockchain_id: str, crypto_type: str, sell_type: str
     ) -> bool:
         balance_url: str = "amountToSell" if sell_type == "sell" else "amountToBuy"
 
-        response = await self._async_client.get(
+        response = await upstream.get(
+            self._async_client,
             urljoin(
                 app_settings.WALLET_SERVICE_API,
                 f"/api/v1/wallets/{crypto_type}/{blockchain_id}/p2p/{balance_url}",
@@ -60,96 +115,273 @@ class TradeService:
         return response_data >= amount
 
     async def _get_seller_id(self, seller_email: str) -> str:
-        response = await self._async_client.get(
-            urljoin(
-                app_settings.WALLET_SERVICE_API,
-                f"/api/v1/wallets/eth/email/{seller_email}/p2p",
-            ),
-        )
+        task = self._wallet_ids.get(seller_email)
+        if task is None:
+            task = self._wallet_ids[seller_email] = asyncio.create_task(
+                get_p2p_wallet_id(self._async_client, seller_email)
+            )
+        return await task
 
-        service_logger.info(f"Get Seller ID status code: {response.status_code}; Text: {response.text}")
+    async def _reduce_seller_wallet_balance(
+        self, db: AsyncSession, transaction: Transaction, blockchain_id: str, sell_type: str
+    ) -> None:
+        """
+        Reserves the trade amount on the seller's wallet. If that fails the trade is canceled, and
+        when the wallet service may have applied the reduce anyway, reverting it is queued.
+        """
+        try:
+            await reduce_p2p_balance(
+                self._async_client,
+                amount=transaction.amount,
+                blockchain_id=blockchain_id,
+                crypto_type=transaction.crypto_type.value,
+                sell_type=sell_type,
+                idempotency_key=reduce_idempotency_key(transaction.id),
+            )
+        except Exception as e:
+            ambiguous = is_ambiguous_failure(e)
+            if ambiguous:
+                stage_balance_restore(db, transaction, kind=AdjustmentKind.REVERT_REDUCE)
 
-        response.raise_for_status()
+            transaction_obj = TransactionUpdate(
+                status=TransactionStatus.CANCELED, closed_on=datetime.datetime.now()
+            )
+            await crud.transactions.update(
+                db=db, db_obj=transaction, obj_in=transaction_obj, actor=SYSTEM_ACTOR
+            )
 
-        response_data = response.json()
+            if ambiguous:
+                process_balance_adjustments.delay()
+            raise
 
-        return response_data["id"]
+    @staticmethod
+    def _validate_against_lot(obj_in: TransactionCreate, lot: LotSnapshot) -> None:
+        if (
+            lot.owner_email != obj_in.seller_email
+            or lot.lot_type != obj_in.sell_type
+            or lot.crypto_type != obj_in.crypto_type
+            or lot.fiat_type != obj_in.fiat_type
+            or not lot.min_limit <= obj_in.amount <= lot.max_limit
+            or obj_in.amount > lot.supply
+        ):
+            raise LotMismatchException()
 
-    async def _increase_seller_wallet_balance(
-        self, amount: Decimal, blockchain_id: str, crypto_type: str, sell_type: str
-    ) -> None:
-        balance_increase_url: str = "increaseToSell" if sell_type == "sell" else "increaseToBuy"
+    async def _price_from_lot(self, obj_in: TransactionCreate) -> tuple[TransactionCreate, LotSnapshot]:
+        """
+        Validates a trade against the cached lot snapshot and prices it from the lot.
+        A mismatch is re-checked once against a fresh snapshot before the trade is rejected, unless
+        the cached one is younger than LOT_CACHE_REFRESH_FLOOR.
+        """
+        lot = await self._lot_cache.get(obj_in.lot_id)
 
-        response = await self._async_client.put(
-            urljoin(
-                app_settings.WALLET_SERVICE_API,
-                f"/api/v1/wallets/{crypto_type}/p2p/{balance_increase_url}",
-            ),
-            json={"walletId": blockchain_id, "amount": float(amount)},  # type: ignore
-            headers={"Content-Type": "application/json"},
-        )
+        try:
+            self._validate_against_lot(obj_in, lot)
+        except LotMismatchException:
+            lot = await self._lot_cache.refresh(obj_in.lot_id)
+            self._validate_against_lot(obj_in, lot)
 
-        service_logger.info(
-            f"Increase seller wallet balance status code: {response.status_code}; Text: {response.text}"
-        )
+        return obj_in.copy(update={"price": lot.price}), lot
 
-        response.raise_for_status()
+    async def _reserve_trade(
+        self, obj_in: TransactionCreate, active_user_wallet: tuple[str, str, str]
+    ) -> tuple[TransactionCreate, UUID]:
+        """
+        Validates and prices a trade and reserves its amount on the lot.
+        :return: Priced trade and the id the reservation was made under
+        """
+        if obj_in.seller_email == active_user_wallet[2] or obj_in.seller_wallet == active_user_wallet[1]:
+            raise TradeForYourselfException()
 
-    async def _reduce_seller_wallet_balance(
-        self, amount: Decimal, blockchain_id: str, crypto_type: str, sell_type: str
-    ) -> None:
-        balance_reduce_url: str = "reduceToSell" if sell_type == "sell" else "reduceToBuy"
+        obj_in, lot = await self._price_from_lot(obj_in)
 
-        response = await self._async_client.put(
-            urljoin(app_settings.WALLET_SERVICE_API, f"/api/v1/wallets/{crypto_type}/p2p/{balance_reduce_url}"),
-            json={"walletId": blockchain_id, "amount": float(amount)},  # type: ignore
-            headers={"Content-Type": "application/json"},
-        )
+        trade_id = uuid.uuid4()
 
-        service_logger.info(
-            f"Reduce seller wallet balance status code: {response.status_code}; Text: {response.text}"
-        )
+        if not await self._reservations.reserve(
+            trade_id, lot_id=lot.id, amount=obj_in.amount, limit=lot.supply
+        ):
+            raise LotOversubscribedException()
 
-        response.raise_for_status()
+        return obj_in, trade_id
+
+    async def _transaction_data(
+        self, obj_in: TransactionCreate, active_user_wallet: tuple[str, str, str], trade_id: UUID
+    ) -> tuple[dict[str, Any], str]:
+        """
+        Builds the row of a reserved trade and checks the seller's balance, releasing the
+        reservation if the trade can't go ahead.
+        :return: Transaction data and the seller's wallet id
+        """
+        try:
+            if obj_in.sell_type == SellType.SELL:
+                return await self._sell_transaction_data(
+                    obj_in=obj_in, buyer_wallet=active_user_wallet, trade_id=trade_id
+                )
+            return await self._buy_transaction_data(
+                obj_in=obj_in, seller_wallet=active_user_wallet, trade_id=trade_id
+            )
+        except Exception:
+            await self._reservations.release(trade_id)
+            raise
 
     async def create_transaction(
         self, db: AsyncSession, *, obj_in: TransactionCreate, active_user_wallet: tuple[str, str, str]
     ) -> Transaction:
-        if obj_in.seller_email == active_user_wallet[2] or obj_in.seller_wallet == active_user_wallet[1]:
-            raise TradeForYourselfException()
+        obj_in, trade_id = await self._reserve_trade(obj_in, active_user_wallet)
+        obj_in_data, seller_wallet_id = await self._transaction_data(obj_in, active_user_wallet, trade_id)
 
-        if obj_in.sell_type == SellType.SELL:
-            transaction = await self._create_sell_transaction(
-                db, obj_in=obj_in, buyer_wallet=active_user_wallet
+        try:
+            transaction = await crud.transactions.create_transaction(
+                db=db, transaction_data=obj_in_data, actor=active_user_wallet[2]
             )
-        else:
-            transaction = await self._create_buy_transaction(
-                db, obj_in=obj_in, seller_wallet=active_user_wallet
+            await self._reduce_seller_wallet_balance(
+                db, transaction, blockchain_id=seller_wallet_id, sell_type=obj_in.sell_type.value
             )
+        except Exception:
+            await self._reservations.release(trade_id)
+            raise
+        service_logger.info("Created transaction successfully")
 
         transaction_obj = TransactionUpdate(status=TransactionStatus.ON_PAYMENT_WAIT)
-        set_transaction_expire_timer.apply_async(
-            args=(str(transaction.id),),
-            eta=(datetime.datetime.now() + datetime.timedelta(minutes=app_settings.TRANSACTION_EXPIRE_TIME)),
-        )
 
-        transaction = await crud.transactions.update(db=db, db_obj=transaction, obj_in=transaction_obj)
+        transaction = await crud.transactions.update(
+            db=db, db_obj=transaction, obj_in=transaction_obj, actor=active_user_wallet[2]
+        )
 
         await send_transaction_status_notification(transaction)
 
         return transaction
 
-    async def _create_sell_transaction(
-        self, db: AsyncSession, *, obj_in: TransactionCreate, buyer_wallet: tuple[str, str, str]
-    ) -> Transaction:
+    async def create_transactions(
+        self, db: AsyncSession, *, objs_in: list[TransactionCreate], active_user_wallet: tuple[str, str, str]
+    ) -> list[TransactionBatchItem]:
         """
-        Creates a Transaction for a sell from a sell lot.
+        Creates a batch of trades. Trades are checked and reserved concurrently, inserted and
+        moved to ON_PAYMENT_WAIT together, and each one succeeds or fails on its own.
         :param db: Database Session instance
+        :param objs_in: Transaction Schemes
+        :param active_user_wallet: Wallet of the user creating the trades
+        :return: Outcome per trade, in request order
+        """
+        if len(objs_in) > app_settings.BATCH_CREATE_MAX_SIZE:
+            raise BatchTooLargeException()
+
+        semaphore = asyncio.Semaphore(app_settings.BATCH_CREATE_CONCURRENCY)
+        results: list[TransactionBatchItem] = [
+            TransactionBatchItem(index=index) for index in range(len(objs_in))
+        ]
+
+        async def prepare(obj_in: TransactionCreate) -> tuple[dict[str, Any], str]:
+            async with semaphore:
+                obj_in, trade_id = await self._reserve_trade(obj_in, active_user_wallet)
+                return await self._transaction_data(obj_in, active_user_wallet, trade_id)
+
+        prepared: list[tuple[int, dict[str, Any], str]] = []
+        for index, outcome in enumerate(
+            await asyncio.gather(*(prepare(obj_in) for obj_in in objs_in), return_exceptions=True)
+        ):
+            if isinstance(outcome, BaseException):
+                results[index].error = self._batch_error(outcome)
+            else:
+                prepared.append((index, outcome[0], outcome[1]))
+
+        if not prepared:
+            return results
+
+        try:
+            created = await crud.transactions.create_transactions(
+                db,
+                transactions_data=[obj_in_data for _, obj_in_data, _ in prepared],
+                actor=active_user_wallet[2],
+            )
+        except Exception:
+            for _, obj_in_data, _ in prepared:
+                await self._reservations.release(obj_in_data["id"])
+            raise
+
+        created_by_id = {transaction.id: transaction for transaction in created}
+        transactions = [created_by_id[obj_in_data["id"]] for _, obj_in_data, _ in prepared]
+
+        async def reduce(transaction: Transaction, seller_wallet_id: str) -> None:
+            async with semaphore:
+                await reduce_p2p_balance(
+                    self._async_client,
+                    amount=transaction.amount,
+                    blockchain_id=seller_wallet_id,
+                    crypto_type=transaction.crypto_type.value,
+                    sell_type=transaction.sell_type.value,
+                    idempotency_key=reduce_idempotency_key(transaction.id),
+                )
+
+        reduced = await asyncio.gather(
+            *(reduce(transaction, wallet_id) for transaction, (_, _, wallet_id) in zip(transactions, prepared)),
+            return_exceptions=True,
+        )
+
+        succeeded: list[tuple[int, Transaction]] = []
+        failed: list[Transaction] = []
+        restores_staged = False
+        for transaction, (index, _, _), outcome in zip(transactions, prepared, reduced):
+            if isinstance(outcome, BaseException):
+                results[index].error = self._batch_error(outcome)
+                failed.append(transaction)
+                if is_ambiguous_failure(outcome):
+                    stage_balance_restore(db, transaction, kind=AdjustmentKind.REVERT_REDUCE)
+                    restores_staged = True
+            else:
+                succeeded.append((index, transaction))
+
+        if failed:
+            await crud.transactions.update_status(
+                db,
+                ids=[transaction.id for transaction in failed],
+                obj_in=TransactionUpdate(status=TransactionStatus.CANCELED, closed_on=datetime.datetime.now()),
+                from_status=TransactionStatus.CREATED,
+                actor=SYSTEM_ACTOR,
+            )
+            for transaction in failed:
+                await self._reservations.release(transaction.id)
+            if restores_staged:
+                process_balance_adjustments.delay()
+
+        if not succeeded:
+            return results
+
+        waiting = await crud.transactions.update_status(
+            db,
+            ids=[transaction.id for _, transaction in succeeded],
+            obj_in=TransactionUpdate(status=TransactionStatus.ON_PAYMENT_WAIT),
+            from_status=TransactionStatus.CREATED,
+            actor=active_user_wallet[2],
+        )
+        service_logger.info(f"Created {len(waiting)} of {len(objs_in)} transactions in a batch")
+
+        waiting_by_id = {transaction.id: transaction for transaction in waiting}
+        for index, transaction in succeeded:
+            results[index].transaction = schemas.Transaction.from_orm(waiting_by_id[transaction.id])
+
+        await send_transaction_status_notifications(waiting)
+
+        return results
+
+    @staticmethod
+    def _batch_error(exception: BaseException) -> APIException.Schema:
+        if not isinstance(exception, APIException):
+            service_logger.warning(f"Batch trade creation failed with {exception!r}")
+            exception = SomethingWentWrongException()
+        return APIException.Schema(code=exception.default_code, detail=exception.default_detail)
+
+    async def _sell_transaction_data(
+        self, *, obj_in: TransactionCreate, buyer_wallet: tuple[str, str, str], trade_id: UUID
+    ) -> tuple[dict[str, Any], str]:
+        """
+        Builds a Transaction for a sell from a sell lot.
         :param obj_in: Transaction Scheme
         :param buyer_wallet: The wallet address of a buyer client
-        :return: Transaction object
+        :param trade_id: Id the reservation for the trade was made under
+        :return: Transaction data and the seller's wallet id
         """
         obj_in_data = jsonable_encoder(obj_in)
+        obj_in_data["id"] = trade_id
 
         obj_in_data["buyer_wallet"] = buyer_wallet[1]
         obj_in_data["buyer_email"] = buyer_wallet[2]
@@ -161,20 +393,17 @@ class TradeService:
         if not await self._is_balance_enough(obj_in.amount, seller_wallet_id, obj_in.crypto_type.value, "sell"):
             raise APIException(detail="Not enough balance for trade")
 
-        transaction = await crud.transactions.create_transaction(db=db, transaction_data=obj_in_data)
-        await self._reduce_seller_wallet_balance(
-            amount=obj_in.amount,
-            blockchain_id=seller_wallet_id,
-            crypto_type=obj_in.crypto_type.value,
-            sell_type="sell",
-        )
-        service_logger.info("Created transaction successfully")
-        return transaction
+        return obj_in_data, seller_wallet_id
 
-    async def _create_buy_transaction(
-        self, db: AsyncSession, *, obj_in: TransactionCreate, seller_wallet: tuple[str, str, str]
-    ) -> Transaction:
+    async def _buy_transaction_data(
+        self,
+        *,
+        obj_in: TransactionCreate,
+        seller_wallet: tuple[str, str, str],
+        trade_id: UUID,
+    ) -> tuple[dict[str, Any], str]:
         obj_in_data = jsonable_encoder(obj_in)
+        obj_in_data["id"] = trade_id
         obj_in_data["buyer_wallet"] = obj_in_data["seller_wallet"]
         obj_in_data["buyer_email"] = obj_in_data["seller_email"]
 
@@ -186,16 +415,28 @@ class TradeService:
         if not await self._is_balance_enough(obj_in.amount, seller_wallet[0], obj_in.crypto_type.value, "buy"):
             raise APIException(detail="Not enough balance for trade")
 
-        transaction = await crud.transactions.create_transaction(db=db, transaction_data=obj_in_data)
+        return obj_in_data, seller_wallet[0]
 
-        await self._reduce_seller_wallet_balance(
-            amount=obj_in.amount,
-            blockchain_id=seller_wallet[0],
-            crypto_type=obj_in.crypto_type.value,
-            sell_type="buy",
-        )
+    async def _expire_if_overdue(self, db: AsyncSession, transaction: Transaction) -> Transaction:
+        """
+        Expires a trade past its payment deadline that the sweeper has not got to yet.
+        If another session is expiring it right now, the trade is returned still overdue.
+        """
+        if not transaction.is_overdue:
+            return transaction
 
-        return transaction
+        expired = await crud.transactions.expire_overdue(db, batch_size=1, ids=[transaction.id])
+        if not expired:
+            await db.commit()
+            return transaction
+
+        stage_balance_restore(db, expired[0], kind=AdjustmentKind.INCREASE)
+        await db.commit()
+
+        await self._reservations.release(transaction.id)
+        await send_transaction_status_notification(expired[0])
+        process_balance_adjustments.delay()
+        return expired[0]
 
     def _get_new_initiator(self, transaction: Transaction) -> str:
         if transaction.initiator == transaction.seller_wallet:
@@ -203,29 +444,6 @@ class TradeService:
 
         return transaction.seller_email
 
-    async def _transfer_on_success(
-        self, wallet_id: str, transaction: Transaction, crypto_type: CryptoType
-    ) -> tuple[str, datetime.datetime]:
-        recipient_wallet_id = await self._get_seller_id(transaction.buyer_email)
-        response = await self._async_client.post(
-            urljoin(
-                app_settings.CRYPTO_SERVICE_API,
-                f"/api/v1/{crypto_type.value}/transfer/from_p2p",
-            ),
-            json={
-                "walletId": wallet_id,
-                "recipientId": recipient_wallet_id,
-                "amount": float(transaction.amount),  # type: ignore
-            },
-        )
-        response.raise_for_status()
-
-        response_data = response.json()
-        # 2022-06-04T20:54:19
-        return response_data["transactionHash"], datetime.datetime.strptime(
-            response_data["transactionDate"].split(".")[0], "%Y-%m-%dT%H:%M:%S"
-        )
-
     async def approve_trade_payment(
         self, db: AsyncSession, trade_id: UUID, current_user_wallet: tuple[str, str, str]
     ) -> Transaction:
@@ -234,7 +452,9 @@ class TradeService:
         if transaction is None:
             raise NotFound()
 
-        if transaction.status == TransactionStatus.EXPIRED:
+        transaction = await self._expire_if_overdue(db, transaction)
+
+        if transaction.status == TransactionStatus.EXPIRED or transaction.is_overdue:
             raise TransactionPaymentTimeExpired()
 
         if transaction.initiator != current_user_wallet[2]:
@@ -244,19 +464,19 @@ class TradeService:
             raise TransactionStatusPermitted()
 
         new_initiator = self._get_new_initiator(transaction)
-        hash = None
-        closed_on = None
 
-        if transaction.status.next == TransactionStatus.SUCCESS:
-            hash, closed_on = await self._transfer_on_success(
-                current_user_wallet[0], transaction, transaction.crypto_type
-            )
+        transaction_obj = TransactionUpdate(status=transaction.status.next, initiator=new_initiator)
 
-        transaction_obj = TransactionUpdate(
-            status=transaction.status.next, initiator=new_initiator, hash=hash, closed_on=closed_on
+        # Conditional on the status checked above, which the expiry sweeper may have changed since
+        updated = await crud.transactions.transition(
+            db, transaction=transaction, obj_in=transaction_obj, actor=current_user_wallet[2]
         )
+        if updated is None:
+            raise TransactionStatusPermitted()
+        transaction = updated
 
-        transaction = await crud.transactions.update(db=db, db_obj=transaction, obj_in=transaction_obj)
+        if transaction.status == TransactionStatus.TRANSFERRING:
+            transfer_on_success.delay(str(transaction.id), current_user_wallet[0])
 
         await send_transaction_status_notification(transaction)
 
@@ -270,7 +490,12 @@ class TradeService:
         if transaction is None:
             raise NotFound()
 
-        if transaction.status not in [TransactionStatus.ON_PAYMENT_WAIT, TransactionStatus.CREATED]:
+        transaction = await self._expire_if_overdue(db, transaction)
+
+        if (
+            transaction.status not in [TransactionStatus.ON_PAYMENT_WAIT, TransactionStatus.CREATED]
+            or transaction.is_overdue
+        ):
             raise TransactionStatusPermitted()
 
         if transaction.buyer_email != current_user_wallet[2]:
@@ -281,30 +506,91 @@ class TradeService:
 
         transaction_obj = TransactionUpdate(status=TransactionStatus.CANCELED, hash=hash, closed_on=closed_on)
 
-        transaction = await crud.transactions.update(db=db, db_obj=transaction, obj_in=transaction_obj)
+        stage_balance_restore(db, transaction, kind=AdjustmentKind.INCREASE)
+        # Discards the staged restore as well if the trade was expired in the meantime
+        updated = await crud.transactions.transition(
+            db, transaction=transaction, obj_in=transaction_obj, actor=current_user_wallet[2]
+        )
+        if updated is None:
+            raise TransactionStatusPermitted()
+        transaction = updated
 
-        seller_wallet_id = await self._get_seller_id(transaction.seller_email)
+        await self._reservations.release(transaction.id)
 
-        await self._increase_seller_wallet_balance(
-            amount=transaction.amount,
-            blockchain_id=seller_wallet_id,
-            crypto_type=transaction.crypto_type.value,
-            sell_type=transaction.sell_type.value,
-        )
+        process_balance_adjustments.delay()
 
         return transaction
 
-    async def get_transactions(self, db: AsyncSession, email: str, role: str, offset: int) -> list[Transaction]:
+    async def get_transactions(
+        self, db: AsyncSession, email: str, role: str, offset: int, filters: TransactionFilter
+    ) -> list[Transaction]:
         match role:
             case "U":
-                transactions = await crud.transactions.get_multi_by_email(db, email=email, offset=offset)
+                transactions = await crud.transactions.get_multi_by_email(
+                    db, email=email, offset=offset, filters=filters
+                )
             case "A" | "SU":
-                transactions = await crud.transactions.get_multi(db, skip=offset)
+                transactions = await crud.transactions.get_multi(db, skip=offset, filters=filters)
             case _:
                 return []
 
         return transactions
 
+    async def count_transactions(
+        self, db: AsyncSession, email: str, role: str, filters: TransactionFilter
+    ) -> TransactionCount:
+        match role:
+            case "U":
+                count = await crud.transactions.count_by_email(db, email=email, filters=filters)
+                return TransactionCount(count=count, mode=CountMode.EXACT)
+            case "A" | "SU":
+                count = await crud.transactions.estimate_count(db, filters=filters)
+                return TransactionCount(count=count, mode=CountMode.ESTIMATE)
+            case _:
+                return TransactionCount(count=0, mode=CountMode.EXACT)
+
+    async def get_active_transactions(self, db: AsyncSession, email: str) -> list[Transaction]:
+        return await crud.transactions.get_active_by_email(db, email=email)
+
+    async def get_awaiting_transactions(self, db: AsyncSession, email: str) -> list[Transaction]:
+        return await crud.transactions.get_active_by_initiator(db, initiator=email)
+
+    async def get_transaction_timeline(
+        self, db: AsyncSession, transaction_id: UUID, email: str, role: str
+    ) -> list[TransactionTransition]:
+        await self.get_certain_transaction(db, transaction_id=transaction_id, email=email, role=role)
+        return await crud.transitions.get_timeline(db, transaction_id=transaction_id)
+
+    async def get_time_in_state(
+        self,
+        db: AsyncSession,
+        role: str,
+        status: TransactionStatus,
+        since: Optional[datetime.datetime],
+        until: Optional[datetime.datetime],
+    ) -> StateDuration:
+        if role not in ["A", "SU"]:
+            raise AccessDenied()
+
+        until = until or datetime.datetime.now(datetime.timezone.utc)
+        since = since or until - datetime.timedelta(days=1)
+        return await crud.transitions.time_in_state(db, status=status, since=since, until=until)
+
+    def lookup_transactions(
+        self, db: AsyncSession, lookup: TransactionLookup
+    ) -> AsyncIterator[list[Transaction]]:
+        """Trades of a service-to-service lookup, in chunks as they are read."""
+        if lookup.size > app_settings.INTERNAL_LOOKUP_MAX_KEYS:
+            raise LookupTooLargeException()
+
+        return crud.transactions.stream_by_keys(
+            db,
+            ids=lookup.ids,
+            hashes=lookup.hashes,
+            lot_ids=lookup.lot_ids,
+            chunk_size=app_settings.INTERNAL_LOOKUP_CHUNK_SIZE,
+        )
+
     async def get_certain_transaction(
         self, db: AsyncSession, transaction_id: UUID, email: str, role: str
     ) -> Transaction:
@@ -320,4 +606,4 @@ class TradeService:
         ):
             raise AccessDenied()
 
-        return transaction
+        return await self._expire_if_overdue(db, transaction)
@@ -1,20 +1,47 @@
+import asyncio
 import traceback
 
-from fastapi import Depends, FastAPI, Request, Response
+from fastapi import FastAPI, Request, Response, status
 from fastapi.exception_handlers import request_validation_exception_handler
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import ORJSONResponse
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi.responses import ORJSONResponse, PlainTextResponse
 from starlette.middleware.cors import CORSMiddleware
 
 from api.v1.api import api_router
+from core.admission import AdmissionMiddleware, RateLimiter, create_concurrency_limiter
+from core.broker_config import redis_client
 from core.config import app_settings
-from core.dependencies import get_session
+from core.deadline import DeadlineMiddleware
+from core.health import create_health_monitor
+from core.metrics import metrics
+from core.profiling import ProfileRing, ProfilingMiddleware
+from core.tracing import TracingMiddleware
+from db.instrumentation import QueryOriginMiddleware
+from db.pool import keep_pool_alive
+from db.session import create_schema, engine_async
 from exceptions import APIException, SomethingWentWrongException
+from httpx_client import async_client
 
 
 def create_app() -> FastAPI:
     app = FastAPI(title="Trade Service")
+    app.add_middleware(
+        ProfilingMiddleware,
+        ring=ProfileRing(app_settings.PROFILING_DIR, max_files=app_settings.PROFILING_MAX_FILES),
+        header=app_settings.PROFILING_HEADER,
+        sample_rate=app_settings.PROFILING_SAMPLE_RATE,
+        wall_interval=app_settings.PROFILING_WALL_INTERVAL,
+    )
+    app.add_middleware(
+        AdmissionMiddleware,
+        rate_limiter=RateLimiter(
+            redis_client, rate=app_settings.RATE_LIMIT_RATE, burst=app_settings.RATE_LIMIT_BURST
+        ),
+        limiter=create_concurrency_limiter(),
+    )
+    app.add_middleware(QueryOriginMiddleware)
+    app.add_middleware(TracingMiddleware)
+    app.add_middleware(DeadlineMiddleware)
     app.add_middleware(
         CORSMiddleware,
         allow_origins=["*"],
@@ -23,10 +50,53 @@ def create_app() -> FastAPI:
         allow_headers=["*"],
     )
 
+    health_monitor = create_health_monitor(engine_async, redis_client, async_client)
+
+    @app.on_event("startup")
+    async def prepare_database() -> None:
+        await create_schema(engine_async)
+
+    @app.on_event("startup")
+    async def start_background_tasks() -> None:
+        app.state.background_tasks = [
+            asyncio.create_task(
+                keep_pool_alive(
+                    engine_async,
+                    interval=app_settings.DB_LIVENESS_INTERVAL,
+                    timeout=app_settings.DB_LIVENESS_TIMEOUT,
+                )
+            ),
+            asyncio.create_task(health_monitor.run()),
+        ]
+
+    @app.on_event("shutdown")
+    async def stop_background_tasks() -> None:
+        for task in app.state.background_tasks:
+            task.cancel()
+
+    @app.on_event("shutdown")
+    async def close_database() -> None:
+        await engine_async.dispose()
+
+    # Liveness: the process is up and serving, dependencies are not checked
     @app.get("/healthcheck")
-    def healthcheck(session: AsyncSession = Depends(get_session)) -> None:
+    @app.get("/healthcheck/live")
+    def healthcheck() -> None:
         pass
 
+    # Readiness: answered from the health monitor's cached probe results
+    @app.get("/healthcheck/ready")
+    def readiness() -> Response:
+        ready, checks = health_monitor.readiness()
+        return ORJSONResponse(
+            content={"ready": ready, "checks": checks},
+            status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        )
+
+    @app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+    def get_metrics() -> str:
+        return metrics.render()
+
     @app.exception_handler(RequestValidationError)
     async def validation_exception_handler(request: Request, exc: RequestValidationError) -> Response:
         traceback.print_exception(type(exc), exc, exc.__traceback__)
@@ -40,6 +110,7 @@ def create_app() -> FastAPI:
                 detail=exception.default_detail,
             ).dict(),
             status_code=exception.default_status_code,
+            headers=exception.headers,
         )
 
     @app.exception_handler(Exception)
@@ -0,0 +1,172 @@
+import asyncio
+import math
+import time
+from typing import Optional
+
+from fastapi import HTTPException
+from fastapi.responses import ORJSONResponse
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+from starlette.requests import Request
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.config import app_settings
+from core.dependencies import get_current_user
+from core.logger_config import service_logger
+from core.metrics import Sample, metrics
+from exceptions import APIException, RateLimitedException, ServiceOverloadedException
+
+# KEYS: bucket; ARGV: refill rate per second, burst, now, cost
+_TOKEN_BUCKET_SCRIPT = """
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local retry_after = 0
+if tokens >= cost then
+    tokens = tokens - cost
+else
+    retry_after = (cost - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(retry_after)
+"""
+
+# Probes and scrapes must keep working while the pod sheds load
+EXEMPT_PATHS = frozenset({"/healthcheck", "/healthcheck/live", "/healthcheck/ready", "/metrics"})
+
+admission_rejections = metrics.counter(
+    "trade_admission_rejected_total", "Requests rejected by admission control"
+)
+
+
+class RateLimiter:
+    """
+    Token bucket per client shared by all pods through Redis.
+    Redis errors let the request through, like the reservation ledger does.
+    """
+
+    def __init__(self, redis: aioredis.Redis, *, rate: float, burst: int):  # type: ignore
+        self._rate = rate
+        self._burst = burst
+        self._take = redis.register_script(_TOKEN_BUCKET_SCRIPT)
+
+    @staticmethod
+    def bucket_key(client_id: str) -> str:
+        return f"rate_limit:{client_id}"
+
+    async def acquire(self, client_id: str, cost: float = 1.0) -> float:
+        """
+        Takes `cost` tokens from the client's bucket.
+        :return: Seconds to wait before retrying, 0 if the request is admitted
+        """
+        try:
+            retry_after = await self._take(
+                keys=[self.bucket_key(client_id)], args=[self._rate, self._burst, time.time(), cost]
+            )
+        except RedisError as e:
+            service_logger.warning(f"Rate limit check for {client_id} skipped: {e!r}")
+            return 0.0
+
+        return float(retry_after)
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the requests a pod works on at once. Requests over the cap wait in a bounded
+    queue; once the queue is full, or a request has waited `queue_timeout`, it is shed
+    instead of adding to everyone's latency.
+    """
+
+    def __init__(self, *, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._max_concurrency = max_concurrency
+        self._max_queue = max_queue
+        self._queue_timeout = queue_timeout
+        self.active = 0
+        self.queued = 0
+
+    async def acquire(self) -> bool:
+        if self.active >= self._max_concurrency and self.queued >= self._max_queue:
+            return False
+
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self._queue_timeout)
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.queued -= 1
+
+        self.active += 1
+        return True
+
+    def release(self) -> None:
+        self.active -= 1
+        self._semaphore.release()
+
+    def usage(self) -> list[Sample]:
+        return [({"state": "active"}, self.active), ({"state": "queued"}, self.queued)]
+
+
+def _client_id(request: Request) -> Optional[str]:
+    try:
+        return f"user:{get_current_user(request)['user_id']}"
+    except (HTTPException, KeyError):
+        return f"ip:{request.client.host}" if request.client is not None else None
+
+
+def _rejection(exception: APIException, retry_after: float) -> ORJSONResponse:
+    admission_rejections.inc(reason=exception.default_code)
+    return ORJSONResponse(
+        content=APIException.Schema(code=exception.default_code, detail=exception.default_detail).dict(),
+        status_code=exception.default_status_code,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+    )
+
+
+class AdmissionMiddleware:
+    """Rate limits each client and sheds load when the pod's queue is full, answering with Retry-After."""
+
+    def __init__(self, app: ASGIApp, *, rate_limiter: RateLimiter, limiter: ConcurrencyLimiter):
+        self.app = app
+        self._rate_limiter = rate_limiter
+        self._limiter = limiter
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        client_id = _client_id(Request(scope))
+        if client_id is not None:
+            retry_after = await self._rate_limiter.acquire(client_id)
+            if retry_after > 0:
+                await _rejection(RateLimitedException(), retry_after)(scope, receive, send)
+                return
+
+        if not await self._limiter.acquire():
+            await _rejection(ServiceOverloadedException(), app_settings.ADMISSION_QUEUE_TIMEOUT)(
+                scope, receive, send
+            )
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self._limiter.release()
+
+
+def create_concurrency_limiter() -> ConcurrencyLimiter:
+    limiter = ConcurrencyLimiter(
+        max_concurrency=app_settings.ADMISSION_MAX_CONCURRENCY,
+        max_queue=app_settings.ADMISSION_MAX_QUEUE,
+        queue_timeout=app_settings.ADMISSION_QUEUE_TIMEOUT,
+    )
+    metrics.gauge("trade_admission_requests", "Requests admitted and queued on this pod", limiter.usage)
+    return limiter
@@ -1,38 +1,341 @@
 import asyncio
+import contextvars
 import datetime
+from typing import Any, Coroutine, Optional, TypeVar
+from uuid import UUID
 
-from celery import Celery
+import httpx
+from celery import Celery, Task, signals
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import crud
-from core import dependencies
+from core import broker_config, dependencies
+from core.compensation import process_due_adjustments, stage_balance_restore
 from core.config import app_settings
-from core.dependencies import send_transaction_status_notification
+from core.dependencies import (
+    send_transaction_status_notification,
+    send_transaction_status_notifications,
+)
+from core.logger_config import service_logger
+from core.reconciliation import reconcile_reservations
+from core.reservations import reservations
+from core.retry import RetryPolicy
+from core.tracing import TRACEPARENT_HEADER, Span, SpanContext, inject, tracer
+from core.transfer import TransferRejected, find_transfer, transfer_from_p2p
+from db.models import Transaction
+from db.models.balance_adjustment import AdjustmentKind
 from db.models.transaction import TransactionStatus
+from db.models.transaction_transition import SYSTEM_ACTOR
+from db.session import engine_async
+from exceptions import UpstreamUnavailable
+from httpx_client import async_client
 from schemas import TransactionUpdate
 
+T = TypeVar("T")
+
 celery = Celery(__name__, broker=app_settings.BROKER_HOST, backend=app_settings.BROKER_HOST)
 
+celery.conf.beat_schedule = {
+    "expire_overdue_transactions": {
+        "task": "expire_overdue_transactions",
+        "schedule": app_settings.EXPIRY_SWEEP_INTERVAL,
+    },
+    "process_balance_adjustments": {
+        "task": "process_balance_adjustments",
+        "schedule": app_settings.COMPENSATION_SWEEP_INTERVAL,
+    },
+    "archive_closed_transactions": {
+        "task": "archive_closed_transactions",
+        "schedule": app_settings.ARCHIVE_INTERVAL,
+    },
+}
+if app_settings.RECONCILIATION_ENABLED:
+    celery.conf.beat_schedule["reconcile_reservations"] = {
+        "task": "reconcile_reservations",
+        "schedule": app_settings.RECONCILIATION_INTERVAL,
+    }
 
-async def expire_transaction(
-    trade_id: str,
-) -> None:
-    db = dependencies.async_session()
+_task_spans: dict[str, tuple[Optional[Span], Optional[contextvars.Token[Optional[Span]]]]] = {}
 
-    transaction = await crud.transactions.get(db, trade_id)
 
-    if transaction is None:
-        return
+@signals.before_task_publish.connect
+def inject_trace_context(headers: dict[str, Any], **kwargs: Any) -> None:
+    inject(headers)
+
+
+@signals.task_prerun.connect
+def start_task_span(task_id: str, task: Task, **kwargs: Any) -> None:
+    parent = SpanContext.from_traceparent(getattr(task.request, TRACEPARENT_HEADER, None))
+    _task_spans[task_id] = tracer.start_span(f"celery.{task.name}", kind="consumer", parent=parent)
+
+
+@signals.task_postrun.connect
+def end_task_span(task_id: str, state: Optional[str] = None, **kwargs: Any) -> None:
+    span, token = _task_spans.pop(task_id, (None, None))
+    if span is not None:
+        span.set_attribute("celery.state", state)
+    tracer.end_span(span, token)
+
+
+def run_async(coroutine: Coroutine[Any, Any, T]) -> T:
+    """
+    Runs a task's coroutine on a new event loop. Pooled database and Redis connections are bound
+    to the loop that opened them, so they are closed before it is, and the next run opens its own.
+    """
+
+    async def scoped() -> T:
+        try:
+            return await coroutine
+        finally:
+            await engine_async.dispose()
+            await broker_config.redis_client.connection_pool.disconnect()
+
+    return asyncio.run(scoped())
+
+
+transfer_retry_policy = RetryPolicy(
+    attempts=app_settings.TRANSFER_MAX_RETRIES,
+    base_delay=app_settings.TRANSFER_RETRY_BASE_DELAY,
+    max_delay=app_settings.TRANSFER_RETRY_MAX_DELAY,
+)
+
+
+async def expire_batch(
+    db: AsyncSession, *, batch_size: int, ids: Optional[list[UUID]] = None
+) -> list[Transaction]:
+    """
+    Expires a batch of overdue trades and queues giving their sellers' reduced balances back, in
+    one commit, then releases their reservations and notifies.
+    """
+    transactions = await crud.transactions.expire_overdue(db, batch_size=batch_size, ids=ids)
+    for transaction in transactions:
+        stage_balance_restore(db, transaction, kind=AdjustmentKind.INCREASE)
+    await db.commit()
+
+    await asyncio.gather(*(reservations.release(transaction.id) for transaction in transactions))
+    await send_transaction_status_notifications(transactions)
+    return transactions
 
-    if transaction.status != TransactionStatus.ON_PAYMENT_WAIT:
-        return
 
-    transaction_obj = TransactionUpdate(status=TransactionStatus.EXPIRED, closed_on=datetime.datetime.now())
+async def expire_overdue_transactions_batches() -> None:
+    expired = 0
 
-    transaction = await crud.transactions.update(db=db, db_obj=transaction, obj_in=transaction_obj)
+    async with dependencies.async_session() as db:
+        for _ in range(app_settings.EXPIRY_SWEEP_MAX_BATCHES):
+            batch = await expire_batch(db, batch_size=app_settings.EXPIRY_SWEEP_BATCH_SIZE)
+            expired += len(batch)
+            if len(batch) < app_settings.EXPIRY_SWEEP_BATCH_SIZE:
+                break
 
-    await send_transaction_status_notification(transaction)
+    if expired:
+        service_logger.info(f"Expired {expired} overdue transactions")
+        process_balance_adjustments.delay()
 
 
+async def release_orphaned_reservations() -> None:
+    """
+    Releases the reservations of trades that are no longer open, or were never created, which a
+    request or task dying before its release leaves behind. Those of open trades are confirmed.
+    """
+    released = 0
+
+    for _ in range(app_settings.EXPIRY_SWEEP_MAX_BATCHES):
+        trade_ids = await reservations.stale(
+            older_than=app_settings.RESERVATION_SWEEP_MIN_AGE, limit=app_settings.EXPIRY_SWEEP_BATCH_SIZE
+        )
+        if not trade_ids:
+            break
+
+        async with dependencies.async_session() as db:
+            active = await crud.transactions.get_active_ids(db, ids=trade_ids)
+        await reservations.confirm([trade_id for trade_id in trade_ids if trade_id in active])
+        orphaned = [trade_id for trade_id in trade_ids if trade_id not in active]
+        await asyncio.gather(*(reservations.release(trade_id) for trade_id in orphaned))
+        released += len(orphaned)
+
+        if len(trade_ids) < app_settings.EXPIRY_SWEEP_BATCH_SIZE:
+            break
+
+    if released:
+        service_logger.warning(f"Released {released} orphaned reservations")
+
+
+@celery.task(name="expire_overdue_transactions")
+def expire_overdue_transactions() -> None:
+    run_async(expire_overdue_transactions_batches())
+    run_async(release_orphaned_reservations())
+
+
+async def expire_transactions(trade_ids: list[str]) -> None:
+    async with dependencies.async_session() as db:
+        transactions = await expire_batch(
+            db, batch_size=len(trade_ids), ids=[UUID(trade_id) for trade_id in trade_ids]
+        )
+    if transactions:
+        process_balance_adjustments.delay()
+
+
+# Expiry used to be scheduled per trade with these ETA tasks. They are kept so tasks still
+# queued from before the sweeper are consumed; they only expire trades that are overdue.
 @celery.task(name="transaction_expire_timer")
 def set_transaction_expire_timer(trade_id: str) -> None:
-    asyncio.run(expire_transaction(trade_id))
+    run_async(expire_transactions([trade_id]))
+
+
+@celery.task(name="transactions_expire_timer")
+def set_transactions_expire_timer(trade_ids: list[str]) -> None:
+    run_async(expire_transactions(trade_ids))
+
+
+async def finish_transfer(
+    transaction: Transaction, obj_in: TransactionUpdate, *, restore: bool = False
+) -> bool:
+    """
+    Moves a TRANSFERRING trade to its final status, queueing the seller's balance restore with it if
+    `restore`, then releases its reservation.
+    :return: Whether the trade was moved, which it is not if another run has moved it already
+    """
+    async with dependencies.async_session() as db:
+        if restore:
+            stage_balance_restore(db, transaction, kind=AdjustmentKind.INCREASE)
+        # Discards the staged restore as well if the trade is no longer TRANSFERRING
+        updated = await crud.transactions.transition(
+            db, transaction=transaction, obj_in=obj_in, actor=SYSTEM_ACTOR
+        )
+
+    if updated is None:
+        return False
+
+    await reservations.release(updated.id)
+
+    await send_transaction_status_notification(updated)
+    return True
+
+
+async def get_transferring(trade_id: str) -> Optional[Transaction]:
+    async with dependencies.async_session() as db:
+        transaction = await crud.transactions.get(db, trade_id)
+
+    if transaction is None or transaction.status != TransactionStatus.TRANSFERRING:
+        return None
+    return transaction
+
+
+async def complete_transfer(trade_id: str, wallet_id: str) -> None:
+    """
+    Transfers the crypto of a TRANSFERRING trade and marks it as SUCCESS.
+    The crypto service is asked for the trade's transfer first, so a run retried after an ambiguous
+    failure, or redelivered after a worker died mid-transfer, does not send it again.
+    No database connection is held while waiting for the crypto service.
+    """
+    transaction = await get_transferring(trade_id)
+    if transaction is None:
+        return
+
+    # The shared client is bound to the event loop of a previous task run
+    async with httpx.AsyncClient(timeout=async_client.timeout) as client:
+        transfer = await find_transfer(client, transaction)
+        if transfer is None:
+            transfer = await transfer_from_p2p(client, wallet_id=wallet_id, transaction=transaction)
+
+    hash, closed_on = transfer
+    await finish_transfer(
+        transaction, TransactionUpdate(status=TransactionStatus.SUCCESS, hash=hash, closed_on=closed_on)
+    )
+
+
+async def fail_transfer(trade_id: str, *, verify: bool) -> bool:
+    """
+    Marks a TRANSFERRING trade as TRANSFER_FAILED and gives the seller the reserved amount back.
+    With `verify` the crypto service is asked first, and the trade completed instead if the transfer
+    went through after all. If that cannot be told, the trade is failed without a restore and left
+    for manual reconciliation.
+    :return: Whether a balance restore was queued
+    """
+    transaction = await get_transferring(trade_id)
+    if transaction is None:
+        return False
+
+    failed = TransactionUpdate(status=TransactionStatus.TRANSFER_FAILED, closed_on=datetime.datetime.now())
+
+    if verify:
+        try:
+            async with httpx.AsyncClient(timeout=async_client.timeout) as client:
+                transfer = await find_transfer(client, transaction)
+        except (httpx.HTTPError, UpstreamUnavailable) as e:
+            service_logger.error(f"Transfer of {trade_id} could not be verified, reconcile it manually: {e!r}")
+            await finish_transfer(transaction, failed)
+            return False
+
+        if transfer is not None:
+            hash, closed_on = transfer
+            await finish_transfer(
+                transaction,
+                TransactionUpdate(status=TransactionStatus.SUCCESS, hash=hash, closed_on=closed_on),
+            )
+            return False
+
+    return await finish_transfer(transaction, failed, restore=True)
+
+
+@celery.task(
+    name="transfer_on_success", bind=True, acks_late=True, max_retries=app_settings.TRANSFER_MAX_RETRIES
+)
+def transfer_on_success(self: Task, trade_id: str, wallet_id: str) -> None:
+    try:
+        run_async(complete_transfer(trade_id, wallet_id))
+    except TransferRejected as e:
+        service_logger.error(f"Transfer of {trade_id} rejected: {e}")
+        if run_async(fail_transfer(trade_id, verify=False)):
+            process_balance_adjustments.delay()
+    except (httpx.HTTPError, UpstreamUnavailable) as e:
+        # A connection that could not be opened never reached the crypto service; after anything
+        # else the transfer may have been executed, which the next run checks before resending
+        if self.request.retries >= self.max_retries:
+            service_logger.error(f"Transfer of {trade_id} failed after {self.request.retries} retries: {e!r}")
+            if run_async(fail_transfer(trade_id, verify=True)):
+                process_balance_adjustments.delay()
+            return
+        raise self.retry(exc=e, countdown=transfer_retry_policy.backoff(self.request.retries))
+
+
+async def process_balance_adjustments_batches(max_batches: int = 10) -> None:
+    for _ in range(max_batches):
+        if await process_due_adjustments() < app_settings.COMPENSATION_BATCH_SIZE:
+            return
+
+
+@celery.task(name="process_balance_adjustments")
+def process_balance_adjustments() -> None:
+    run_async(process_balance_adjustments_batches())
+
+
+async def archive_closed_transactions_batches() -> None:
+    closed_before = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        days=app_settings.ARCHIVE_AFTER_DAYS
+    )
+    archived = 0
+
+    async with dependencies.async_session() as db:
+        for _ in range(app_settings.ARCHIVE_MAX_BATCHES):
+            batch = await crud.transactions.archive_closed(
+                db, closed_before=closed_before, batch_size=app_settings.ARCHIVE_BATCH_SIZE
+            )
+            archived += batch
+            if batch < app_settings.ARCHIVE_BATCH_SIZE:
+                break
+
+    service_logger.info(f"Archived {archived} closed transactions")
+
+
+@celery.task(name="archive_closed_transactions")
+def archive_closed_transactions() -> None:
+    run_async(archive_closed_transactions_batches())
+
+
+@celery.task(name="reconcile_reservations")
+def reconcile_reservations_task() -> None:
+    if not app_settings.RECONCILIATION_ENABLED:
+        service_logger.warning("Reconciliation is disabled, RECONCILIATION_ENABLED is not set")
+        return
+    run_async(reconcile_reservations(dependencies.get_redis()))
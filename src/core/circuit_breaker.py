@@ -0,0 +1,109 @@
+import enum
+import math
+import time
+from collections import deque
+
+from exceptions import UpstreamUnavailable
+
+
+class CircuitState(enum.Enum):
+    CLOSED = 0
+    OPEN = 1
+    HALF_OPEN = 2
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open breaker over a sliding window of the latest calls.
+
+    The circuit opens once the window holds `min_calls` calls and either the error rate
+    or the share of calls slower than `slow_call_duration` reaches its threshold.
+    While open, calls are rejected immediately. After `open_duration` up to
+    `half_open_calls` probes are let through; the circuit closes if all of them succeed
+    and opens again on the first bad one.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        window: int,
+        min_calls: int,
+        error_rate: float,
+        slow_call_duration: float,
+        slow_call_rate: float,
+        open_duration: float,
+        half_open_calls: int,
+    ):
+        self.name = name
+        self._calls: deque[tuple[bool, bool]] = deque(maxlen=window)
+        self._min_calls = min_calls
+        self._error_rate = error_rate
+        self._slow_call_duration = slow_call_duration
+        self._slow_call_rate = slow_call_rate
+        self._open_duration = open_duration
+        self._half_open_calls = half_open_calls
+
+        self._state = CircuitState.CLOSED
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+
+    @property
+    def state(self) -> CircuitState:
+        if self._state == CircuitState.OPEN and time.monotonic() - self._opened_at >= self._open_duration:
+            self._state = CircuitState.HALF_OPEN
+            self._probes_started = 0
+            self._probes_succeeded = 0
+        return self._state
+
+    def before_call(self) -> None:
+        state = self.state
+
+        if state == CircuitState.OPEN:
+            retry_after = self._open_duration - (time.monotonic() - self._opened_at)
+            raise UpstreamUnavailable(headers={"Retry-After": str(max(1, math.ceil(retry_after)))})
+
+        if state == CircuitState.HALF_OPEN:
+            if self._probes_started >= self._half_open_calls:
+                raise UpstreamUnavailable(headers={"Retry-After": "1"})
+            self._probes_started += 1
+
+    def on_cancel(self) -> None:
+        if self._state == CircuitState.HALF_OPEN and self._probes_started > 0:
+            self._probes_started -= 1
+
+    def on_result(self, *, duration: float, failed: bool) -> None:
+        slow = duration >= self._slow_call_duration
+
+        if self._state == CircuitState.HALF_OPEN:
+            if failed or slow:
+                self._open()
+                return
+            self._probes_succeeded += 1
+            if self._probes_succeeded >= self._half_open_calls:
+                self._state = CircuitState.CLOSED
+                self._calls.clear()
+            return
+
+        if self._state == CircuitState.OPEN:
+            return
+
+        self._calls.append((failed, slow))
+
+        if len(self._calls) < self._min_calls:
+            return
+
+        failures = sum(1 for call_failed, _ in self._calls if call_failed)
+        slow_calls = sum(1 for _, call_slow in self._calls if call_slow)
+
+        if (
+            failures / len(self._calls) >= self._error_rate
+            or slow_calls / len(self._calls) >= self._slow_call_rate
+        ):
+            self._open()
+
+    def _open(self) -> None:
+        self._state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self._calls.clear()
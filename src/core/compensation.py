@@ -0,0 +1,156 @@
+import asyncio
+import datetime
+from typing import Optional
+from uuid import UUID
+
+import httpx
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+from core.config import app_settings
+from core.logger_config import service_logger
+from core.retry import RetryPolicy
+from core.wallets import get_p2p_wallet_id, increase_p2p_balance, reduce_p2p_balance
+from db.models.balance_adjustment import AdjustmentKind, BalanceAdjustment
+from db.models.transaction import Transaction
+from db.session import async_session
+from exceptions import DeadlineExceeded
+from httpx_client import async_client
+from schemas.balance_adjustment import BalanceAdjustmentCreate
+
+compensation_retry_policy = RetryPolicy(
+    attempts=app_settings.COMPENSATION_MAX_ATTEMPTS,
+    base_delay=app_settings.COMPENSATION_RETRY_BASE_DELAY,
+    max_delay=app_settings.COMPENSATION_RETRY_MAX_DELAY,
+)
+
+
+class ReplayNotSafe(Exception):
+    """The wallet service is not known to dedupe balance changes by Idempotency-Key."""
+
+
+def reduce_idempotency_key(trade_id: UUID) -> str:
+    return f"{trade_id}:reduce"
+
+
+def is_ambiguous_failure(exception: BaseException) -> bool:
+    """Whether a failed wallet call may still have been applied by the wallet service."""
+    if isinstance(exception, DeadlineExceeded):
+        # Raised before the call, or for a timeout of it cut short by the deadline
+        return exception.__cause__ is not None and is_ambiguous_failure(exception.__cause__)
+    if isinstance(exception, httpx.HTTPStatusError):
+        return exception.response.status_code >= httpx.codes.INTERNAL_SERVER_ERROR
+    if isinstance(exception, (httpx.ConnectError, httpx.ConnectTimeout)):
+        return False
+    return isinstance(exception, httpx.TransportError)
+
+
+def is_permanent_failure(exception: BaseException) -> bool:
+    """Whether a failed wallet call was refused, so repeating it cannot succeed."""
+    if isinstance(exception, ReplayNotSafe):
+        return True
+    if isinstance(exception, DeadlineExceeded):
+        return exception.__cause__ is not None and is_permanent_failure(exception.__cause__)
+    # The counterpart of is_ambiguous_failure: a client error means the call was not applied
+    return (
+        isinstance(exception, httpx.HTTPStatusError)
+        and exception.response.status_code < httpx.codes.INTERNAL_SERVER_ERROR
+    )
+
+
+def stage_balance_restore(db: AsyncSession, transaction: Transaction, *, kind: AdjustmentKind) -> None:
+    """Queues giving the seller's reserved amount back; committed with the caller's next commit."""
+    crud.balance_adjustments.stage(
+        db,
+        obj_in=BalanceAdjustmentCreate(
+            transaction_id=transaction.id,
+            idempotency_key=f"{transaction.id}:{kind.value}",
+            kind=kind,
+            seller_email=transaction.seller_email,
+            amount=transaction.amount,
+            crypto_type=transaction.crypto_type,
+            sell_type=transaction.sell_type,
+        ),
+    )
+
+
+async def _apply(client: httpx.AsyncClient, adjustment: BalanceAdjustment) -> None:
+    blockchain_id = await get_p2p_wallet_id(client, adjustment.seller_email)
+
+    if adjustment.kind == AdjustmentKind.REVERT_REDUCE:
+        # The reduce may or may not have been applied. Replaying it under its original key settles
+        # that only if the wallet service drops the repeat; otherwise the seller is charged twice.
+        if not app_settings.WALLET_DEDUPES_IDEMPOTENCY_KEYS:
+            raise ReplayNotSafe(f"Reduce {reduce_idempotency_key(adjustment.transaction_id)} not replayed")
+        await reduce_p2p_balance(
+            client,
+            amount=adjustment.amount,
+            blockchain_id=blockchain_id,
+            crypto_type=adjustment.crypto_type.value,
+            sell_type=adjustment.sell_type.value,
+            idempotency_key=reduce_idempotency_key(adjustment.transaction_id),
+        )
+
+    await increase_p2p_balance(
+        client,
+        amount=adjustment.amount,
+        blockchain_id=blockchain_id,
+        crypto_type=adjustment.crypto_type.value,
+        sell_type=adjustment.sell_type.value,
+        idempotency_key=adjustment.idempotency_key,
+    )
+
+
+async def process_due_adjustments() -> int:
+    """
+    Applies one batch of due balance adjustments concurrently.
+    :return: Number of adjustments claimed
+    """
+    async with async_session() as db:
+        adjustments = await crud.balance_adjustments.claim_due(
+            db,
+            limit=app_settings.COMPENSATION_BATCH_SIZE,
+            lease=datetime.timedelta(seconds=app_settings.COMPENSATION_LEASE),
+        )
+
+    if not adjustments:
+        return 0
+
+    semaphore = asyncio.Semaphore(app_settings.COMPENSATION_CONCURRENCY)
+
+    async def run(client: httpx.AsyncClient, adjustment: BalanceAdjustment) -> Optional[Exception]:
+        async with semaphore:
+            try:
+                await _apply(client, adjustment)
+            except Exception as e:
+                return e
+        return None
+
+    # The shared client is bound to the event loop of a previous task run
+    async with httpx.AsyncClient(timeout=async_client.timeout) as client:
+        errors = await asyncio.gather(*(run(client, adjustment) for adjustment in adjustments))
+
+    async with async_session() as db:
+        await crud.balance_adjustments.mark_done(
+            db, ids=[adjustment.id for adjustment, error in zip(adjustments, errors) if error is None]
+        )
+
+        for adjustment, error in zip(adjustments, errors):
+            if error is None:
+                continue
+
+            give_up = is_permanent_failure(error) or adjustment.attempts >= compensation_retry_policy.attempts
+            service_logger.log(
+                "ERROR" if give_up else "WARNING",
+                f"Balance adjustment {adjustment.idempotency_key} failed "
+                f"on attempt {adjustment.attempts}: {error!r}",
+            )
+            await crud.balance_adjustments.reschedule(
+                db,
+                adjustment=adjustment,
+                delay=datetime.timedelta(seconds=compensation_retry_policy.backoff(adjustment.attempts)),
+                error=repr(error),
+                give_up=give_up,
+            )
+
+    return len(adjustments)
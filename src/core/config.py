@@ -1,12 +1,16 @@
-from typing import Any, Dict, Optional
+import importlib.util
+from typing import Any, Dict, Literal, Optional
 
-from pydantic import BaseSettings, PostgresDsn, validator
+from pydantic import BaseSettings, PostgresDsn, parse_obj_as, validator
 
 
 class AsyncPostgresDsn(PostgresDsn):
     allowed_schemes = {"postgres+asyncpg", "postgresql+asyncpg"}
 
 
+SQLITE_SCHEME = "sqlite+aiosqlite"
+
+
 class AppSettings(BaseSettings):
     class Config:
         env_file = ".env"
@@ -14,20 +18,140 @@ class AppSettings(BaseSettings):
     API_V1_STR: str = "/api/v1"
     SECRET_KEY: str
 
-    POSTGRES_HOST: str
-    POSTGRES_USER: str
-    POSTGRES_PASSWORD: str
-    POSTGRES_DB: str
-    SQLALCHEMY_DATABASE_URI_ASYNC: Optional[AsyncPostgresDsn] = None
+    # "sqlite" runs on a local aiosqlite file, for benchmarks and single-process development
+    DATABASE_BACKEND: Literal["postgresql", "sqlite"] = "postgresql"
+    SQLITE_PATH: str = "trade.sqlite3"
+    POSTGRES_HOST: Optional[str] = None
+    POSTGRES_USER: Optional[str] = None
+    POSTGRES_PASSWORD: Optional[str] = None
+    POSTGRES_DB: Optional[str] = None
+    SQLALCHEMY_DATABASE_URI_ASYNC: Optional[str] = None
+
+    # Size per pod so that replicas * (DB_POOL_SIZE + DB_MAX_OVERFLOW) stays below max_connections
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_STATEMENT_CACHE_SIZE: int = 100
+    DB_LIVENESS_INTERVAL: float = 30.0
+    DB_LIVENESS_TIMEOUT: float = 5.0
+    # Slower statements are logged and captured with redacted parameters; a share of the slow
+    # SELECTs is rerun under EXPLAIN (ANALYZE, BUFFERS) on Postgres, off by default
+    DB_SLOW_QUERY_THRESHOLD: float = 0.2
+    DB_EXPLAIN_SAMPLE_RATE: float = 0.0
+    DB_QUERY_LOG_FILE: str = "/tmp/trade-queries.jsonl"
+    DB_QUERY_LOG_MAX_BYTES: int = 10_000_000
 
     CRYPTO_SERVICE_API: str
     LOT_SERVICE_API: str
     AUTH_SERVICE_API: str
     WALLET_SERVICE_API: str
 
+    LOT_CACHE_TTL: float = 5.0
+    LOT_CACHE_STALE_TTL: float = 30.0
+    LOT_CACHE_REFRESH_FLOOR: float = 1.0
+    LOT_CACHE_MAX_SIZE: int = 10_000
+
+    UPSTREAM_RETRY_ATTEMPTS: int = 3
+    UPSTREAM_RETRY_BASE_DELAY: float = 0.05
+    UPSTREAM_RETRY_MAX_DELAY: float = 1.0
+    UPSTREAM_RETRY_BUDGET_RATIO: float = 0.1
+    UPSTREAM_HEDGING_ENABLED: bool = False
+    UPSTREAM_HEDGE_MIN_DELAY: float = 0.02
+    UPSTREAM_MAX_CONCURRENCY: int = 50
+    # Per-call caps, cut further to what is left of the request's deadline
+    UPSTREAM_CONNECT_TIMEOUT: float = 3.0
+    UPSTREAM_READ_TIMEOUT: float = 10.0
+    TRANSFER_READ_TIMEOUT: float = 30.0
+
+    # Budget of a request's upstream calls; callers may pass their own in DEADLINE_HEADER (seconds left)
+    REQUEST_DEADLINE: float = 20.0
+    REQUEST_DEADLINE_MAX: float = 60.0
+    DEADLINE_HEADER: str = "X-Request-Timeout"
+
+    RATE_LIMIT_RATE: float = 20.0  # Requests per second per user
+    RATE_LIMIT_BURST: int = 40
+    ADMISSION_MAX_CONCURRENCY: int = 100
+    ADMISSION_MAX_QUEUE: int = 200
+    ADMISSION_QUEUE_TIMEOUT: float = 1.0
+
+    # Profiling is off unless sampled or requested by an admin with PROFILING_HEADER
+    PROFILING_SAMPLE_RATE: float = 0.0
+    PROFILING_HEADER: str = "X-Profile"
+    PROFILING_DIR: str = "/tmp/trade-profiles"
+    PROFILING_MAX_FILES: int = 100
+    PROFILING_WALL_INTERVAL: float = 0.005
+
+    # "none", "stdout", "file" or a "package.module:factory" returning a SpanExporter
+    TRACING_EXPORTER: str = "none"
+    TRACING_FILE: str = "traces.jsonl"
+    TRACING_SAMPLE_RATE: float = 1.0
+    TRACING_SERVICE_NAME: str = "trade-service"
+    # Finished spans waiting to be written; spans ending while it is full are dropped
+    TRACING_QUEUE_SIZE: int = 10_000
+
+    HEALTH_PROBE_INTERVAL: float = 5.0
+    HEALTH_PROBE_TIMEOUT: float = 2.0
+    HEALTH_RESULT_MAX_AGE: float = 15.0
+
+    CIRCUIT_BREAKER_WINDOW: int = 50
+    CIRCUIT_BREAKER_MIN_CALLS: int = 10
+    CIRCUIT_BREAKER_ERROR_RATE: float = 0.5
+    CIRCUIT_BREAKER_SLOW_CALL_DURATION: float = 5.0
+    CIRCUIT_BREAKER_SLOW_CALL_RATE: float = 0.5
+    CIRCUIT_BREAKER_OPEN_DURATION: float = 10.0
+    CIRCUIT_BREAKER_HALF_OPEN_CALLS: int = 3
+
     REDIS_HOST: str
+    STATUS_STREAM_PARTITIONS: int = 1
+    STATUS_STREAM_PARTITION_KEY: Literal["trade_id", "seller_email", "buyer_email"] = "trade_id"
+    STATUS_STREAM_BATCH_SIZE: int = 100
+    STATUS_STREAM_BLOCK_MS: int = 5000
+    STATUS_STREAM_CLAIM_IDLE_MS: int = 60_000
     BROKER_HOST: str
     TRANSACTION_EXPIRE_TIME: int
+    EXPIRY_SWEEP_INTERVAL: float = 10.0
+    EXPIRY_SWEEP_BATCH_SIZE: int = 500
+    EXPIRY_SWEEP_MAX_BATCHES: int = 20
+    # Reservations are checked against their trades once this old, so a trade still being created is left alone
+    RESERVATION_SWEEP_MIN_AGE: float = 600.0
+    BATCH_CREATE_MAX_SIZE: int = 50
+    BATCH_CREATE_CONCURRENCY: int = 10
+    TRANSFER_MAX_RETRIES: int = 8
+    TRANSFER_RETRY_BASE_DELAY: float = 2.0
+    TRANSFER_RETRY_MAX_DELAY: float = 300.0
+
+    COMPENSATION_BATCH_SIZE: int = 100
+    COMPENSATION_CONCURRENCY: int = 10
+    COMPENSATION_LEASE: float = 120.0
+    COMPENSATION_MAX_ATTEMPTS: int = 20
+    COMPENSATION_RETRY_BASE_DELAY: float = 5.0
+    COMPENSATION_RETRY_MAX_DELAY: float = 1800.0
+    COMPENSATION_SWEEP_INTERVAL: float = 30.0
+    # Whether the wallet service applies a balance change at most once per Idempotency-Key. Replaying
+    # the reduce of an ambiguously failed trade is only safe if it does, so until that is confirmed
+    # such restores are left FAILED for manual reconciliation
+    WALLET_DEDUPES_IDEMPOTENCY_KEYS: bool = False
+
+    # Reconciliation reads the amounts held back on P2P wallets from reservedToSell / reservedToBuy,
+    # which the wallet service does not provide yet; the job stays off until it does
+    RECONCILIATION_ENABLED: bool = False
+    RECONCILIATION_INTERVAL: float = 300.0
+    RECONCILIATION_CHUNK_SIZE: int = 1000
+    RECONCILIATION_CONCURRENCY: int = 10
+    RECONCILIATION_LAG: float = 60.0  # Changes younger than this are left to the next run
+    RECONCILIATION_INITIAL_LOOKBACK: float = 86400.0
+
+    ARCHIVE_AFTER_DAYS: int = 30
+    ARCHIVE_BATCH_SIZE: int = 1000
+    ARCHIVE_MAX_BATCHES: int = 50
+    ARCHIVE_INTERVAL: float = 3600.0
+
+    # Shared secret of the sister services calling /internal; the internal API is closed while unset
+    INTERNAL_API_TOKEN: Optional[str] = None
+    INTERNAL_API_TOKEN_HEADER: str = "X-Service-Token"
+    INTERNAL_LOOKUP_MAX_KEYS: int = 1000
+    INTERNAL_LOOKUP_CHUNK_SIZE: int = 200
 
     @validator("POSTGRES_DB", pre=True)
     def assemble_db_name(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
@@ -38,8 +162,20 @@ class AppSettings(BaseSettings):
 
     @validator("SQLALCHEMY_DATABASE_URI_ASYNC", pre=True)
     def assemble_async_db_connection(cls, v: Optional[str], values: Dict[str, Any]) -> Any:
+        sqlite = values.get("DATABASE_BACKEND") == "sqlite"
+        if sqlite and importlib.util.find_spec("aiosqlite") is None:
+            raise ValueError("the sqlite backend needs the sqlite extra: poetry install -E sqlite")
         if isinstance(v, str):
-            return v
+            if sqlite:
+                if not v.startswith(f"{SQLITE_SCHEME}:///"):
+                    raise ValueError(f"the sqlite backend needs a {SQLITE_SCHEME}:/// URL")
+                return v
+            return parse_obj_as(AsyncPostgresDsn, v)
+        if sqlite:
+            return f"{SQLITE_SCHEME}:///{values.get('SQLITE_PATH')}"
+        missing = [name for name in ("POSTGRES_HOST", "POSTGRES_USER", "POSTGRES_DB") if not values.get(name)]
+        if missing:
+            raise ValueError(f"{', '.join(missing)} must be set for the postgresql backend")
         return AsyncPostgresDsn.build(
             scheme="postgresql+asyncpg",
             user=values.get("POSTGRES_USER"),
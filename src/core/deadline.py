@@ -0,0 +1,109 @@
+import contextvars
+import math
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+import httpx
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.config import app_settings
+from exceptions import DeadlineExceeded
+
+
+class Deadline:
+    """Point in monotonic time by which a request's work has to be done."""
+
+    def __init__(self, budget: float):
+        self.expires_at = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() == 0.0
+
+    def allows(self, delay: float) -> bool:
+        """Whether waiting `delay` seconds still leaves part of the budget."""
+        return self.remaining() > delay
+
+    def check(self) -> None:
+        if self.expired:
+            raise DeadlineExceeded()
+
+    def header(self) -> str:
+        """Seconds left, as forwarded to upstreams in DEADLINE_HEADER."""
+        return f"{self.remaining():.3f}"
+
+    def clamp(self, timeout: httpx.Timeout) -> httpx.Timeout:
+        """`timeout` with every phase cut to the remaining budget."""
+        remaining = self.remaining()
+
+        def cut(value: Optional[float]) -> float:
+            return remaining if value is None else min(value, remaining)
+
+        return httpx.Timeout(
+            connect=cut(timeout.connect),
+            read=cut(timeout.read),
+            write=cut(timeout.write),
+            pool=cut(timeout.pool),
+        )
+
+
+_current_deadline: contextvars.ContextVar[Optional[Deadline]] = contextvars.ContextVar(
+    "current_deadline", default=None
+)
+
+
+def current_deadline() -> Optional[Deadline]:
+    return _current_deadline.get()
+
+
+@contextmanager
+def deadline(budget: float) -> Iterator[Deadline]:
+    """Runs the block under a deadline `budget` seconds away, or the current one if that is sooner."""
+    new = Deadline(budget)
+    current = _current_deadline.get()
+    if current is not None and current.expires_at < new.expires_at:
+        new = current
+    token = _current_deadline.set(new)
+    try:
+        yield new
+    finally:
+        _current_deadline.reset(token)
+
+
+def parse_budget(value: Optional[str]) -> float:
+    """
+    Budget of a request: the caller's remaining seconds when given, capped by REQUEST_DEADLINE_MAX.
+    Values that are not a positive, finite number of seconds fall back to REQUEST_DEADLINE.
+    """
+    budget = app_settings.REQUEST_DEADLINE
+    if value:
+        try:
+            given = float(value)
+        except ValueError:
+            given = math.nan
+        if math.isfinite(given) and given > 0:
+            budget = given
+    return min(budget, app_settings.REQUEST_DEADLINE_MAX)
+
+
+class DeadlineMiddleware:
+    """
+    Starts each request's deadline on arrival, from the caller's DEADLINE_HEADER or REQUEST_DEADLINE,
+    so time spent queueing counts against it as well.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        with deadline(parse_budget(Headers(scope=scope).get(app_settings.DEADLINE_HEADER))):
+            await self.app(scope, receive, send)
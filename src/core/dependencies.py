@@ -1,11 +1,13 @@
+import datetime
+import secrets
 from functools import lru_cache
-from typing import Any, AsyncGenerator
+from typing import Any, AsyncGenerator, Optional
 from urllib.parse import urljoin
 
 import httpx
 import jwt
 import orjson
-from fastapi import Depends, HTTPException
+from fastapi import Depends, HTTPException, Query
 from fastapi.encoders import jsonable_encoder
 from httpx import AsyncClient
 from redis import asyncio as aioredis
@@ -13,23 +15,43 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 from starlette.requests import Request
 
-from core import broker_config
+from core import broker_config, upstream
 from core.config import app_settings
+from core.lot_cache import LotCache, lot_cache
+from core.reservations import ReservationLedger, reservations
+from core.status_stream import stream_key_for
+from core.tracing import traced
 from db.models import Transaction
+from db.models.transaction import CryptoType, FiatType, SellType, TransactionStatus
 from db.session import async_session
+from exceptions import AccessDenied
 from httpx_client import async_client
+from schemas.transaction import SortOrder, TransactionFilter
 
 
 def get_async_client() -> httpx.AsyncClient:
     return async_client
 
 
+def get_lot_cache() -> LotCache:
+    return lot_cache
+
+
+def get_reservations() -> ReservationLedger:
+    return reservations
+
+
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
     async with async_session() as session:
         yield session
 
 
 def get_current_user(request: Request) -> dict[str, Any]:
+    # Already decoded by the admission middleware
+    user: Optional[dict[str, Any]] = getattr(request.state, "user", None)
+    if user is not None:
+        return user
+
     unauthorized_exc = HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     raw_jwt = request.cookies.get("jwt-access")
 
@@ -44,15 +66,28 @@ def get_current_user(request: Request) -> dict[str, Any]:
     except jwt.PyJWTError as e:
         raise unauthorized_exc from e
 
+    request.state.user = payload
     return payload
 
 
+def verify_internal_service(request: Request) -> None:
+    """Admits sister services presenting the shared INTERNAL_API_TOKEN."""
+    token = request.headers.get(app_settings.INTERNAL_API_TOKEN_HEADER)
+    if (
+        app_settings.INTERNAL_API_TOKEN is None
+        or token is None
+        or not secrets.compare_digest(token.encode(), app_settings.INTERNAL_API_TOKEN.encode())
+    ):
+        raise AccessDenied()
+
+
 async def get_current_user_wallet(
     request: Request,
     client: AsyncClient = Depends(get_async_client),
 ) -> tuple[str, str, str]:
     user_data = get_current_user(request)
-    response = await client.get(
+    response = await upstream.get(
+        client,
         urljoin(
             app_settings.WALLET_SERVICE_API,
             f"/api/v1/wallets/eth/email/{user_data['user_id']}/p2p",
@@ -68,15 +103,43 @@ async def get_current_user_wallet(
     # return "someid", "0x123q", "alemk@mail.ru"
 
 
+def get_transaction_filter(
+    status: Optional[str] = Query(None, regex=f"^({'|'.join(TransactionStatus.__members__)})$"),
+    crypto_type: Optional[CryptoType] = None,
+    fiat_type: Optional[FiatType] = None,
+    sell_type: Optional[SellType] = None,
+    created_from: Optional[datetime.datetime] = None,
+    created_to: Optional[datetime.datetime] = None,
+    order: SortOrder = SortOrder.DESC,
+) -> TransactionFilter:
+    return TransactionFilter(
+        status=TransactionStatus[status] if status is not None else None,
+        crypto_type=crypto_type,
+        fiat_type=fiat_type,
+        sell_type=sell_type,
+        created_from=created_from,
+        created_to=created_to,
+        order=order,
+    )
+
+
 @lru_cache
 def get_redis() -> aioredis.Redis:  # type: ignore
     return broker_config.redis_client
 
 
-redis_key: str = "transaction_status_changed"
-
-
+@traced("redis.send_transaction_status_notification")
 async def send_transaction_status_notification(transaction: Transaction) -> None:
     transaction_json = jsonable_encoder(transaction, exclude_none=True)
     message = orjson.dumps(transaction_json)
-    await get_redis().xadd(redis_key, {"data": message}, "*")
+    await get_redis().xadd(stream_key_for(transaction), {"data": message}, "*")
+
+
+@traced("redis.send_transaction_status_notifications")
+async def send_transaction_status_notifications(transactions: list[Transaction]) -> None:
+    """Publishes the notifications of several transactions in one round trip."""
+    async with get_redis().pipeline(transaction=False) as pipe:
+        for transaction in transactions:
+            message = orjson.dumps(jsonable_encoder(transaction, exclude_none=True))
+            pipe.xadd(stream_key_for(transaction), {"data": message}, "*")  # type: ignore[unused-coroutine]
+        await pipe.execute()
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional
+
+import httpx
+from redis import asyncio as aioredis
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from core.config import app_settings
+from core.logger_config import service_logger
+from core.upstream import get_upstream
+
+Probe = Callable[[], Awaitable[None]]
+
+
+@dataclass
+class ProbeResult:
+    ok: bool
+    checked_at: float
+    error: Optional[str] = None
+
+
+class HealthMonitor:
+    """
+    Probes dependencies from a background task and keeps the latest results, so readiness
+    checks are answered from memory. A result older than `max_age` counts as failed.
+    """
+
+    def __init__(self, *, interval: float, timeout: float, max_age: float):
+        self._interval = interval
+        self._timeout = timeout
+        self._max_age = max_age
+        self._probes: dict[str, Probe] = {}
+        self._results: dict[str, ProbeResult] = {}
+
+    def add_probe(self, name: str, probe: Probe) -> None:
+        self._probes[name] = probe
+
+    async def _run_probe(self, name: str, probe: Probe) -> None:
+        try:
+            await asyncio.wait_for(probe(), timeout=self._timeout)
+        except Exception as e:
+            if self._results.get(name, ProbeResult(ok=True, checked_at=0)).ok:
+                service_logger.warning(f"Health probe {name} failed: {e!r}")
+            self._results[name] = ProbeResult(ok=False, checked_at=time.monotonic(), error=repr(e))
+        else:
+            self._results[name] = ProbeResult(ok=True, checked_at=time.monotonic())
+
+    async def probe_all(self) -> None:
+        await asyncio.gather(*(self._run_probe(name, probe) for name, probe in self._probes.items()))
+
+    async def run(self) -> None:
+        while True:
+            await self.probe_all()
+            await asyncio.sleep(self._interval)
+
+    def readiness(self) -> tuple[bool, dict[str, str]]:
+        now = time.monotonic()
+        checks: dict[str, str] = {}
+        for name in self._probes:
+            result = self._results.get(name)
+            if result is None:
+                checks[name] = "pending"
+            elif now - result.checked_at > self._max_age:
+                checks[name] = "stale"
+            else:
+                checks[name] = "ok" if result.ok else "failing"
+        return all(check == "ok" for check in checks.values()), checks
+
+
+def database_probe(engine: AsyncEngine) -> Probe:
+    async def probe() -> None:
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT 1"))
+
+    return probe
+
+
+def redis_probe(redis: aioredis.Redis) -> Probe:  # type: ignore
+    async def probe() -> None:
+        await redis.ping()
+
+    return probe
+
+
+def upstream_probe(client: httpx.AsyncClient, base_url: str) -> Probe:
+    """Any response short of a server error means the upstream is up."""
+
+    async def probe() -> None:
+        response = await client.get(base_url)
+        if response.status_code >= httpx.codes.INTERNAL_SERVER_ERROR:
+            raise httpx.HTTPStatusError(
+                f"{base_url} returned {response.status_code}", request=response.request, response=response
+            )
+
+    return probe
+
+
+def create_health_monitor(
+    engine: AsyncEngine, redis: aioredis.Redis, client: httpx.AsyncClient  # type: ignore
+) -> HealthMonitor:
+    monitor = HealthMonitor(
+        interval=app_settings.HEALTH_PROBE_INTERVAL,
+        timeout=app_settings.HEALTH_PROBE_TIMEOUT,
+        max_age=app_settings.HEALTH_RESULT_MAX_AGE,
+    )
+    monitor.add_probe("database", database_probe(engine))
+    monitor.add_probe("redis", redis_probe(redis))
+
+    for url in [
+        app_settings.CRYPTO_SERVICE_API,
+        app_settings.WALLET_SERVICE_API,
+        app_settings.LOT_SERVICE_API,
+        app_settings.AUTH_SERVICE_API,
+    ]:
+        base_url = get_upstream(url).base_url
+        monitor.add_probe(base_url, upstream_probe(client, base_url))
+
+    return monitor
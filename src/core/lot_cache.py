@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any
+from urllib.parse import urljoin
+
+import httpx
+
+from core import upstream
+from core.config import app_settings
+from core.logger_config import service_logger
+from exceptions import NotFound
+from httpx_client import async_client
+from schemas.lot import LotSnapshot
+
+
+class LotCache:
+    """
+    In-process cache of lot snapshots from the lot service.
+
+    Entries younger than `ttl` are served as is. Entries younger than `ttl + stale_ttl`
+    are served stale while a single background fetch revalidates them. Anything older
+    is fetched inline; concurrent misses for the same lot share one request.
+    A forced refresh refetches only snapshots older than `refresh_floor`, so requests that
+    keep failing validation can't bypass the cache.
+    """
+
+    def __init__(
+        self,
+        client: httpx.AsyncClient,
+        *,
+        ttl: float,
+        stale_ttl: float,
+        refresh_floor: float,
+        max_size: int,
+    ):
+        self._client = client
+        self._ttl = ttl
+        self._stale_ttl = stale_ttl
+        self._refresh_floor = refresh_floor
+        self._max_size = max_size
+        self._entries: OrderedDict[int, tuple[LotSnapshot, float]] = OrderedDict()
+        self._versions: dict[int, int] = {}
+        self._inflight: dict[int, asyncio.Task[LotSnapshot]] = {}
+        self._background: set[asyncio.Task[Any]] = set()
+
+    async def get(self, lot_id: int) -> LotSnapshot:
+        entry = self._entries.get(lot_id)
+
+        if entry is not None:
+            snapshot, fetched_at = entry
+            age = time.monotonic() - fetched_at
+
+            if age < self._ttl:
+                self._entries.move_to_end(lot_id)
+                return snapshot
+
+            if age < self._ttl + self._stale_ttl:
+                self._revalidate(lot_id)
+                return snapshot
+
+        return await self._load(lot_id)
+
+    async def refresh(self, lot_id: int) -> LotSnapshot:
+        entry = self._entries.get(lot_id)
+        if entry is not None and time.monotonic() - entry[1] < self._refresh_floor:
+            return entry[0]
+
+        # A fetch already under way is recent enough to share
+        if lot_id not in self._inflight:
+            self.invalidate(lot_id)
+        return await self._load(lot_id)
+
+    def invalidate(self, lot_id: int) -> None:
+        self._entries.pop(lot_id, None)
+        self._inflight.pop(lot_id, None)
+        self._versions[lot_id] = self._versions.get(lot_id, 0) + 1
+
+    def _revalidate(self, lot_id: int) -> None:
+        if lot_id in self._inflight:
+            return
+
+        task = asyncio.create_task(self._load(lot_id))
+        self._background.add(task)
+        task.add_done_callback(self._on_revalidated)
+
+    def _on_revalidated(self, task: "asyncio.Task[LotSnapshot]") -> None:
+        self._background.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            service_logger.warning(f"Lot revalidation failed: {task.exception()!r}")
+
+    async def _load(self, lot_id: int) -> LotSnapshot:
+        task = self._inflight.get(lot_id)
+
+        if task is None:
+            task = asyncio.create_task(self._fetch(lot_id, self._versions.get(lot_id, 0)))
+            self._inflight[lot_id] = task
+            task.add_done_callback(lambda done: self._forget_inflight(lot_id, done))
+
+        return await asyncio.shield(task)
+
+    def _forget_inflight(self, lot_id: int, task: "asyncio.Task[LotSnapshot]") -> None:
+        if self._inflight.get(lot_id) is task:
+            del self._inflight[lot_id]
+
+    async def _fetch(self, lot_id: int, version: int) -> LotSnapshot:
+        response = await upstream.get(
+            self._client, urljoin(app_settings.LOT_SERVICE_API, f"/api/v1/lots/{lot_id}")
+        )
+
+        service_logger.info(f"Get lot {lot_id} status code: {response.status_code}")
+
+        if response.status_code == httpx.codes.NOT_FOUND:
+            self.invalidate(lot_id)
+            raise NotFound()
+
+        response.raise_for_status()
+
+        snapshot = LotSnapshot.parse_raw(response.content)
+
+        if self._versions.get(lot_id, 0) == version:
+            self._store(lot_id, snapshot)
+
+        return snapshot
+
+    def _store(self, lot_id: int, snapshot: LotSnapshot) -> None:
+        self._entries[lot_id] = (snapshot, time.monotonic())
+        self._entries.move_to_end(lot_id)
+
+        while len(self._entries) > self._max_size:
+            evicted, _ = self._entries.popitem(last=False)
+            self._versions.pop(evicted, None)
+
+
+lot_cache = LotCache(
+    async_client,
+    ttl=app_settings.LOT_CACHE_TTL,
+    stale_ttl=app_settings.LOT_CACHE_STALE_TTL,
+    refresh_floor=app_settings.LOT_CACHE_REFRESH_FLOOR,
+    max_size=app_settings.LOT_CACHE_MAX_SIZE,
+)
@@ -0,0 +1,76 @@
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Callable, Iterable
+
+Labels = tuple[tuple[str, str], ...]
+Sample = tuple[dict[str, str], float]
+
+
+class Metric(ABC):
+    def __init__(self, name: str, kind: str, documentation: str):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+
+    @abstractmethod
+    def samples(self) -> Iterable[Sample]:
+        ...
+
+
+class Counter(Metric):
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, "counter", documentation)
+        self._values: defaultdict[Labels, float] = defaultdict(float)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        self._values[tuple(sorted(labels.items()))] += amount
+
+    def samples(self) -> Iterable[Sample]:
+        return [(dict(labels), value) for labels, value in self._values.items()]
+
+
+class Gauge(Metric):
+    """Gauge whose samples are collected from the callback on every scrape."""
+
+    def __init__(self, name: str, documentation: str, collect: Callable[[], Iterable[Sample]]):
+        super().__init__(name, "gauge", documentation)
+        self._collect = collect
+
+    def samples(self) -> Iterable[Sample]:
+        return self._collect()
+
+
+class MetricsRegistry:
+    def __init__(self) -> None:
+        self._metrics: dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        counter = Counter(name, documentation)
+        self.register(counter)
+        return counter
+
+    def gauge(self, name: str, documentation: str, collect: Callable[[], Iterable[Sample]]) -> Gauge:
+        gauge = Gauge(name, documentation, collect)
+        self.register(gauge)
+        return gauge
+
+    def render(self) -> str:
+        """Renders all metrics in the Prometheus text exposition format."""
+        lines: list[str] = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for labels, value in metric.samples():
+                if labels:
+                    rendered_labels = ",".join(f'{key}="{label}"' for key, label in labels.items())
+                    lines.append(f"{metric.name}{{{rendered_labels}}} {value}")
+                else:
+                    lines.append(f"{metric.name} {value}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
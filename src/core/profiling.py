@@ -0,0 +1,152 @@
+import asyncio
+import cProfile
+import os
+import random
+import time
+import uuid
+from collections import Counter
+from typing import Any
+
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.dependencies import get_current_user
+from core.logger_config import service_logger
+
+ADMIN_ROLES = frozenset({"A", "SU"})
+
+
+def _frame_name(code: Any, line: int) -> str:
+    path = "/".join(code.co_filename.rsplit(os.sep, 2)[-2:])
+    return f"{code.co_name} ({path}:{line})"
+
+
+def await_stack(task: "asyncio.Task[Any]") -> list[str]:
+    """Coroutine chain of a suspended task, outermost first."""
+    frames: list[str] = []
+    awaitable: Any = task.get_coro()
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        frames.append(_frame_name(frame.f_code, frame.f_lineno))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return frames
+
+
+class WallClockSampler:
+    """
+    Samples where a task is suspended every `interval` seconds, from another task on the same loop.
+    The result is the request's await time by call chain; time the task spends running is
+    covered by the CPU profile instead.
+    """
+
+    def __init__(self, task: "asyncio.Task[Any]", *, interval: float):
+        self._task = task
+        self._interval = interval
+        self.stacks: Counter[str] = Counter()
+
+    async def run(self) -> None:
+        while True:
+            await asyncio.sleep(self._interval)
+            stack = await_stack(self._task)
+            if stack:
+                self.stacks[";".join(stack)] += 1
+
+    def folded(self) -> str:
+        """Folded stacks with sample counts, the input format of flamegraph.pl and speedscope."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileRing:
+    """Profile files in one directory, the oldest removed beyond `max_files`."""
+
+    def __init__(self, directory: str, *, max_files: int):
+        self._directory = directory
+        self._max_files = max_files
+
+    def write(self, profile_id: str, *, folded: str, cpu_profile: cProfile.Profile) -> None:
+        os.makedirs(self._directory, exist_ok=True)
+        with open(os.path.join(self._directory, f"{profile_id}.wall.folded"), "w") as file:
+            file.write(folded)
+        cpu_profile.dump_stats(os.path.join(self._directory, f"{profile_id}.cpu.prof"))
+        self._trim()
+
+    def _trim(self) -> None:
+        paths = [os.path.join(self._directory, name) for name in os.listdir(self._directory)]
+        paths.sort(key=os.path.getmtime)
+        for path in paths[: max(len(paths) - self._max_files, 0)]:
+            os.remove(path)
+
+
+class ProfilingMiddleware:
+    """
+    Profiles single requests: ones sent by an admin with the profiling header, and a random
+    `sample_rate` share of the rest. One request per process is profiled at a time. Its wall-clock
+    samples (folded stacks) and CPU profile (pstats) go to the profile ring, under the id returned
+    in the profiling header of the response.
+
+    The CPU profile covers the event loop thread while the request runs, so it also includes
+    whatever other requests ran on the loop in the meantime.
+    """
+
+    def __init__(
+        self, app: ASGIApp, *, ring: ProfileRing, header: str, sample_rate: float, wall_interval: float
+    ):
+        self.app = app
+        self._ring = ring
+        self._header = header
+        self._sample_rate = sample_rate
+        self._wall_interval = wall_interval
+        self._active = False
+
+    def _requested_by_admin(self, scope: Scope) -> bool:
+        if self._header not in Headers(scope=scope):
+            return False
+        try:
+            return get_current_user(Request(scope)).get("role") in ADMIN_ROLES
+        except HTTPException:
+            return False
+
+    def _should_profile(self, scope: Scope) -> bool:
+        if scope["type"] != "http" or self._active:
+            return False
+        return (self._sample_rate > 0 and random.random() < self._sample_rate) or self._requested_by_admin(
+            scope
+        )
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._active = True
+        profile_id = f"{time.strftime('%Y%m%dT%H%M%S')}-{scope['method']}-{uuid.uuid4().hex[:8]}"
+
+        async def send_with_profile_id(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[self._header] = profile_id
+            await send(message)
+
+        task = asyncio.current_task()
+        assert task is not None
+        sampler = WallClockSampler(task, interval=self._wall_interval)
+        sampling: asyncio.Task[None] = asyncio.create_task(sampler.run())
+        cpu_profile = cProfile.Profile()
+        cpu_profile.enable()
+        try:
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            cpu_profile.disable()
+            sampling.cancel()
+            self._active = False
+            service_logger.info(f"Profiled {scope['method']} {scope['path']} as {profile_id}")
+            try:
+                await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    lambda: self._ring.write(profile_id, folded=sampler.folded(), cpu_profile=cpu_profile),
+                )
+            except OSError as e:
+                service_logger.warning(f"Writing profile {profile_id} failed: {e!r}")
@@ -0,0 +1,199 @@
+import asyncio
+import datetime
+from dataclasses import dataclass
+from decimal import Decimal
+from typing import Optional
+
+import httpx
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+import crud
+from core.config import app_settings
+from core.logger_config import service_logger
+from core.metrics import metrics
+from core.wallets import get_p2p_reserved_balance, get_p2p_wallet_id
+from db.models.transaction import CryptoType, SellType
+from db.session import async_session
+from httpx_client import async_client
+
+WATERMARK_KEY = "reconciliation:watermark"
+# Sellers to check again on the next run, whatever their trades
+REQUEUED_KEY = "reconciliation:requeued"
+TOLERANCE = Decimal("0.000001")
+
+reconciliation_mismatches = metrics.counter(
+    "trade_reconciliation_mismatches_total", "Seller wallet balances that disagree with open trades"
+)
+reconciliation_checks = metrics.counter(
+    "trade_reconciliation_checks_total", "Seller wallet balances reconciled"
+)
+
+WalletKey = tuple[str, CryptoType, SellType]
+
+
+@dataclass
+class Mismatch:
+    seller_email: str
+    crypto_type: CryptoType
+    sell_type: SellType
+    expected: Decimal
+    actual: Decimal
+
+
+async def _read_watermark(redis: aioredis.Redis, until: datetime.datetime) -> datetime.datetime:  # type: ignore
+    value = await redis.get(WATERMARK_KEY)
+    if value is None:
+        return until - datetime.timedelta(seconds=app_settings.RECONCILIATION_INITIAL_LOOKBACK)
+    return datetime.datetime.fromisoformat(value.decode())
+
+
+async def _read_requeued(redis: aioredis.Redis) -> list[str]:  # type: ignore
+    return sorted(member.decode() for member in await redis.smembers(REQUEUED_KEY))
+
+
+async def _reconcile_sellers(
+    client: httpx.AsyncClient, semaphore: asyncio.Semaphore, seller_emails: list[str]
+) -> tuple[list[Mismatch], int, set[str]]:
+    """
+    Checks the sellers' wallet balances. The database is read up front, so no connection is held
+    while the wallet service is called.
+    :return: Mismatches found, balances checked and sellers that could not be fully checked
+    """
+    async with async_session() as db:
+        amounts = await crud.transactions.active_amounts_by_seller(db, seller_emails=seller_emails)
+        # Sellers with a queued compensation are off until it has been applied
+        compensating = await crud.balance_adjustments.pending_seller_emails(db, seller_emails=seller_emails)
+
+    expected: dict[WalletKey, Decimal] = {}
+    for seller_email in seller_emails:
+        if seller_email in compensating:
+            continue
+        # Balances with no open trades must hold nothing back
+        for crypto_type in CryptoType:
+            for sell_type in SellType:
+                expected[(seller_email, crypto_type, sell_type)] = Decimal(0)
+    for seller_email, crypto_type, sell_type, amount in amounts:
+        if seller_email not in compensating:
+            expected[(seller_email, crypto_type, sell_type)] = amount
+
+    async def wallet_id(seller_email: str) -> str:
+        async with semaphore:
+            return await get_p2p_wallet_id(client, seller_email)
+
+    sellers = [seller_email for seller_email in seller_emails if seller_email not in compensating]
+    wallet_ids = dict(
+        zip(sellers, await asyncio.gather(*(wallet_id(seller) for seller in sellers), return_exceptions=True))
+    )
+    unchecked = set(compensating)
+    for seller_email, result in wallet_ids.items():
+        if isinstance(result, BaseException):
+            service_logger.warning(f"Reconciliation of {seller_email} failed: {result!r}")
+            unchecked.add(seller_email)
+    expected = {key: amount for key, amount in expected.items() if key[0] not in unchecked}
+
+    async def check(key: WalletKey, amount: Decimal) -> Optional[Mismatch]:
+        seller_email, crypto_type, sell_type = key
+        async with semaphore:
+            actual = await get_p2p_reserved_balance(
+                client,
+                blockchain_id=str(wallet_ids[seller_email]),
+                crypto_type=crypto_type.value,
+                sell_type=sell_type.value,
+            )
+        if abs(actual - amount) > TOLERANCE:
+            return Mismatch(seller_email, crypto_type, sell_type, expected=amount, actual=actual)
+        return None
+
+    results = await asyncio.gather(
+        *(check(key, amount) for key, amount in expected.items()), return_exceptions=True
+    )
+
+    mismatches: list[Mismatch] = []
+    checked = 0
+    for key, result in zip(expected, results):
+        if isinstance(result, BaseException):
+            service_logger.warning(f"Reconciliation of {key} failed: {result!r}")
+            unchecked.add(key[0])
+            continue
+        checked += 1
+        if result is not None:
+            mismatches.append(result)
+    return mismatches, checked, unchecked
+
+
+async def reconcile_reservations(redis: aioredis.Redis) -> list[Mismatch]:  # type: ignore
+    """
+    Compares the amounts held back on seller wallets with the seller's open trades, for sellers
+    whose trades changed since the last run. The run covers trades changed up to
+    RECONCILIATION_LAG ago, so that transactions still in flight are committed when read.
+    Sellers that could not be fully checked, including those with a compensation still queued,
+    are requeued for the next run while the watermark moves on.
+    :return: Mismatches found
+    """
+    until = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(
+        seconds=app_settings.RECONCILIATION_LAG
+    )
+    since = await _read_watermark(redis, until)
+    requeued = await _read_requeued(redis)
+
+    semaphore = asyncio.Semaphore(app_settings.RECONCILIATION_CONCURRENCY)
+    mismatches: list[Mismatch] = []
+    unchecked: set[str] = set()
+    checked = 0
+
+    async def reconcile(seller_emails: list[str]) -> None:
+        nonlocal checked
+        chunk_mismatches, chunk_checked, chunk_unchecked = await _reconcile_sellers(
+            client, semaphore, seller_emails
+        )
+        mismatches.extend(chunk_mismatches)
+        unchecked.update(chunk_unchecked)
+        checked += chunk_checked
+
+    chunk_size = app_settings.RECONCILIATION_CHUNK_SIZE
+    # The shared client is bound to the event loop of a previous task run
+    async with httpx.AsyncClient(timeout=async_client.timeout) as client:
+        for start in range(0, len(requeued), chunk_size):
+            end = start + chunk_size
+            await reconcile(requeued[start:end])
+
+        already_checked = set(requeued)
+        after: Optional[str] = None
+        while True:
+            async with async_session() as db:
+                seller_emails = await crud.transactions.changed_sellers(
+                    db, since=since, until=until, after=after, limit=chunk_size
+                )
+            if not seller_emails:
+                break
+            after = seller_emails[-1]
+            await reconcile(
+                [seller_email for seller_email in seller_emails if seller_email not in already_checked]
+            )
+
+    for mismatch in mismatches:
+        service_logger.warning(
+            f"Reservation mismatch for {mismatch.seller_email} {mismatch.crypto_type.value} "
+            f"{mismatch.sell_type.value}: open trades {mismatch.expected}, wallet holds {mismatch.actual}"
+        )
+        reconciliation_mismatches.inc(
+            crypto_type=mismatch.crypto_type.value, sell_type=mismatch.sell_type.value
+        )
+    reconciliation_checks.inc(checked)
+
+    try:
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.set(WATERMARK_KEY, until.isoformat())  # type: ignore[unused-coroutine]
+            pipe.delete(REQUEUED_KEY)  # type: ignore[unused-coroutine]
+            if unchecked:
+                pipe.sadd(REQUEUED_KEY, *unchecked)  # type: ignore[unused-coroutine]
+            await pipe.execute()
+    except RedisError as e:
+        service_logger.warning(f"Storing the reconciliation watermark failed: {e!r}")
+
+    service_logger.info(
+        f"Reconciled {checked} wallet balances changed in [{since}, {until}), {len(mismatches)} mismatches, "
+        f"{len(unchecked)} sellers requeued"
+    )
+    return mismatches
@@ -0,0 +1,115 @@
+import time
+from decimal import Decimal
+from uuid import UUID
+
+from redis import asyncio as aioredis
+from redis.exceptions import RedisError
+
+from core import broker_config
+from core.logger_config import service_logger
+
+# KEYS: lot counter, trade marker, reservation index; ARGV: amount, lot limit, trade id, now (ms)
+_RESERVE_SCRIPT = """
+if redis.call('EXISTS', KEYS[2]) == 1 then
+    return 1
+end
+local reserved = tonumber(redis.call('GET', KEYS[1]) or '0')
+if reserved + tonumber(ARGV[1]) > tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('INCRBYFLOAT', KEYS[1], ARGV[1])
+redis.call('HSET', KEYS[2], 'lot', KEYS[1], 'amount', ARGV[1])
+redis.call('ZADD', KEYS[3], ARGV[4], ARGV[3])
+return 1
+"""
+
+# KEYS: trade marker, reservation index; ARGV: trade id
+_RELEASE_SCRIPT = """
+redis.call('ZREM', KEYS[2], ARGV[1])
+local lot_key = redis.call('HGET', KEYS[1], 'lot')
+if not lot_key then
+    return 0
+end
+local amount = redis.call('HGET', KEYS[1], 'amount')
+local left = tonumber(redis.call('INCRBYFLOAT', lot_key, '-' .. amount))
+if left < 0.000001 then
+    redis.call('DEL', lot_key)
+end
+redis.call('DEL', KEYS[1])
+return 1
+"""
+
+
+class ReservationLedger:
+    """
+    Outstanding reserved amounts per lot, kept in Redis.
+
+    Every reservation is recorded under its trade id, so releasing a trade twice
+    (e.g. a cancel racing the expiry task) only gives the amount back once.
+    Reservations are indexed by when they were made or last confirmed, so ones whose
+    release never ran (a worker dying mid-trade) can be found and released by a sweep.
+    Redis errors never fail a trade: reserve lets the request through and the
+    wallet service stays the source of truth.
+    """
+
+    INDEX_KEY = "trade_reservations"
+
+    def __init__(self, redis: aioredis.Redis):  # type: ignore
+        self._redis = redis
+        self._reserve = redis.register_script(_RESERVE_SCRIPT)
+        self._release = redis.register_script(_RELEASE_SCRIPT)
+
+    @staticmethod
+    def lot_key(lot_id: int) -> str:
+        return f"lot_reservation:{lot_id}"
+
+    @staticmethod
+    def trade_key(trade_id: UUID) -> str:
+        return f"trade_reservation:{trade_id}"
+
+    async def reserve(self, trade_id: UUID, *, lot_id: int, amount: Decimal, limit: Decimal) -> bool:
+        try:
+            reserved = await self._reserve(
+                keys=[self.lot_key(lot_id), self.trade_key(trade_id), self.INDEX_KEY],
+                args=[str(amount), str(limit), str(trade_id), int(time.time() * 1000)],
+            )
+        except RedisError as e:
+            service_logger.warning(f"Reservation of {trade_id} skipped: {e!r}")
+            return True
+
+        return bool(reserved)
+
+    async def release(self, trade_id: UUID) -> None:
+        try:
+            await self._release(keys=[self.trade_key(trade_id), self.INDEX_KEY], args=[str(trade_id)])
+        except RedisError as e:
+            service_logger.warning(f"Release of reservation {trade_id} failed: {e!r}")
+
+    async def stale(self, *, older_than: float, limit: int) -> list[UUID]:
+        """Trades whose reservations were made or last confirmed more than `older_than` seconds ago."""
+        try:
+            trade_ids = await self._redis.zrangebyscore(
+                self.INDEX_KEY, "-inf", int((time.time() - older_than) * 1000), start=0, num=limit
+            )
+        except RedisError as e:
+            service_logger.warning(f"Listing stale reservations failed: {e!r}")
+            return []
+
+        return [UUID(trade_id.decode()) for trade_id in trade_ids]
+
+    async def confirm(self, trade_ids: list[UUID]) -> None:
+        """Marks the reservations of trades found still open as current, for the next sweep to skip."""
+        if not trade_ids:
+            return
+        now = int(time.time() * 1000)
+        try:
+            await self._redis.zadd(self.INDEX_KEY, {str(trade_id): now for trade_id in trade_ids}, xx=True)
+        except RedisError as e:
+            service_logger.warning(f"Confirming {len(trade_ids)} reservations failed: {e!r}")
+
+    async def reserved_for_lot(self, lot_id: int) -> Decimal:
+        value = await self._redis.get(self.lot_key(lot_id))
+        return Decimal(value.decode()) if value else Decimal(0)
+
+
+reservations = ReservationLedger(broker_config.redis_client)
@@ -0,0 +1,55 @@
+import random
+from collections import deque
+from typing import Optional
+
+
+class RetryPolicy:
+    """Bounded attempts with exponential backoff and full jitter."""
+
+    def __init__(self, *, attempts: int, base_delay: float, max_delay: float):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of the request rate.
+
+    Every request deposits `ratio` tokens and every retry or hedge withdraws one, so an
+    unhealthy upstream gets at most `ratio` extra load on top of its regular traffic.
+    """
+
+    def __init__(self, *, ratio: float, capacity: float = 10.0):
+        self._ratio = ratio
+        self._capacity = capacity
+        self._tokens = capacity
+
+    def deposit(self) -> None:
+        self._tokens = min(self._capacity, self._tokens + self._ratio)
+
+    def try_withdraw(self) -> bool:
+        if self._tokens < 1:
+            return False
+        self._tokens -= 1
+        return True
+
+
+class LatencyTracker:
+    """Sliding window of recent latencies in seconds."""
+
+    def __init__(self, *, window: int = 256, min_samples: int = 20):
+        self._samples: deque[float] = deque(maxlen=window)
+        self._min_samples = min_samples
+
+    def observe(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        if len(self._samples) < self._min_samples:
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
@@ -0,0 +1,195 @@
+import asyncio
+import zlib
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Optional, Sequence
+
+from redis import asyncio as aioredis
+from redis.exceptions import ResponseError
+
+from core.config import app_settings
+from core.logger_config import service_logger
+from db.models import Transaction
+
+STREAM_KEY = "transaction_status_changed"
+
+# Attribute of a trade its partition is chosen by. Every event of a trade goes to the same
+# partition whichever is used, so their order is kept.
+PARTITION_KEYS: dict[str, Callable[[Transaction], str]] = {
+    "trade_id": lambda transaction: str(transaction.id),
+    "seller_email": lambda transaction: transaction.seller_email,
+    "buyer_email": lambda transaction: transaction.buyer_email,
+}
+
+
+def stream_key(partition: int) -> str:
+    # A single partition keeps the original key, so existing consumers keep working
+    if app_settings.STATUS_STREAM_PARTITIONS == 1:
+        return STREAM_KEY
+    return f"{STREAM_KEY}:{partition}"
+
+
+def stream_keys() -> list[str]:
+    return [stream_key(partition) for partition in range(app_settings.STATUS_STREAM_PARTITIONS)]
+
+
+def partition_for(transaction: Transaction) -> int:
+    # crc32 rather than hash(), which is salted per process
+    value = PARTITION_KEYS[app_settings.STATUS_STREAM_PARTITION_KEY](transaction)
+    return zlib.crc32(value.encode()) % app_settings.STATUS_STREAM_PARTITIONS
+
+
+def stream_key_for(transaction: Transaction) -> str:
+    return stream_key(partition_for(transaction))
+
+
+@dataclass(frozen=True)
+class StreamEntry:
+    stream: str
+    id: str
+    fields: dict[bytes, bytes]
+
+
+class StreamConsumer:
+    """
+    Member of a consumer group over the status event partitions.
+
+    Consumers of a group share the entries of the partitions they read. Events of a trade are
+    only handled in order when each partition is read by a single consumer, so consumers that
+    need the order are given disjoint `partitions`. Partitions are read with one command each,
+    as they may live on different shards, and a read still blocked on an idle partition is kept
+    for the next call rather than holding up the entries of the others.
+    """
+
+    def __init__(
+        self,
+        redis: aioredis.Redis,  # type: ignore
+        *,
+        group: str,
+        consumer: str,
+        partitions: Optional[Sequence[int]] = None,
+        batch_size: int = app_settings.STATUS_STREAM_BATCH_SIZE,
+        block: int = app_settings.STATUS_STREAM_BLOCK_MS,
+        claim_idle: int = app_settings.STATUS_STREAM_CLAIM_IDLE_MS,
+    ):
+        self._redis = redis
+        self.group = group
+        self.consumer = consumer
+        self.streams = (
+            stream_keys() if partitions is None else [stream_key(partition) for partition in partitions]
+        )
+        self._batch_size = batch_size
+        self._block = block
+        self._claim_idle = claim_idle
+        self._reads: dict[str, asyncio.Task[list[StreamEntry]]] = {}
+
+    async def ensure_groups(self) -> None:
+        """Creates the group on every partition, reading from the start of streams it is new to."""
+        for stream in self.streams:
+            try:
+                await self._redis.xgroup_create(stream, self.group, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    @staticmethod
+    def _entries(stream: str, messages: list[tuple[bytes, dict[bytes, bytes]]]) -> list[StreamEntry]:
+        return [StreamEntry(stream, id.decode(), fields) for id, fields in messages if fields is not None]
+
+    async def _read(self, stream: str) -> list[StreamEntry]:
+        response = await self._redis.xreadgroup(
+            self.group, self.consumer, {stream: ">"}, count=self._batch_size, block=self._block
+        )
+        return [entry for _, messages in response or [] for entry in self._entries(stream, messages)]
+
+    async def read(self) -> list[StreamEntry]:
+        """New entries of the partitions that have some, up to a batch per partition, as soon as any has."""
+        for stream in self.streams:
+            if stream not in self._reads:
+                self._reads[stream] = asyncio.create_task(self._read(stream))
+        done, _ = await asyncio.wait(self._reads.values(), return_when=asyncio.FIRST_COMPLETED)
+
+        entries: list[StreamEntry] = []
+        error: Optional[BaseException] = None
+        for stream, read in list(self._reads.items()):
+            if read not in done:
+                continue
+            del self._reads[stream]
+            if read.exception() is not None:
+                error = error or read.exception()
+            else:
+                entries += read.result()
+        # Entries of the reads that did succeed stay pending and are reclaimed once idle
+        if error is not None:
+            raise error
+        return entries
+
+    def close(self) -> None:
+        """Cancels the reads still blocked on their partitions."""
+        for read in self._reads.values():
+            read.cancel()
+        self._reads.clear()
+
+    async def reclaim(self) -> list[StreamEntry]:
+        """
+        Takes over entries delivered to consumers of the group that have not acknowledged them
+        for longer than `claim_idle` milliseconds, e.g. because the consumer died. Up to a batch
+        in all, so that more is not claimed than is handled before it idles again.
+        """
+        entries: list[StreamEntry] = []
+        for stream in self.streams:
+            start: Optional[str] = "0-0"
+            while start is not None and len(entries) < self._batch_size:
+                start, claimed = await self._autoclaim(stream, start, self._batch_size - len(entries))
+                entries += claimed
+        return entries
+
+    async def _autoclaim(self, stream: str, start: str, count: int) -> tuple[Optional[str], list[StreamEntry]]:
+        """One XAUTOCLAIM page and the id to continue from, None once the pending list is done."""
+        response = await self._redis.xautoclaim(
+            stream, self.group, self.consumer, self._claim_idle, start, count=count  # type: ignore[arg-type]
+        )
+        if response and isinstance(response[0], (bytes, str)):
+            # Cursor and entries, followed by deleted ids on Redis 7
+            cursor = response[0].decode() if isinstance(response[0], bytes) else response[0]
+            return (None if cursor == "0-0" else cursor), self._entries(stream, response[1])
+
+        # Clients before redis-py 4.4 return the entries only; a short page ends the list
+        entries = self._entries(stream, response)
+        if len(response) < count:
+            return None, entries
+        last = response[-1][0].decode() if isinstance(response[-1][0], bytes) else response[-1][0]
+        milliseconds, sequence = last.split("-")
+        return f"{milliseconds}-{int(sequence) + 1}", entries
+
+    async def ack(self, entries: Sequence[StreamEntry]) -> None:
+        """Acknowledges entries with one XACK per partition, sent in a single round trip."""
+        ids: dict[str, list[str]] = {}
+        for entry in entries:
+            ids.setdefault(entry.stream, []).append(entry.id)
+        if not ids:
+            return
+        async with self._redis.pipeline(transaction=False) as pipe:
+            for stream, stream_ids in ids.items():
+                pipe.xack(stream, self.group, *stream_ids)  # type: ignore[no-untyped-call]
+            await pipe.execute()
+
+    async def run(self, handler: Callable[[list[StreamEntry]], Awaitable[None]]) -> None:
+        """
+        Hands batches of entries to `handler` and acknowledges them once it returns. Entries of
+        a failed batch stay pending and are reclaimed, by this or another consumer, once idle.
+        """
+        await self.ensure_groups()
+        try:
+            while True:
+                entries = await self.reclaim() or await self.read()
+                if not entries:
+                    continue
+                try:
+                    await handler(entries)
+                except Exception as e:
+                    service_logger.warning(f"Consumer {self.consumer} of {self.group} failed a batch: {e!r}")
+                    await asyncio.sleep(self._block / 1000)
+                    continue
+                await self.ack(entries)
+        finally:
+            self.close()
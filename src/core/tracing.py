@@ -0,0 +1,381 @@
+import atexit
+import contextvars
+import functools
+import importlib
+import inspect
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import (
+    IO,
+    Any,
+    Awaitable,
+    Callable,
+    Iterable,
+    Iterator,
+    Optional,
+    ParamSpec,
+    Protocol,
+    TypeVar,
+)
+
+import orjson
+from starlette.datastructures import Headers
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from core.config import app_settings
+from core.logger_config import service_logger
+from core.metrics import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+P = ParamSpec("P")
+
+TRACEPARENT_HEADER = "traceparent"
+
+
+@dataclass(frozen=True)
+class SpanContext:
+    trace_id: str
+    span_id: str
+    sampled: bool = True
+
+    @property
+    def traceparent(self) -> str:
+        """W3C Trace Context `traceparent` value."""
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @classmethod
+    def from_traceparent(cls, value: Optional[str]) -> Optional["SpanContext"]:
+        if not value:
+            return None
+        parts = value.strip().split("-")
+        if len(parts) < 4 or parts[0] == "ff" or len(parts[1]) != 32 or len(parts[2]) != 16:
+            return None
+        try:
+            trace_id, span_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3][:2], 16)
+        except ValueError:
+            return None
+        if trace_id == 0 or span_id == 0:
+            return None
+        return cls(trace_id=parts[1], span_id=parts[2], sampled=bool(flags & 1))
+
+
+@dataclass
+class Span:
+    name: str
+    context: SpanContext
+    parent_id: Optional[str]
+    kind: str = "internal"
+    attributes: dict[str, Any] = field(default_factory=dict)
+    start_ns: int = field(default_factory=time.time_ns)
+    end_ns: Optional[int] = None
+    error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "trace_id": self.context.trace_id,
+            "span_id": self.context.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6 if self.end_ns is not None else None,
+            "attributes": self.attributes,
+            "error": self.error,
+            "service": app_settings.TRACING_SERVICE_NAME,
+        }
+
+
+class SpanExporter(Protocol):
+    """What exporters provide, whether registered here or loaded from a "package.module:factory" path."""
+
+    def export(self, span: Span) -> None:
+        ...
+
+
+dropped_spans = metrics.counter(
+    "trade_tracing_dropped_spans_total", "Spans dropped as the export queue was full"
+)
+
+
+class StreamExporter:
+    """
+    Writes finished spans as JSON lines from a background thread, so ending a span never waits
+    on the stream. Spans queued together are written with a single flush.
+    """
+
+    def __init__(self, stream: IO[bytes], *, max_queue: int = app_settings.TRACING_QUEUE_SIZE):
+        self._stream = stream
+        self._max_queue = max_queue
+        self._start()
+        # Forked processes, such as Celery's pool workers, inherit the queue but not the thread
+        os.register_at_fork(after_in_child=self._start)
+        atexit.register(self.close)
+
+    def _start(self) -> None:
+        self._queue: queue.Queue[Optional[Span]] = queue.Queue(maxsize=self._max_queue)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            dropped_spans.inc()
+
+    def close(self) -> None:
+        """Writes the spans still queued and stops the thread."""
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def _run(self) -> None:
+        while True:
+            spans = [self._queue.get()]
+            while True:
+                try:
+                    spans.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            try:
+                self._stream.write(
+                    b"".join(
+                        orjson.dumps(span.to_dict(), default=str) + b"\n" for span in spans if span is not None
+                    )
+                )
+                self._stream.flush()
+            except Exception as e:
+                service_logger.warning(f"Exporting {len(spans)} spans failed: {e!r}")
+
+            if None in spans:
+                return
+
+
+def _stdout_exporter() -> SpanExporter:
+    return StreamExporter(sys.stdout.buffer)
+
+
+def _file_exporter() -> SpanExporter:
+    return StreamExporter(open(app_settings.TRACING_FILE, "ab"))
+
+
+EXPORTERS: dict[str, Callable[[], SpanExporter]] = {
+    "stdout": _stdout_exporter,
+    "file": _file_exporter,
+}
+
+
+def load_exporter(name: str) -> Optional[SpanExporter]:
+    """
+    Exporter by its registered name, or by a "package.module:factory" path for exporters
+    living outside this service. "none" disables tracing.
+    """
+    if name == "none":
+        return None
+    if name in EXPORTERS:
+        return EXPORTERS[name]()
+    module_name, _, attribute = name.partition(":")
+    exporter: SpanExporter = getattr(importlib.import_module(module_name), attribute)()
+    return exporter
+
+
+_current_span: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+# Object and method of the innermost traced method call, so calls through super() share its span
+_traced_call: contextvars.ContextVar[Optional[tuple[int, str]]] = contextvars.ContextVar(
+    "traced_call", default=None
+)
+# Set on functions that already run in a span, which are not wrapped again
+TRACED_ATTRIBUTE = "__traced__"
+
+
+class Tracer:
+    def __init__(self, exporter: Optional[SpanExporter], *, sample_rate: float):
+        self.exporter = exporter
+        self._sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    def start_span(
+        self,
+        name: str,
+        *,
+        kind: str = "internal",
+        parent: Optional[SpanContext] = None,
+        attributes: Optional[dict[str, Any]] = None,
+    ) -> tuple[Optional[Span], Optional[contextvars.Token[Optional[Span]]]]:
+        """
+        Starts a span as a child of `parent` or of the current span and makes it current.
+        Spans of unsampled traces still carry their context downstream but are not exported.
+        With tracing disabled nothing is created and the result is (None, None).
+        """
+        if self.exporter is None:
+            return None, None
+
+        if parent is None:
+            current = _current_span.get()
+            parent = current.context if current is not None else None
+
+        if parent is None:
+            context = SpanContext(
+                trace_id=f"{random.getrandbits(128):032x}",
+                span_id=f"{random.getrandbits(64):016x}",
+                sampled=random.random() < self._sample_rate,
+            )
+        else:
+            context = SpanContext(
+                trace_id=parent.trace_id, span_id=f"{random.getrandbits(64):016x}", sampled=parent.sampled
+            )
+
+        span = Span(
+            name=name,
+            context=context,
+            parent_id=parent.span_id if parent is not None else None,
+            kind=kind,
+            attributes=attributes or {},
+        )
+        return span, _current_span.set(span)
+
+    def end_span(
+        self,
+        span: Optional[Span],
+        token: Optional[contextvars.Token[Optional[Span]]],
+        error: Optional[BaseException] = None,
+    ) -> None:
+        if span is None or token is None:
+            return
+        span.end_ns = time.time_ns()
+        if error is not None:
+            span.error = repr(error)
+        _current_span.reset(token)
+        if span.context.sampled and self.exporter is not None:
+            self.exporter.export(span)
+
+    @contextmanager
+    def span(
+        self,
+        name: str,
+        *,
+        kind: str = "internal",
+        parent: Optional[SpanContext] = None,
+        attributes: Optional[dict[str, Any]] = None,
+    ) -> Iterator[Optional[Span]]:
+        span, token = self.start_span(name, kind=kind, parent=parent, attributes=attributes)
+        try:
+            yield span
+        except BaseException as e:
+            self.end_span(span, token, e)
+            raise
+        self.end_span(span, token)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def inject(headers: dict[str, str]) -> dict[str, str]:
+    """Adds the current span's `traceparent` to outgoing headers."""
+    span = _current_span.get()
+    if span is not None:
+        headers[TRACEPARENT_HEADER] = span.context.traceparent
+    return headers
+
+
+tracer = Tracer(load_exporter(app_settings.TRACING_EXPORTER), sample_rate=app_settings.TRACING_SAMPLE_RATE)
+
+
+def traced(name: str) -> Callable[[Callable[P, Awaitable[R]]], Callable[P, Awaitable[R]]]:
+    """Runs every call of a coroutine function in a span."""
+
+    def decorator(function: Callable[P, Awaitable[R]]) -> Callable[P, Awaitable[R]]:
+        @functools.wraps(function)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            with tracer.span(name):
+                return await function(*args, **kwargs)
+
+        setattr(wrapper, TRACED_ATTRIBUTE, True)
+        return wrapper
+
+    return decorator
+
+
+def _traced_method(
+    name: str, attribute: str, function: Callable[..., Awaitable[R]]
+) -> Callable[..., Awaitable[R]]:
+    @functools.wraps(function)
+    async def wrapper(self: Any, *args: Any, **kwargs: Any) -> R:
+        call = (id(self), attribute)
+        if _traced_call.get() == call:
+            return await function(self, *args, **kwargs)
+
+        token = _traced_call.set(call)
+        try:
+            with tracer.span(name):
+                return await function(self, *args, **kwargs)
+        finally:
+            _traced_call.reset(token)
+
+    setattr(wrapper, TRACED_ATTRIBUTE, True)
+    return wrapper
+
+
+def traced_methods(prefix: str, *, private: Iterable[str] = ()) -> Callable[[type[T]], type[T]]:
+    """
+    Class decorator tracing the public coroutine methods defined on the class, and the private ones
+    named in `private`, as `prefix.Class.method`. An override calling the method it overrides through
+    super() is recorded once, under the overriding class.
+    """
+    private = set(private)
+
+    def decorator(cls: type[T]) -> type[T]:
+        missing = private - vars(cls).keys()
+        if missing:
+            raise TypeError(f"{cls.__name__} has no methods {', '.join(sorted(missing))} to trace")
+
+        for attribute, value in list(vars(cls).items()):
+            if attribute.startswith("_") and attribute not in private:
+                continue
+            if not inspect.iscoroutinefunction(value) or getattr(value, TRACED_ATTRIBUTE, False):
+                continue
+            setattr(cls, attribute, _traced_method(f"{prefix}.{cls.__name__}.{attribute}", attribute, value))
+        return cls
+
+    return decorator
+
+
+class TracingMiddleware:
+    """Server span per request, continuing the caller's trace from its `traceparent` header."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or not tracer.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        parent = SpanContext.from_traceparent(Headers(scope=scope).get(TRACEPARENT_HEADER))
+        with tracer.span(
+            f"{scope['method']} {scope['path']}",
+            kind="server",
+            parent=parent,
+            attributes={"http.method": scope["method"]},
+        ) as span:
+
+            async def send_with_status(message: Message) -> None:
+                if span is not None and message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                await send(message)
+
+            await self.app(scope, receive, send_with_status)
@@ -0,0 +1,82 @@
+import datetime
+from typing import Optional
+from urllib.parse import urljoin
+
+import httpx
+
+from core import upstream
+from core.config import app_settings
+from core.logger_config import service_logger
+from core.wallets import get_p2p_wallet_id
+from db.models.transaction import Transaction
+
+
+class TransferRejected(Exception):
+    """The crypto service refused a transfer, so it was not executed and resending it will not help."""
+
+
+def _transfer_url(transaction: Transaction, path: str) -> str:
+    return urljoin(app_settings.CRYPTO_SERVICE_API, f"/api/v1/{transaction.crypto_type.value}/transfer/{path}")
+
+
+def _parse_transfer(response: httpx.Response) -> tuple[str, datetime.datetime]:
+    response_data = response.json()
+    # 2022-06-04T20:54:19
+    return response_data["transactionHash"], datetime.datetime.strptime(
+        response_data["transactionDate"].split(".")[0], "%Y-%m-%dT%H:%M:%S"
+    )
+
+
+async def find_transfer(
+    client: httpx.AsyncClient, transaction: Transaction
+) -> Optional[tuple[str, datetime.datetime]]:
+    """
+    Looks up the transfer of `transaction` by the idempotency key it is sent with, so that a transfer
+    whose outcome is unknown is checked rather than sent again.
+    :return: Blockchain transaction hash and date, or None if the crypto service has not executed it
+    """
+    response = await upstream.get(client, _transfer_url(transaction, str(transaction.id)))
+
+    if response.status_code == httpx.codes.NOT_FOUND:
+        return None
+
+    response.raise_for_status()
+
+    return _parse_transfer(response)
+
+
+async def transfer_from_p2p(
+    client: httpx.AsyncClient, *, wallet_id: str, transaction: Transaction
+) -> tuple[str, datetime.datetime]:
+    """
+    Transfers the traded amount from the seller's P2P wallet to the buyer.
+    The trade id is sent as the idempotency key, so a retried transfer is not executed twice.
+    :return: Blockchain transaction hash and date
+    :raises TransferRejected: The crypto service answered with a client error
+    """
+    recipient_wallet_id = await get_p2p_wallet_id(client, transaction.buyer_email)
+    response = await upstream.send(
+        client,
+        "POST",
+        _transfer_url(transaction, "from_p2p"),
+        json={
+            "walletId": wallet_id,
+            "recipientId": recipient_wallet_id,
+            "amount": float(transaction.amount),
+        },
+        headers={"Idempotency-Key": str(transaction.id)},
+        timeout=httpx.Timeout(
+            app_settings.TRANSFER_READ_TIMEOUT, connect=app_settings.UPSTREAM_CONNECT_TIMEOUT
+        ),
+    )
+
+    service_logger.info(
+        f"Transfer of {transaction.id} status code: {response.status_code}; Text: {response.text}"
+    )
+
+    if response.is_client_error:
+        raise TransferRejected(response.text)
+
+    response.raise_for_status()
+
+    return _parse_transfer(response)
@@ -0,0 +1,236 @@
+import asyncio
+import time
+from typing import Any, Callable, Coroutine, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from core.circuit_breaker import CircuitBreaker
+from core.config import app_settings
+from core.deadline import current_deadline
+from core.logger_config import service_logger
+from core.metrics import Sample, metrics
+from core.retry import LatencyTracker, RetryBudget, RetryPolicy
+from core.tracing import inject, tracer
+from exceptions import DeadlineExceeded, UpstreamUnavailable
+
+RETRYABLE_STATUS_CODES = frozenset(
+    {httpx.codes.BAD_GATEWAY, httpx.codes.SERVICE_UNAVAILABLE, httpx.codes.GATEWAY_TIMEOUT}
+)
+
+# Calls may pass their own `timeout` for slow routes; either is cut to the request's deadline
+DEFAULT_TIMEOUT = httpx.Timeout(
+    app_settings.UPSTREAM_READ_TIMEOUT, connect=app_settings.UPSTREAM_CONNECT_TIMEOUT
+)
+
+retry_policy = RetryPolicy(
+    attempts=app_settings.UPSTREAM_RETRY_ATTEMPTS,
+    base_delay=app_settings.UPSTREAM_RETRY_BASE_DELAY,
+    max_delay=app_settings.UPSTREAM_RETRY_MAX_DELAY,
+)
+
+
+class Upstream:
+    """Client-side state kept per upstream base URL."""
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url
+        self.retry_budget = RetryBudget(ratio=app_settings.UPSTREAM_RETRY_BUDGET_RATIO)
+        self.latency = LatencyTracker()
+        # Bulkhead: calls over the limit fail fast instead of queueing for the client's connections
+        self.max_concurrency = app_settings.UPSTREAM_MAX_CONCURRENCY
+        self.in_flight = 0
+        self.breaker = CircuitBreaker(
+            base_url,
+            window=app_settings.CIRCUIT_BREAKER_WINDOW,
+            min_calls=app_settings.CIRCUIT_BREAKER_MIN_CALLS,
+            error_rate=app_settings.CIRCUIT_BREAKER_ERROR_RATE,
+            slow_call_duration=app_settings.CIRCUIT_BREAKER_SLOW_CALL_DURATION,
+            slow_call_rate=app_settings.CIRCUIT_BREAKER_SLOW_CALL_RATE,
+            open_duration=app_settings.CIRCUIT_BREAKER_OPEN_DURATION,
+            half_open_calls=app_settings.CIRCUIT_BREAKER_HALF_OPEN_CALLS,
+        )
+
+    def hedge_delay(self) -> Optional[float]:
+        if not app_settings.UPSTREAM_HEDGING_ENABLED:
+            return None
+        p95 = self.latency.percentile(0.95)
+        if p95 is None:
+            return None
+        return max(p95, app_settings.UPSTREAM_HEDGE_MIN_DELAY)
+
+
+_upstreams: dict[str, Upstream] = {}
+
+
+def get_upstream(url: str) -> Upstream:
+    parts = urlsplit(url)
+    base_url = f"{parts.scheme}://{parts.netloc}"
+    upstream = _upstreams.get(base_url)
+    if upstream is None:
+        upstream = _upstreams[base_url] = Upstream(base_url)
+    return upstream
+
+
+def _circuit_states() -> list[Sample]:
+    return [({"upstream": base_url}, upstream.breaker.state.value) for base_url, upstream in _upstreams.items()]
+
+
+metrics.gauge(
+    "trade_upstream_circuit_state",
+    "Circuit breaker state per upstream (0 closed, 1 open, 2 half-open)",
+    _circuit_states,
+)
+upstream_calls = metrics.counter("trade_upstream_calls_total", "Calls to upstream services by outcome")
+
+
+def _is_retryable(response: httpx.Response) -> bool:
+    return response.status_code in RETRYABLE_STATUS_CODES
+
+
+_TIMEOUT_PHASES: dict[type[httpx.TimeoutException], str] = {
+    httpx.ConnectTimeout: "connect",
+    httpx.ReadTimeout: "read",
+    httpx.WriteTimeout: "write",
+    httpx.PoolTimeout: "pool",
+}
+
+
+def _cut_short(error: httpx.TimeoutException, configured: httpx.Timeout, clamped: httpx.Timeout) -> bool:
+    """Whether the phase that timed out had its timeout shortened to fit the deadline."""
+    for error_type, phase in _TIMEOUT_PHASES.items():
+        if isinstance(error, error_type):
+            limit, original = getattr(clamped, phase), getattr(configured, phase)
+            return limit is not None and (original is None or limit < original)
+    return False
+
+
+async def _call(
+    upstream: Upstream, method: str, client: httpx.AsyncClient, url: str, **kwargs: Any
+) -> httpx.Response:
+    """Single request through the upstream's bulkhead and circuit breaker, within the request's deadline."""
+    configured = timeout = kwargs.pop("timeout", DEFAULT_TIMEOUT)
+    headers = dict(kwargs.pop("headers", None) or {})
+    deadline = current_deadline()
+    if deadline is not None:
+        if deadline.expired:
+            upstream_calls.inc(upstream=upstream.base_url, outcome="deadline")
+            raise DeadlineExceeded()
+        timeout = deadline.clamp(configured)
+        headers[app_settings.DEADLINE_HEADER] = deadline.header()
+
+    if upstream.in_flight >= upstream.max_concurrency:
+        upstream_calls.inc(upstream=upstream.base_url, outcome="shed")
+        raise UpstreamUnavailable(headers={"Retry-After": "1"})
+
+    try:
+        upstream.breaker.before_call()
+    except UpstreamUnavailable:
+        upstream_calls.inc(upstream=upstream.base_url, outcome="rejected")
+        raise
+
+    started = time.monotonic()
+    upstream.in_flight += 1
+    try:
+        with tracer.span(
+            f"HTTP {method}", kind="client", attributes={"http.method": method, "http.url": url}
+        ) as span:
+            response = await client.request(method, url, headers=inject(headers), timeout=timeout, **kwargs)
+            if span is not None:
+                span.set_attribute("http.status_code", response.status_code)
+    except httpx.HTTPError as e:
+        if isinstance(e, httpx.TimeoutException) and _cut_short(e, configured, timeout):
+            # Cut short by the request's budget, which says nothing about the upstream's health
+            upstream.breaker.on_cancel()
+            upstream_calls.inc(upstream=upstream.base_url, outcome="deadline")
+            raise DeadlineExceeded() from e
+        upstream.breaker.on_result(duration=time.monotonic() - started, failed=True)
+        upstream_calls.inc(upstream=upstream.base_url, outcome="error")
+        raise
+    except BaseException:
+        upstream.breaker.on_cancel()
+        raise
+    finally:
+        upstream.in_flight -= 1
+
+    failed = response.status_code >= httpx.codes.INTERNAL_SERVER_ERROR
+    upstream.breaker.on_result(duration=time.monotonic() - started, failed=failed)
+    upstream_calls.inc(upstream=upstream.base_url, outcome="error" if failed else "ok")
+    return response
+
+
+async def _hedged(
+    upstream: Upstream, attempt: Callable[[], Coroutine[Any, Any, httpx.Response]]
+) -> httpx.Response:
+    """
+    Runs `attempt` and, if it is still pending after the upstream's p95 latency, races a
+    second copy of it. The first successful response wins and the other one is cancelled.
+    """
+    first: asyncio.Task[httpx.Response] = asyncio.create_task(attempt())
+    delay = upstream.hedge_delay()
+
+    if delay is None:
+        return await first
+
+    done, _ = await asyncio.wait({first}, timeout=delay)
+    if done or not upstream.retry_budget.try_withdraw():
+        return await first
+
+    service_logger.info(f"Hedging request to {upstream.base_url} after {delay:.3f}s")
+    pending = {first, asyncio.create_task(attempt())}
+
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None and not _is_retryable(task.result()):
+                    return task.result()
+        return first.result()
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def get(client: httpx.AsyncClient, url: str, **kwargs: Any) -> httpx.Response:
+    """
+    Idempotent GET with bounded, budgeted retries and optional hedging.
+    Must not be used for requests with side effects.
+    """
+    upstream = get_upstream(url)
+    upstream.retry_budget.deposit()
+
+    async def attempt() -> httpx.Response:
+        started = time.monotonic()
+        response = await _call(upstream, "GET", client, url, **kwargs)
+        if not _is_retryable(response):
+            upstream.latency.observe(time.monotonic() - started)
+        return response
+
+    attempt_number = 1
+    deadline = current_deadline()
+
+    def can_retry(delay: float) -> bool:
+        # A retry that could not finish before the deadline only adds load
+        return attempt_number < retry_policy.attempts and (deadline is None or deadline.allows(delay))
+
+    while True:
+        delay = retry_policy.backoff(attempt_number)
+
+        try:
+            response = await _hedged(upstream, attempt)
+        except httpx.TransportError as e:
+            if not (can_retry(delay) and upstream.retry_budget.try_withdraw()):
+                raise
+            service_logger.warning(f"GET {url} failed with {e!r}, retrying")
+        else:
+            if not (_is_retryable(response) and can_retry(delay) and upstream.retry_budget.try_withdraw()):
+                return response
+            service_logger.warning(f"GET {url} returned {response.status_code}, retrying")
+
+        await asyncio.sleep(delay)
+        attempt_number += 1
+
+
+async def send(client: httpx.AsyncClient, method: str, url: str, **kwargs: Any) -> httpx.Response:
+    """Single attempt request for calls with side effects, guarded by the circuit breaker only."""
+    return await _call(get_upstream(url), method, client, url, **kwargs)
@@ -0,0 +1,114 @@
+from decimal import Decimal
+from typing import Optional
+from urllib.parse import urljoin
+
+import httpx
+
+from core import upstream
+from core.config import app_settings
+from core.logger_config import service_logger
+
+
+async def get_p2p_wallet_id(client: httpx.AsyncClient, email: str) -> str:
+    response = await upstream.get(
+        client,
+        urljoin(
+            app_settings.WALLET_SERVICE_API,
+            f"/api/v1/wallets/eth/email/{email}/p2p",
+        ),
+    )
+
+    service_logger.info(f"Get P2P wallet ID status code: {response.status_code}; Text: {response.text}")
+
+    response.raise_for_status()
+
+    response_data = response.json()
+
+    return str(response_data["id"])
+
+
+async def get_p2p_reserved_balance(
+    client: httpx.AsyncClient, *, blockchain_id: str, crypto_type: str, sell_type: str
+) -> Decimal:
+    """
+    Amount the wallet service holds back from the P2P wallet for open trades.
+    Expected contract, not yet provided by the wallet service: GET
+    `/api/v1/wallets/{crypto}/{wallet id}/p2p/reservedToSell|reservedToBuy` answering with the
+    amount as plain text. Only reconciliation calls it, and only with RECONCILIATION_ENABLED.
+    """
+    response = await upstream.get(
+        client,
+        urljoin(
+            app_settings.WALLET_SERVICE_API,
+            f"/api/v1/wallets/{crypto_type}/{blockchain_id}/p2p/"
+            f"{'reservedToSell' if sell_type == 'sell' else 'reservedToBuy'}",
+        ),
+    )
+    response.raise_for_status()
+    return Decimal(response.text)
+
+
+async def _change_p2p_balance(
+    client: httpx.AsyncClient,
+    action: str,
+    *,
+    amount: Decimal,
+    blockchain_id: str,
+    crypto_type: str,
+    idempotency_key: Optional[str],
+) -> None:
+    headers = {"Content-Type": "application/json"}
+    if idempotency_key is not None:
+        headers["Idempotency-Key"] = idempotency_key
+
+    response = await upstream.send(
+        client,
+        "PUT",
+        urljoin(app_settings.WALLET_SERVICE_API, f"/api/v1/wallets/{crypto_type}/p2p/{action}"),
+        json={"walletId": blockchain_id, "amount": float(amount)},
+        headers=headers,
+    )
+
+    service_logger.info(
+        f"{action} for {blockchain_id} status code: {response.status_code}; Text: {response.text}"
+    )
+
+    response.raise_for_status()
+
+
+async def increase_p2p_balance(
+    client: httpx.AsyncClient,
+    *,
+    amount: Decimal,
+    blockchain_id: str,
+    crypto_type: str,
+    sell_type: str,
+    idempotency_key: Optional[str] = None,
+) -> None:
+    await _change_p2p_balance(
+        client,
+        "increaseToSell" if sell_type == "sell" else "increaseToBuy",
+        amount=amount,
+        blockchain_id=blockchain_id,
+        crypto_type=crypto_type,
+        idempotency_key=idempotency_key,
+    )
+
+
+async def reduce_p2p_balance(
+    client: httpx.AsyncClient,
+    *,
+    amount: Decimal,
+    blockchain_id: str,
+    crypto_type: str,
+    sell_type: str,
+    idempotency_key: Optional[str] = None,
+) -> None:
+    await _change_p2p_balance(
+        client,
+        "reduceToSell" if sell_type == "sell" else "reduceToBuy",
+        amount=amount,
+        blockchain_id=blockchain_id,
+        crypto_type=crypto_type,
+        idempotency_key=idempotency_key,
+    )
@@ -1 +1,3 @@
+from .crud_balance_adjustment import balance_adjustments
 from .crud_transaction import transactions
+from .crud_transaction_transition import transitions
@@ -0,0 +1,104 @@
+import datetime
+from typing import Sequence
+from uuid import UUID
+
+from sqlalchemy import func, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.tracing import traced_methods
+from crud.base import CRUDBase
+from db.capabilities import now_plus, supports_returning
+from db.models import BalanceAdjustment
+from db.models.balance_adjustment import AdjustmentStatus
+from schemas.balance_adjustment import BalanceAdjustmentCreate
+
+
+@traced_methods("crud")
+class CRUDBalanceAdjustment(CRUDBase[BalanceAdjustment, BalanceAdjustmentCreate, BalanceAdjustmentCreate]):
+    def stage(self, db: AsyncSession, *, obj_in: BalanceAdjustmentCreate) -> BalanceAdjustment:
+        """Adds an adjustment to the session; it is committed together with the caller's next commit."""
+        db_obj = self.model(**obj_in.dict())
+        db.add(db_obj)
+        return db_obj
+
+    async def claim_due(
+        self, db: AsyncSession, *, limit: int, lease: datetime.timedelta
+    ) -> list[BalanceAdjustment]:
+        """
+        Leases due pending adjustments by pushing their next attempt past `lease`, so rows
+        are not locked while the wallet service is called and a crashed worker's rows come back.
+        """
+        due = (
+            select(self.model.id)
+            .filter(self.model.status == AdjustmentStatus.PENDING, self.model.next_attempt_at <= func.now())
+            .order_by(self.model.next_attempt_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        values = {"next_attempt_at": now_plus(db, lease), "attempts": self.model.attempts + 1}
+        if supports_returning(db):
+            query = (
+                update(self.model)
+                .where(self.model.id.in_(due.scalar_subquery()))
+                .values(**values)
+                .returning(self.model)
+                .execution_options(synchronize_session=False)
+            )
+            result = await db.execute(select(self.model).from_statement(query))
+        else:
+            ids = (await db.execute(due)).scalars().all()
+            await db.execute(
+                update(self.model)
+                .where(self.model.id.in_(ids))
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+            result = await db.execute(
+                select(self.model).filter(self.model.id.in_(ids)).execution_options(populate_existing=True)
+            )
+        adjustments = result.scalars().all()
+        await db.commit()
+        return adjustments
+
+    async def pending_seller_emails(self, db: AsyncSession, *, seller_emails: Sequence[str]) -> set[str]:
+        result = await db.execute(
+            select(self.model.seller_email)
+            .filter(self.model.status == AdjustmentStatus.PENDING, self.model.seller_email.in_(seller_emails))
+            .distinct()
+        )
+        return set(result.scalars().all())
+
+    async def mark_done(self, db: AsyncSession, *, ids: Sequence[UUID]) -> None:
+        if not ids:
+            return
+        await db.execute(
+            update(self.model)
+            .where(self.model.id.in_(ids))
+            .values(status=AdjustmentStatus.DONE, last_error=None)
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+    async def reschedule(
+        self,
+        db: AsyncSession,
+        *,
+        adjustment: BalanceAdjustment,
+        delay: datetime.timedelta,
+        error: str,
+        give_up: bool
+    ) -> None:
+        await db.execute(
+            update(self.model)
+            .where(self.model.id == adjustment.id)
+            .values(
+                status=AdjustmentStatus.FAILED if give_up else AdjustmentStatus.PENDING,
+                next_attempt_at=now_plus(db, delay),
+                last_error=error,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        await db.commit()
+
+
+balance_adjustments = CRUDBalanceAdjustment(BalanceAdjustment)
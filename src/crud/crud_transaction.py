@@ -1,17 +1,59 @@
+import datetime
+import uuid
 from decimal import ROUND_UP, Decimal
-from typing import Any
+from typing import Any, AsyncIterator, Optional, Sequence, Union
 
-from sqlalchemy import select
+from sqlalchemy import any_, bindparam, delete, func, insert, select, union_all, update
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import BindParameter
 
+from core.config import app_settings
+from core.tracing import traced_methods
 from crud.base import CRUDBase
-from db.models import Transaction
-from db.models.transaction import CryptoType, FiatType, SellType
-from schemas.transaction import TransactionCreate, TransactionUpdate
+from crud.crud_transaction_transition import transitions
+from db.capabilities import is_postgresql, supports_returning
+from db.explain import explain
+from db.models import Transaction, TransactionArchive
+from db.models.transaction import CryptoType, FiatType, SellType, TransactionStatus
+from db.models.transaction_transition import SYSTEM_ACTOR
+from exceptions import UnsupportedFilterException
+from schemas.transaction import (
+    SortOrder,
+    TransactionCreate,
+    TransactionFilter,
+    TransactionUpdate,
+)
+from schemas.transaction_transition import TransactionTransitionCreate
 
+# Inlined rather than bound, so the planner can match the partial indexes' predicate
+# in generic plans of prepared statements as well
+ACTIVE_STATUSES: BindParameter[Any] = bindparam(
+    "active_statuses", TransactionStatus.active_statuses, expanding=True, literal_execute=True
+)
+AWAITING_STATUSES: BindParameter[Any] = bindparam(
+    "awaiting_statuses", TransactionStatus.awaiting_statuses, expanding=True, literal_execute=True
+)
 
+# Read-only views of archived trades and of all trades, mapped onto Transaction so callers
+# can't tell where a row lives. Archived trades are closed and never written through these.
+archived_transactions = aliased(Transaction, TransactionArchive.__table__, adapt_on_names=True)
+all_transactions = aliased(
+    Transaction,
+    union_all(select(Transaction.__table__), select(TransactionArchive.__table__)).subquery("all_transactions"),
+    adapt_on_names=True,
+)
+
+
+@traced_methods("crud")
 class CRUDTransaction(CRUDBase[Transaction, TransactionCreate, TransactionUpdate]):
-    async def create_transaction(self, db: AsyncSession, *, transaction_data: dict[str, Any]) -> Transaction:
+    @staticmethod
+    def _prepare_transaction_data(transaction_data: dict[str, Any]) -> dict[str, Any]:
+        transaction_data["expires_at"] = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(
+            minutes=app_settings.TRANSACTION_EXPIRE_TIME
+        )
         transaction_data["fiat_type"] = FiatType(transaction_data["fiat_type"])
         transaction_data["crypto_type"] = CryptoType(transaction_data["crypto_type"])
         transaction_data["sell_type"] = SellType(transaction_data["sell_type"])
@@ -21,25 +63,460 @@ class CRUDTransaction(CRUDBase[Transaction, TransactionCreate, TransactionUpdate
         ) * Decimal(transaction_data.pop("price")).quantize(Decimal(".0001"), rounding=ROUND_UP).quantize(
             Decimal(".0001"), rounding=ROUND_UP
         )
+        return transaction_data
+
+    @staticmethod
+    async def _record_transitions(
+        db: AsyncSession,
+        ids: Sequence[uuid.UUID],
+        from_status: Optional[TransactionStatus],
+        to_status: TransactionStatus,
+        actor: str,
+    ) -> None:
+        await transitions.record(
+            db,
+            objs_in=[
+                TransactionTransitionCreate(
+                    transaction_id=id, from_status=from_status, to_status=to_status, actor=actor
+                )
+                for id in ids
+            ],
+        )
 
-        db_obj = self.model(**transaction_data)
+    async def create_transaction(
+        self, db: AsyncSession, *, transaction_data: dict[str, Any], actor: str
+    ) -> Transaction:
+        db_obj = self.model(**self._prepare_transaction_data(transaction_data))
         db.add(db_obj)
+        await db.flush()
+        await self._record_transitions(db, [db_obj.id], None, TransactionStatus.CREATED, actor)
         await db.commit()
         await db.refresh(db_obj)
         return db_obj
 
+    async def create_transactions(
+        self, db: AsyncSession, *, transactions_data: list[dict[str, Any]], actor: str
+    ) -> list[Transaction]:
+        """Inserts several transactions with a single multi-row INSERT."""
+        rows = [self._prepare_transaction_data(transaction_data) for transaction_data in transactions_data]
+        if supports_returning(db):
+            statement = insert(self.model).values(rows).returning(*self.model.__table__.columns)
+            result = await db.execute(select(self.model).from_statement(statement))
+        else:
+            for row in rows:
+                row.setdefault("id", uuid.uuid4())
+            await db.execute(insert(self.model).values(rows))
+            result = await db.execute(select(self.model).filter(self.model.id.in_([row["id"] for row in rows])))
+        transactions = result.scalars().all()
+        await self._record_transitions(
+            db, [transaction.id for transaction in transactions], None, TransactionStatus.CREATED, actor
+        )
+        await db.commit()
+        return transactions
+
+    async def _update_returning(
+        self, db: AsyncSession, criterion: Any, values: dict[str, Any]
+    ) -> list[Transaction]:
+        """UPDATE returning the updated rows; without RETURNING support they are selected by id."""
+        if supports_returning(db):
+            statement = (
+                update(self.model).where(criterion).values(**values).returning(*self.model.__table__.columns)
+            )
+            result = await db.execute(
+                select(self.model).from_statement(statement).execution_options(populate_existing=True)
+            )
+            return result.scalars().all()
+
+        ids = (await db.execute(select(self.model.id).filter(criterion))).scalars().all()
+        await db.execute(
+            update(self.model)
+            .where(self.model.id.in_(ids))
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        result = await db.execute(
+            select(self.model).filter(self.model.id.in_(ids)).execution_options(populate_existing=True)
+        )
+        return result.scalars().all()
+
+    async def update(
+        self,
+        db: AsyncSession,
+        *,
+        db_obj: Transaction,
+        obj_in: Union[TransactionUpdate, dict[str, Any]],
+        actor: str = SYSTEM_ACTOR,
+    ) -> Transaction:
+        """Updates a transaction, recording its status change in the same database transaction."""
+        status = obj_in.get("status") if isinstance(obj_in, dict) else obj_in.status
+        if status is not None and status != db_obj.status:
+            await self._record_transitions(db, [db_obj.id], db_obj.status, status, actor)
+        return await super().update(db, db_obj=db_obj, obj_in=obj_in)
+
+    async def update_status(
+        self,
+        db: AsyncSession,
+        *,
+        ids: list[uuid.UUID],
+        obj_in: TransactionUpdate,
+        from_status: TransactionStatus,
+        actor: str,
+    ) -> list[Transaction]:
+        """
+        Applies the same update to several transactions with a single UPDATE.
+        :param from_status: Status the transactions are moved from. Transactions no longer in it,
+            e.g. expired by the sweeper in the meantime, are left alone and not returned.
+        """
+        transactions = await self._update_returning(
+            db,
+            self.model.id.in_(ids) & (self.model.status == from_status),
+            obj_in.dict(exclude_unset=True),
+        )
+        await self._record_transitions(
+            db, [transaction.id for transaction in transactions], from_status, obj_in.status, actor
+        )
+        await db.commit()
+        return transactions
+
+    async def transition(
+        self, db: AsyncSession, *, transaction: Transaction, obj_in: TransactionUpdate, actor: str
+    ) -> Optional[Transaction]:
+        """
+        Moves a transaction on from the status it was read with, only if it still has that status,
+        and commits the change together with whatever the caller has staged in the session.
+        :return: Updated transaction, or None when its status changed in the meantime; the session
+            is rolled back then, so nothing staged by the caller is committed either
+        """
+        from_status = transaction.status
+        updated = await self._update_returning(
+            db,
+            (self.model.id == transaction.id) & (self.model.status == from_status),
+            obj_in.dict(exclude_unset=True),
+        )
+        if not updated:
+            await db.rollback()
+            return None
+
+        await self._record_transitions(db, [transaction.id], from_status, obj_in.status, actor)
+        await db.commit()
+        return updated[0]
+
+    async def get(self, db: AsyncSession, id: Any) -> Optional[Transaction]:
+        transaction = await super().get(db, id)
+        if transaction is not None:
+            return transaction
+
+        result = await db.execute(select(archived_transactions).filter(archived_transactions.id == id))
+        return result.scalars().first()
+
+    @staticmethod
+    def _any_of(db: AsyncSession, column: Any, values: Sequence[Any]) -> Any:
+        if is_postgresql(db):
+            # A single array parameter: one prepared statement however many keys are looked up
+            return column == any_(bindparam(None, list(values), type_=postgresql.ARRAY(column.type)))
+        return column.in_(values)
+
+    async def stream_by_keys(
+        self,
+        db: AsyncSession,
+        *,
+        ids: Sequence[uuid.UUID] = (),
+        hashes: Sequence[str] = (),
+        lot_ids: Sequence[int] = (),
+        chunk_size: int,
+    ) -> AsyncIterator[list[Transaction]]:
+        """
+        Live and archived trades matching any of the keys, one query per key type, in chunks from
+        a server-side cursor. Trades matched by several keys are yielded once.
+        """
+        seen: set[uuid.UUID] = set()
+        for column, values in (
+            (all_transactions.id, ids),
+            (all_transactions.hash, hashes),
+            (all_transactions.lot_id, lot_ids),
+        ):
+            if not values:
+                continue
+            query = select(all_transactions).filter(self._any_of(db, column, values))
+            result = await db.stream(query.execution_options(yield_per=chunk_size))
+            async for partition in result.scalars().partitions(chunk_size):  # type: ignore[attr-defined]
+                chunk = [transaction for transaction in partition if transaction.id not in seen]
+                seen.update(transaction.id for transaction in chunk)
+                if chunk:
+                    yield chunk
+
+    @staticmethod
+    def _filter_listing(query: Select, source: Any, filters: TransactionFilter) -> Select:
+        if filters.status is not None:
+            query = query.filter(source.status == filters.status)
+        if filters.created_from is not None:
+            query = query.filter(source.created_at >= filters.created_from)
+        if filters.created_to is not None:
+            query = query.filter(source.created_at < filters.created_to)
+        # Not part of any listing index: applied to the rows the index scan yields
+        if filters.crypto_type is not None:
+            query = query.filter(source.crypto_type == filters.crypto_type)
+        if filters.fiat_type is not None:
+            query = query.filter(source.fiat_type == filters.fiat_type)
+        if filters.sell_type is not None:
+            query = query.filter(source.sell_type == filters.sell_type)
+        return query
+
+    @staticmethod
+    def _check_listing(filters: TransactionFilter) -> None:
+        # Type filters have no index of their own and status barely narrows the scan, so without
+        # a date range they could walk all of the admin's or a busy user's trades for a page of matches
+        if filters.has_type_filters and filters.created_from is None:
+            raise UnsupportedFilterException()
+
+    @staticmethod
+    def _order_listing(source: Any, filters: TransactionFilter) -> Any:
+        return source.created_at.asc() if filters.order == SortOrder.ASC else source.created_at.desc()
+
+    async def get_multi(
+        self, db: AsyncSession, *, skip: int = 0, limit: int = 100, filters: Optional[TransactionFilter] = None
+    ) -> list[Transaction]:
+        filters = filters or TransactionFilter()
+        self._check_listing(filters)
+
+        query = (
+            self._filter_listing(select(all_transactions), all_transactions, filters)
+            .order_by(self._order_listing(all_transactions, filters))
+            .offset(skip)
+            .limit(limit)
+        )
+        result = await db.execute(query)
+        res = result.scalars().all()
+        return res
+
     async def get_multi_by_email(
-        self, db: AsyncSession, *, email: str, offset: int = 0, limit: int = 100
+        self,
+        db: AsyncSession,
+        *,
+        email: str,
+        offset: int = 0,
+        limit: int = 100,
+        filters: Optional[TransactionFilter] = None,
     ) -> list[Transaction]:
+        listing_filters = filters or TransactionFilter()
+        self._check_listing(listing_filters)
+
+        # One branch per email index instead of an OR, so each side is an ordered index scan
+        # stopping after the requested page and the two are merged
+        def branch(*criteria: Any) -> Select:
+            page = (
+                self._filter_listing(select(all_transactions), all_transactions, listing_filters)
+                .filter(*criteria)
+                .order_by(self._order_listing(all_transactions, listing_filters))
+                .limit(offset + limit)
+            )
+            # A subquery, as not every database takes ORDER BY/LIMIT on a member of a UNION
+            return select(page.subquery())
+
+        listing = aliased(
+            Transaction,
+            union_all(
+                branch(all_transactions.buyer_email == email),
+                branch(all_transactions.seller_email == email, all_transactions.buyer_email != email),
+            ).subquery("listing"),
+            adapt_on_names=True,
+        )
+        query = (
+            select(listing).order_by(self._order_listing(listing, listing_filters)).offset(offset).limit(limit)
+        )
+        result = await db.execute(query)
+        res = result.scalars().all()
+        return res
+
+    async def count_by_email(
+        self, db: AsyncSession, *, email: str, filters: Optional[TransactionFilter] = None
+    ) -> int:
+        """Exact count of a user's trades, answered from the email listing indexes."""
+        listing_filters = filters or TransactionFilter()
+        self._check_listing(listing_filters)
+
+        def branch(*criteria: Any) -> Select:
+            return self._filter_listing(select(all_transactions.id), all_transactions, listing_filters).filter(
+                *criteria
+            )
+
+        ids = union_all(
+            branch(all_transactions.buyer_email == email),
+            branch(all_transactions.seller_email == email, all_transactions.buyer_email != email),
+        ).subquery("ids")
+        result = await db.execute(select(func.count()).select_from(ids))
+        count: int = result.scalar_one()
+        return count
+
+    async def estimate_count(self, db: AsyncSession, *, filters: Optional[TransactionFilter] = None) -> int:
+        """
+        Planner's row estimate for the admin-wide listing; costs a plan, not a scan.
+        Drifts from the exact figure between autovacuum/ANALYZE runs.
+        """
+        filters = filters or TransactionFilter()
+        self._check_listing(filters)
+        query = self._filter_listing(select(all_transactions.id), all_transactions, filters)
+        if not is_postgresql(db):
+            result = await db.execute(select(func.count()).select_from(query.subquery()))
+            exact: int = result.scalar_one()
+            return exact
+
+        result = await db.execute(explain(query))
+        plan = result.scalar_one()
+        return int(plan[0]["Plan"]["Plan Rows"])
+
+    async def get_active_by_email(self, db: AsyncSession, *, email: str) -> list[Transaction]:
         query = (
             select(self.model)
-            .filter((self.model.buyer_email == email) | (self.model.seller_email == email))
-            .offset(offset)
-            .limit(limit)
+            .filter(
+                self.model.status.in_(ACTIVE_STATUSES),
+                (self.model.buyer_email == email) | (self.model.seller_email == email),
+            )
+            .order_by(self.model.created_at.desc())
+        )
+        result = await db.execute(query)
+        res = result.scalars().all()
+        return res
+
+    async def get_active_by_initiator(self, db: AsyncSession, *, initiator: str) -> list[Transaction]:
+        query = (
+            select(self.model)
+            # A subset of the partial index's predicate, which the planner still matches
+            .filter(self.model.status.in_(AWAITING_STATUSES), self.model.initiator == initiator).order_by(
+                self.model.created_at.desc()
+            )
         )
         result = await db.execute(query)
         res = result.scalars().all()
         return res
 
+    async def get_active_ids(self, db: AsyncSession, *, ids: Sequence[uuid.UUID]) -> set[uuid.UUID]:
+        """Those of `ids` that belong to open trades."""
+        result = await db.execute(
+            select(self.model.id).filter(self.model.id.in_(ids), self.model.status.in_(ACTIVE_STATUSES))
+        )
+        return set(result.scalars().all())
+
+    async def changed_sellers(
+        self,
+        db: AsyncSession,
+        *,
+        since: datetime.datetime,
+        until: datetime.datetime,
+        after: Optional[str],
+        limit: int,
+    ) -> list[str]:
+        """
+        Sellers of trades created or updated in [since, until), the next `limit` of them in email
+        order after `after`. Each page is a separate query, so no cursor is kept open between pages.
+        """
+        changed = select(self.model.seller_email).filter(
+            ((self.model.created_at >= since) & (self.model.created_at < until))
+            | ((self.model.updated_at >= since) & (self.model.updated_at < until))
+        )
+        if after is not None:
+            changed = changed.filter(self.model.seller_email > after)
+        result = await db.execute(changed.distinct().order_by(self.model.seller_email).limit(limit))
+        return result.scalars().all()
+
+    async def active_amounts_by_seller(
+        self, db: AsyncSession, *, seller_emails: Sequence[str]
+    ) -> list[tuple[str, CryptoType, SellType, Decimal]]:
+        """Amount of the sellers' open trades per wallet balance it was reduced from."""
+        result = await db.execute(
+            select(
+                self.model.seller_email,
+                self.model.crypto_type,
+                self.model.sell_type,
+                func.sum(self.model.amount),
+            )
+            .filter(self.model.status.in_(ACTIVE_STATUSES), self.model.seller_email.in_(seller_emails))
+            .group_by(self.model.seller_email, self.model.crypto_type, self.model.sell_type)
+        )
+        return [tuple(row) for row in result.all()]  # type: ignore[misc]
+
+    async def expire_overdue(
+        self, db: AsyncSession, *, batch_size: int, ids: Optional[Sequence[uuid.UUID]] = None
+    ) -> list[Transaction]:
+        """
+        Expires one batch of trades past their payment deadline with a single UPDATE, committed with
+        the caller's next commit together with whatever it stages for the expired trades.
+        Trades another session is expiring are skipped, so each one is expired exactly once.
+        :param ids: Only consider these trades
+        :return: Expired transactions
+        """
+        overdue = (
+            select(self.model.id)
+            .filter(
+                self.model.status == TransactionStatus.ON_PAYMENT_WAIT,
+                self.model.expires_at < func.now(),
+            )
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        if ids is not None:
+            overdue = overdue.filter(self.model.id.in_(ids))
+        transactions = await self._update_returning(
+            db,
+            self.model.id.in_(overdue.scalar_subquery()),
+            {"status": TransactionStatus.EXPIRED, "closed_on": func.now()},
+        )
+        await self._record_transitions(
+            db,
+            [transaction.id for transaction in transactions],
+            TransactionStatus.ON_PAYMENT_WAIT,
+            TransactionStatus.EXPIRED,
+            SYSTEM_ACTOR,
+        )
+        return transactions
+
+    async def archive_closed(
+        self, db: AsyncSession, *, closed_before: datetime.datetime, batch_size: int
+    ) -> int:
+        """
+        Moves one batch of closed trades into the archive table in a single statement.
+        :return: Number of archived trades
+        """
+        batch = (
+            select(self.model.id)
+            .filter(
+                self.model.status.in_(TransactionStatus.terminal_statuses),
+                self.model.closed_on < closed_before,
+            )
+            .order_by(self.model.closed_on)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        columns = [column.name for column in TransactionArchive.__table__.columns]
+
+        if not supports_returning(db):
+            ids = (await db.execute(batch)).scalars().all()
+            table = self.model.__table__
+            await db.execute(
+                insert(TransactionArchive.__table__).from_select(
+                    columns, select(*[table.c[name] for name in columns]).where(table.c.id.in_(ids))
+                )
+            )
+            await db.execute(delete(table).where(table.c.id.in_(ids)))
+            await db.commit()
+            return len(ids)
+
+        moved = (
+            delete(self.model.__table__)
+            .where(self.model.__table__.c.id.in_(batch.scalar_subquery()))
+            .returning(*self.model.__table__.columns)
+            .cte("moved")
+        )
+        archived = (
+            insert(TransactionArchive.__table__)
+            .from_select(columns, select(*[moved.c[name] for name in columns]))
+            .returning(TransactionArchive.__table__.c.id)
+            .cte("archived")
+        )
+        result = await db.execute(select(func.count()).select_from(archived))
+        count: int = result.scalar_one()
+        await db.commit()
+        return count
+
 
 transactions = CRUDTransaction(Transaction)
@@ -0,0 +1,127 @@
+import datetime
+import statistics
+from typing import Any, Optional, Sequence
+from uuid import UUID
+
+from sqlalchemy import and_, func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+from sqlalchemy.sql import Select
+
+from core.tracing import traced_methods
+from crud.base import CRUDBase
+from db.capabilities import is_postgresql
+from db.models import TransactionTransition
+from db.models.transaction import TransactionStatus
+from schemas.transaction_transition import StateDuration, TransactionTransitionCreate
+
+
+def _percentile(values: list[float], fraction: float) -> Optional[float]:
+    """Linear interpolation between the closest ranks of sorted values, as percentile_cont does."""
+    if not values:
+        return None
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+@traced_methods("crud")
+class CRUDTransactionTransition(
+    CRUDBase[TransactionTransition, TransactionTransitionCreate, TransactionTransitionCreate]
+):
+    async def record(self, db: AsyncSession, *, objs_in: Sequence[TransactionTransitionCreate]) -> None:
+        """
+        Inserts transitions with a single multi-row INSERT without committing, so they are
+        committed together with the status change in the caller's next commit.
+        """
+        if not objs_in:
+            return
+        rows = [obj_in.dict() for obj_in in objs_in]
+        if is_postgresql(db):
+            await db.execute(insert(self.model).values(rows))
+            return
+        # No identity columns elsewhere: the rows are inserted one statement each, every statement
+        # taking the next seq under the write lock it holds
+        next_seq = select(func.coalesce(func.max(self.model.seq), 0) + 1).scalar_subquery()
+        await db.execute(insert(self.model).values(seq=next_seq), rows)
+
+    async def get_timeline(self, db: AsyncSession, *, transaction_id: UUID) -> list[TransactionTransition]:
+        result = await db.execute(
+            select(self.model).filter(self.model.transaction_id == transaction_id).order_by(self.model.seq)
+        )
+        return result.scalars().all()
+
+    async def time_in_state(
+        self,
+        db: AsyncSession,
+        *,
+        status: TransactionStatus,
+        since: datetime.datetime,
+        until: datetime.datetime,
+    ) -> StateDuration:
+        """
+        Duration statistics of `status` for trades that left it in [since, until).
+        The exits are range-scanned by status and time, each matched through the timeline index to the
+        latest entry before it, so a status entered more than once counts each stay once.
+        """
+        entry = aliased(self.model)
+        exit = aliased(self.model)
+        earlier = aliased(self.model)
+        latest_entry = (
+            select(func.max(earlier.seq))
+            .filter(
+                earlier.transaction_id == exit.transaction_id,
+                earlier.to_status == status,
+                earlier.seq < exit.seq,
+            )
+            .scalar_subquery()
+        )
+
+        def stays(*columns: Any) -> Select:
+            return (
+                select(*columns)
+                .select_from(exit)
+                .join(entry, and_(entry.transaction_id == exit.transaction_id, entry.seq == latest_entry))
+                .filter(exit.from_status == status, exit.created_at >= since, exit.created_at < until)
+            )
+
+        if not is_postgresql(db):
+            # No interval or percentile aggregates: the durations are summarized here instead
+            result = await db.execute(stays(exit.created_at, entry.created_at))
+            durations = sorted((left - entered).total_seconds() for left, entered in result.all())
+            return StateDuration(
+                status=status.name,
+                since=since,
+                until=until,
+                count=len(durations),
+                mean=statistics.fmean(durations) if durations else None,
+                p50=_percentile(durations, 0.5),
+                p95=_percentile(durations, 0.95),
+                max=durations[-1] if durations else None,
+            )
+
+        seconds = func.extract("epoch", exit.created_at - entry.created_at)
+        result = await db.execute(
+            stays(
+                func.count(),
+                func.avg(seconds),
+                func.percentile_cont(0.5).within_group(seconds),
+                func.percentile_cont(0.95).within_group(seconds),
+                func.max(seconds),
+            )
+        )
+        count, mean, p50, p95, maximum = result.one()
+        return StateDuration(
+            status=status.name,
+            since=since,
+            until=until,
+            count=count,
+            mean=mean,
+            p50=p50,
+            p95=p95,
+            max=maximum,
+        )
+
+
+transitions = CRUDTransactionTransition(TransactionTransition)
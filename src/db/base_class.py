@@ -1,5 +1,6 @@
 from typing import Any
 
+from sqlalchemy import Table
 from sqlalchemy.ext.declarative import as_declarative, declared_attr
 
 
@@ -7,6 +8,7 @@ from sqlalchemy.ext.declarative import as_declarative, declared_attr
 class Base:
     id: Any
     __name__: str
+    __table__: Table
 
     # Generate __tablename__ automatically
     @declared_attr
@@ -0,0 +1,23 @@
+import datetime
+from typing import Any
+
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.elements import ColumnElement
+from sqlalchemy.sql.functions import func
+
+
+def is_postgresql(db: AsyncSession) -> bool:
+    """Whether PostgreSQL-only statements (EXPLAIN JSON, percentile aggregates, interval math) can be used."""
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def supports_returning(db: AsyncSession) -> bool:
+    """Whether UPDATE/DELETE ... RETURNING and data-modifying CTEs are available."""
+    return bool(getattr(db.get_bind().dialect, "full_returning", False))
+
+
+def now_plus(db: AsyncSession, delta: datetime.timedelta) -> ColumnElement[Any]:
+    """Database time `delta` from now: interval arithmetic on PostgreSQL, datetime() modifiers on SQLite."""
+    if is_postgresql(db):
+        return func.now() + delta
+    return func.datetime(func.current_timestamp(), f"{delta.total_seconds():+f} seconds")
@@ -0,0 +1,26 @@
+from typing import Any
+
+from sqlalchemy import JSON, bindparam, column, text
+from sqlalchemy.dialects.postgresql.base import PGDialect
+from sqlalchemy.sql import Select
+from sqlalchemy.sql.elements import BindParameter
+from sqlalchemy.sql.selectable import TextualSelect
+
+# Named parameters, so the compiled statement can be rebound through text()
+_dialect = PGDialect(paramstyle="named")
+
+
+def explain(statement: Select) -> TextualSelect:
+    """
+    `EXPLAIN (FORMAT JSON)` of a statement, keeping its bound parameters and their types.
+    The result is declared as the plan alone, so the statement's column types are not applied to it.
+    """
+    compiled = statement.compile(dialect=_dialect, compile_kwargs={"render_postcompile": True})
+    parameters: list[BindParameter[Any]] = [
+        bindparam(name, value, type_=compiled.binds[name].type) for name, value in compiled.params.items()
+    ]
+    return (
+        text(f"EXPLAIN (FORMAT JSON) {compiled.string}")
+        .bindparams(*parameters)
+        .columns(column("QUERY PLAN", JSON))
+    )
@@ -0,0 +1,266 @@
+import asyncio
+import contextvars
+import functools
+import inspect
+import os
+import random
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional, ParamSpec, TypeVar
+
+import orjson
+from sqlalchemy import event
+from sqlalchemy.engine import Connection, ExecutionContext
+from sqlalchemy.ext.asyncio import AsyncEngine
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+from core.config import app_settings
+from core.logger_config import service_logger
+from core.metrics import metrics
+
+T = TypeVar("T")
+R = TypeVar("R")
+P = ParamSpec("P")
+
+# Endpoint of statements run outside of requests (Celery tasks, startup)
+BACKGROUND = "background"
+# Endpoint of statements run by requests no route matched, or before routing; not the raw
+# path, which would give every distinct URL a series of its own
+UNROUTED = "unrouted"
+# Operation of statements not issued from a TradeService method
+UNTAGGED = "none"
+# Execution option keeping the instrumentation's own statements out of what it measures
+SKIP_OPTION = "skip_instrumentation"
+
+statements_total = metrics.counter(
+    "trade_db_statements_total", "SQL statements executed by endpoint and TradeService method"
+)
+statement_seconds = metrics.counter(
+    "trade_db_statement_seconds_total",
+    "Time spent executing SQL statements by endpoint and TradeService method",
+)
+slow_statements_total = metrics.counter(
+    "trade_db_slow_statements_total", "SQL statements slower than DB_SLOW_QUERY_THRESHOLD"
+)
+
+_request_scope: contextvars.ContextVar[Optional[Scope]] = contextvars.ContextVar("request_scope", default=None)
+_operation: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("query_operation", default=None)
+
+
+def current_endpoint() -> str:
+    """Name of the endpoint function serving the current request, once it has been routed."""
+    scope = _request_scope.get()
+    if scope is None:
+        return BACKGROUND
+    # The router adds the matched endpoint to the request's scope in place
+    endpoint = scope.get("endpoint")
+    return str(getattr(endpoint, "__name__", UNROUTED))
+
+
+def current_operation() -> str:
+    return _operation.get() or UNTAGGED
+
+
+def tagged_methods(cls: type[T]) -> type[T]:
+    """Class decorator tagging the statements issued by its public coroutine methods as `Class.method`."""
+
+    def tag(function: Callable[P, Awaitable[R]], name: str) -> Callable[P, Awaitable[R]]:
+        @functools.wraps(function)
+        async def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            token = _operation.set(name)
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                _operation.reset(token)
+
+        return wrapper
+
+    for attribute, value in list(vars(cls).items()):
+        if attribute.startswith("_") or not inspect.iscoroutinefunction(value):
+            continue
+        setattr(cls, attribute, tag(value, f"{cls.__name__}.{attribute}"))
+    return cls
+
+
+class QueryOriginMiddleware:
+    """Makes the request's scope, and so the endpoint it is routed to, known to the statement hooks."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
+
+
+class QueryLog:
+    """JSON lines file of captured statements, rotated to a single `.1` backup beyond `max_bytes`."""
+
+    def __init__(self, path: str, *, max_bytes: int):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def write(self, record: dict[str, Any]) -> None:
+        """Appends the record; blocking, so the statement hooks submit it to an executor."""
+        line = orjson.dumps(record, default=str) + b"\n"
+        with self._lock:
+            try:
+                try:
+                    if os.path.getsize(self._path) + len(line) > self._max_bytes:
+                        os.replace(self._path, f"{self._path}.1")
+                except FileNotFoundError:
+                    pass
+                with open(self._path, "ab") as file:
+                    file.write(line)
+            except OSError as e:
+                service_logger.warning(f"Writing to the query log failed: {e!r}")
+
+    def submit(self, record: dict[str, Any]) -> None:
+        """Writes the record off the event loop, on the loop's default executor."""
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self.write(record)
+            return
+        loop.run_in_executor(None, self.write, record)
+
+
+def redact(parameters: Any) -> Any:
+    """Parameters with every value replaced by its type name, keeping their shape."""
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+class StatementInstrumentation:
+    """
+    Times every statement an engine executes, counted by endpoint and TradeService method.
+    Statements over `slow_threshold` seconds are logged and captured with their parameters redacted.
+    On PostgreSQL a `explain_sample_rate` share of the slow SELECTs is run again under
+    `EXPLAIN (ANALYZE, BUFFERS)` on a separate connection, one at a time, and the plan captured too.
+    """
+
+    def __init__(
+        self, engine: AsyncEngine, *, log: QueryLog, slow_threshold: float, explain_sample_rate: float
+    ):
+        self._engine = engine
+        self._log = log
+        self._slow_threshold = slow_threshold
+        self._explain_sample_rate = explain_sample_rate
+        self._explaining: Optional[asyncio.Task[None]] = None
+
+    def install(self) -> None:
+        event.listen(self._engine.sync_engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(self._engine.sync_engine, "after_cursor_execute", self._after_cursor_execute)
+
+    @staticmethod
+    def _before_cursor_execute(
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: ExecutionContext,
+        executemany: bool,
+    ) -> None:
+        context._query_started = time.perf_counter()  # type: ignore[attr-defined]
+
+    def _after_cursor_execute(
+        self,
+        conn: Connection,
+        cursor: Any,
+        statement: str,
+        parameters: Any,
+        context: ExecutionContext,
+        executemany: bool,
+    ) -> None:
+        if context.execution_options.get(SKIP_OPTION):  # type: ignore[attr-defined]
+            return
+
+        duration = time.perf_counter() - context._query_started  # type: ignore[attr-defined]
+        endpoint, operation = current_endpoint(), current_operation()
+        statements_total.inc(endpoint=endpoint, operation=operation)
+        statement_seconds.inc(duration, endpoint=endpoint, operation=operation)
+
+        if duration < self._slow_threshold:
+            return
+
+        slow_statements_total.inc(endpoint=endpoint, operation=operation)
+        service_logger.warning(f"Slow statement ({duration * 1000:.0f} ms) from {endpoint} / {operation}")
+        self._log.submit(
+            {
+                "kind": "slow",
+                "at": time.time(),
+                "duration_ms": duration * 1000,
+                "endpoint": endpoint,
+                "operation": operation,
+                "statement": statement,
+                "parameters": redact(parameters[0] if executemany and parameters else parameters),
+                "executemany": executemany,
+            }
+        )
+
+        if self._should_explain(conn, statement, executemany):
+            self._explaining = asyncio.get_running_loop().create_task(
+                self._explain(statement, parameters, endpoint, operation)
+            )
+            # Also runs if the task is cancelled before it starts, e.g. at shutdown
+            self._explaining.add_done_callback(self._explained)
+
+    def _should_explain(self, conn: Connection, statement: str, executemany: bool) -> bool:
+        # ANALYZE executes the statement again, which only SELECTs can afford
+        return (
+            self._explaining is None
+            and not executemany
+            and conn.dialect.name == "postgresql"
+            and statement.lstrip()[:6].upper() == "SELECT"
+            and self._explain_sample_rate > 0
+            and random.random() < self._explain_sample_rate
+        )
+
+    def _explained(self, task: "asyncio.Task[None]") -> None:
+        if self._explaining is task:
+            self._explaining = None
+
+    async def _explain(self, statement: str, parameters: Any, endpoint: str, operation: str) -> None:
+        try:
+            async with self._engine.connect() as connection:
+                result = await connection.exec_driver_sql(
+                    f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {statement}",
+                    parameters,
+                    execution_options={SKIP_OPTION: True},
+                )
+                plan = result.scalar()
+                await connection.rollback()
+        except Exception as e:
+            service_logger.warning(f"EXPLAIN of a slow statement from {endpoint} / {operation} failed: {e!r}")
+            return
+
+        self._log.submit(
+            {
+                "kind": "explain",
+                "at": time.time(),
+                "endpoint": endpoint,
+                "operation": operation,
+                "statement": statement,
+                "plan": orjson.loads(plan) if isinstance(plan, str) else plan,
+            }
+        )
+
+
+def instrument_engine(engine: AsyncEngine) -> None:
+    StatementInstrumentation(
+        engine,
+        log=QueryLog(app_settings.DB_QUERY_LOG_FILE, max_bytes=app_settings.DB_QUERY_LOG_MAX_BYTES),
+        slow_threshold=app_settings.DB_SLOW_QUERY_THRESHOLD,
+        explain_sample_rate=app_settings.DB_EXPLAIN_SAMPLE_RATE,
+    ).install()
@@ -1,3 +1,5 @@
-from db.models.transaction import Transaction
+from db.models.balance_adjustment import BalanceAdjustment
+from db.models.transaction import Transaction, TransactionArchive
+from db.models.transaction_transition import TransactionTransition
 
-__all__ = ["Transaction"]
+__all__ = ["BalanceAdjustment", "Transaction", "TransactionArchive", "TransactionTransition"]
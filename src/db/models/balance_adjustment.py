@@ -0,0 +1,53 @@
+import datetime
+import enum
+import uuid
+from decimal import Decimal
+
+from sqlalchemy import Column, Enum, Index, Integer, String, func, text
+from sqlalchemy.orm import Mapped
+
+from db.base_class import Base
+from db.models.transaction import CryptoType, SellType
+from db.types import GUID, ExactNumeric, TZDateTime
+
+
+class AdjustmentKind(enum.Enum):
+    INCREASE = "increase"
+    # Replays the reduce under its original idempotency key, then increases the balance back.
+    # Used when it is unknown whether the reduce reached the wallet service.
+    REVERT_REDUCE = "revert_reduce"
+
+
+class AdjustmentStatus(enum.Enum):
+    PENDING = 10
+    DONE = 20
+    FAILED = 99
+
+
+class BalanceAdjustment(Base):
+    __table_args__ = (
+        Index(
+            "ix_balanceadjustment_pending",
+            "next_attempt_at",
+            postgresql_where=text("status = 'PENDING'"),
+        ),
+    )
+
+    id: Mapped[uuid.UUID] = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    transaction_id: Mapped[uuid.UUID] = Column(GUID(), index=True, nullable=False)
+    idempotency_key: Mapped[str] = Column(String, unique=True, nullable=False)
+    kind: Mapped[AdjustmentKind] = Column(Enum(AdjustmentKind), nullable=False)
+
+    seller_email: Mapped[str] = Column(String, nullable=False)
+    amount: Mapped[Decimal] = Column(ExactNumeric(precision=14, scale=6), nullable=False)
+    crypto_type: Mapped[CryptoType] = Column(Enum(CryptoType), nullable=False)
+    sell_type: Mapped[SellType] = Column(Enum(SellType), nullable=False)
+
+    status: Mapped[AdjustmentStatus] = Column(
+        Enum(AdjustmentStatus), default=AdjustmentStatus.PENDING, nullable=False
+    )
+    attempts: Mapped[int] = Column(Integer, default=0, nullable=False)
+    next_attempt_at: Mapped[datetime.datetime] = Column(TZDateTime(), default=func.now(), nullable=False)
+    last_error: Mapped[str] = Column(String, nullable=True)
+    created_at: Mapped[datetime.datetime] = Column(TZDateTime(), default=func.now(), nullable=False)
+    updated_at: Mapped[datetime.datetime] = Column(TZDateTime(), onupdate=func.now())
@@ -4,11 +4,11 @@ import uuid
 from decimal import Decimal
 from typing import Union
 
-from sqlalchemy import Column, DateTime, Enum, Integer, Numeric, String, func
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import Mapped
+from sqlalchemy import Column, Enum, Index, Integer, String, func, text
+from sqlalchemy.orm import Mapped, declarative_mixin
 
 from db.base_class import Base
+from db.types import GUID, ExactNumeric, TZDateTime
 
 
 class TransactionStatus(enum.Enum):
@@ -16,13 +16,33 @@ class TransactionStatus(enum.Enum):
     ON_PAYMENT_WAIT = 20
     ON_APPROVE = 30
     EXPIRED = 40
+    TRANSFERRING = 45
+    # The crypto service rejected the transfer, or it could not be completed; closed but kept in
+    # the hot table, out of the archiver's reach, for follow-up
+    TRANSFER_FAILED = 47
     SUCCESS = 50
     CANCELED = 99
 
     @classmethod
     @property
     def status_order(cls) -> list["TransactionStatus"]:
-        return [cls.CREATED, cls.ON_PAYMENT_WAIT, cls.ON_APPROVE, cls.SUCCESS]
+        return [cls.CREATED, cls.ON_PAYMENT_WAIT, cls.ON_APPROVE, cls.TRANSFERRING, cls.SUCCESS]
+
+    @classmethod
+    @property
+    def terminal_statuses(cls) -> list["TransactionStatus"]:
+        return [cls.EXPIRED, cls.SUCCESS, cls.CANCELED]
+
+    @classmethod
+    @property
+    def active_statuses(cls) -> list["TransactionStatus"]:
+        return [cls.CREATED, cls.ON_PAYMENT_WAIT, cls.ON_APPROVE, cls.TRANSFERRING]
+
+    @classmethod
+    @property
+    def awaiting_statuses(cls) -> list["TransactionStatus"]:
+        """Open trades waiting on their initiator's counterparty: to pay, or to approve the payment."""
+        return [cls.ON_PAYMENT_WAIT, cls.ON_APPROVE]
 
     @property
     def next(self) -> Union["TransactionStatus", None]:
@@ -48,25 +68,86 @@ class SellType(enum.Enum):
     BUY = "buy"
 
 
-class Transaction(Base):
-    id: Mapped[UUID] = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+@declarative_mixin
+class TransactionColumns:
+    id: Mapped[uuid.UUID] = Column(GUID(), primary_key=True, default=uuid.uuid4)
     initiator: Mapped[str] = Column(String, index=True)  # Current approving user
     seller_wallet: Mapped[str] = Column(String, index=True)
     buyer_wallet: Mapped[str] = Column(String, index=True)
-    seller_email: Mapped[str] = Column(String, index=True, nullable=False)
-    buyer_email: Mapped[str] = Column(String, index=True, nullable=False)
+    seller_email: Mapped[str] = Column(String, nullable=False)
+    buyer_email: Mapped[str] = Column(String, nullable=False)
 
-    amount: Mapped[Decimal] = Column(Numeric(precision=14, scale=6), nullable=False)
+    amount: Mapped[Decimal] = Column(ExactNumeric(precision=14, scale=6), nullable=False)
     crypto_type: Mapped[CryptoType] = Column(Enum(CryptoType), nullable=False)
-    fiat_amount: Mapped[Decimal] = Column(Numeric(precision=14, scale=6), nullable=False)
+    fiat_amount: Mapped[Decimal] = Column(ExactNumeric(precision=14, scale=6), nullable=False)
     fiat_type: Mapped[FiatType] = Column(Enum(FiatType), nullable=False)
     sell_type: Mapped[SellType] = Column(Enum(SellType), nullable=False)
-    lot_id: Mapped[int] = Column(Integer, nullable=False)
+    lot_id: Mapped[int] = Column(Integer, nullable=False, index=True)
 
     status: Mapped[TransactionStatus] = Column(
         Enum(TransactionStatus), default=TransactionStatus.CREATED, nullable=False
     )
-    created_at: Mapped[datetime.datetime] = Column(DateTime(timezone=True), default=func.now(), nullable=False)
-    updated_at: Mapped[datetime.datetime] = Column(DateTime(timezone=True), onupdate=func.now())
-    closed_on: Mapped[datetime.datetime] = Column(DateTime(timezone=True), nullable=True)
+    created_at: Mapped[datetime.datetime] = Column(TZDateTime(), default=func.now(), nullable=False)
+    updated_at: Mapped[datetime.datetime] = Column(TZDateTime(), onupdate=func.now())
+    closed_on: Mapped[datetime.datetime] = Column(TZDateTime(), nullable=True)
+    # Payment deadline; a trade still waiting for payment after it counts as expired
+    expires_at: Mapped[datetime.datetime] = Column(TZDateTime(), nullable=True)
     hash: Mapped[str] = Column(String, nullable=True, index=True, unique=True)
+
+    @property
+    def is_overdue(self) -> bool:
+        return (
+            self.status == TransactionStatus.ON_PAYMENT_WAIT
+            and self.expires_at is not None
+            and self.expires_at < datetime.datetime.now(datetime.timezone.utc)
+        )
+
+
+# Equality columns of the composite indexes transaction listings are served from.
+# Each index continues with created_at, which listings are ranged and ordered by.
+LISTING_INDEX_PREFIXES: list[tuple[str, ...]] = [
+    (),
+    ("status",),
+    ("buyer_email",),
+    ("seller_email",),
+    ("buyer_email", "status"),
+    ("seller_email", "status"),
+]
+
+
+def listing_indexes(table_name: str) -> tuple[Index, ...]:
+    return tuple(
+        Index(f"ix_{table_name}_{'_'.join(prefix + ('created_at',))}", *prefix, "created_at")
+        for prefix in LISTING_INDEX_PREFIXES
+    )
+
+
+_ACTIVE_PREDICATE = text("status IN ('CREATED', 'ON_PAYMENT_WAIT', 'ON_APPROVE', 'TRANSFERRING')")
+
+
+class Transaction(TransactionColumns, Base):
+    __table_args__ = (
+        *listing_indexes("transaction"),
+        Index(
+            "ix_transaction_closed_on_terminal",
+            "closed_on",
+            postgresql_where=text("status IN ('EXPIRED', 'SUCCESS', 'CANCELED')"),
+        ),
+        # Only the few open trades are indexed, however much history the table keeps
+        Index("ix_transaction_buyer_email_active", "buyer_email", postgresql_where=_ACTIVE_PREDICATE),
+        Index("ix_transaction_seller_email_active", "seller_email", postgresql_where=_ACTIVE_PREDICATE),
+        Index("ix_transaction_initiator_active", "initiator", postgresql_where=_ACTIVE_PREDICATE),
+        Index(
+            "ix_transaction_expires_at_waiting",
+            "expires_at",
+            postgresql_where=text("status = 'ON_PAYMENT_WAIT'"),
+        ),
+        # Reconciliation finds trades changed since its watermark through this and created_at
+        Index("ix_transaction_updated_at", "updated_at"),
+    )
+
+
+class TransactionArchive(TransactionColumns, Base):
+    """Closed trades moved out of the hot `transaction` table by the archiver."""
+
+    __table_args__ = listing_indexes("transactionarchive")
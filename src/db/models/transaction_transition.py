@@ -0,0 +1,35 @@
+import datetime
+import uuid
+
+from sqlalchemy import BigInteger, Column, Enum, Identity, Index, String
+from sqlalchemy.orm import Mapped
+
+from db.base_class import Base
+from db.models.transaction import TransactionStatus
+from db.types import GUID, TZDateTime
+
+# Actor of transitions made by the service itself rather than on a user's request
+SYSTEM_ACTOR = "system"
+
+
+class TransactionTransition(Base):
+    """Append-only history of trade status changes. Rows are never updated or deleted."""
+
+    __table_args__ = (
+        Index("ix_transactiontransition_timeline", "transaction_id", "seq"),
+        # Leaving a status is recorded once per trade, so durations are looked up from the exits
+        Index("ix_transactiontransition_exit", "from_status", "created_at"),
+    )
+
+    id: Mapped[uuid.UUID] = Column(GUID(), primary_key=True, default=uuid.uuid4)
+    # Insertion order; timestamps of transitions made close together can tie or go back with clock skew
+    seq: Mapped[int] = Column(BigInteger, Identity(), nullable=False)
+    # Not a foreign key: trades move to the archive table and keep their history
+    transaction_id: Mapped[uuid.UUID] = Column(GUID(), nullable=False)
+    from_status: Mapped[TransactionStatus] = Column(Enum(TransactionStatus), nullable=True)
+    to_status: Mapped[TransactionStatus] = Column(Enum(TransactionStatus), nullable=False)
+    actor: Mapped[str] = Column(String, nullable=False)
+    # Taken when the row is written rather than at the start of its transaction, as now() would be
+    created_at: Mapped[datetime.datetime] = Column(
+        TZDateTime(), default=lambda: datetime.datetime.now(datetime.timezone.utc), nullable=False
+    )
@@ -0,0 +1,78 @@
+import asyncio
+import time
+from typing import Any
+
+from sqlalchemy import exc, text
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from core.logger_config import service_logger
+from core.metrics import Sample, metrics
+
+pool_checkouts = metrics.counter("trade_db_pool_checkouts_total", "Connections checked out of the DB pool")
+pool_wait_seconds = metrics.counter(
+    "trade_db_pool_wait_seconds_total", "Time spent waiting for a connection from the DB pool"
+)
+pool_timeouts = metrics.counter(
+    "trade_db_pool_timeouts_total", "Checkouts that timed out waiting for the DB pool"
+)
+pool_overflow_connections = metrics.counter(
+    "trade_db_pool_overflow_connections_total", "Connections opened beyond the DB pool size"
+)
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """Queue pool that records checkout wait times, timeouts and overflow connections."""
+
+    def _do_get(self) -> Any:
+        overflow = self._current_overflow()
+        started = time.monotonic()
+        try:
+            connection = super()._do_get()  # type: ignore
+        except exc.TimeoutError:
+            pool_timeouts.inc()
+            raise
+        finally:
+            pool_wait_seconds.inc(time.monotonic() - started)
+        pool_checkouts.inc()
+        if self._current_overflow() > max(overflow, 0):
+            pool_overflow_connections.inc()
+        return connection
+
+    def _current_overflow(self) -> int:
+        overflow: int = self.overflow()  # type: ignore[no-untyped-call]
+        return overflow
+
+    def usage(self) -> list[Sample]:
+        return [
+            ({"state": "size"}, self.size()),  # type: ignore[no-untyped-call]
+            ({"state": "checked_in"}, self.checkedin()),  # type: ignore[no-untyped-call]
+            ({"state": "checked_out"}, self.checkedout()),  # type: ignore[no-untyped-call]
+            ({"state": "overflow"}, max(self._current_overflow(), 0)),
+        ]
+
+
+def register_pool_metrics(engine: AsyncEngine) -> None:
+    pool = engine.sync_engine.pool
+    assert isinstance(pool, InstrumentedPool)
+    metrics.gauge("trade_db_pool_connections", "DB pool connections by state", pool.usage)
+
+
+async def keep_pool_alive(engine: AsyncEngine, *, interval: float, timeout: float) -> None:
+    """
+    Periodically checks that Postgres is reachable, in place of a ping on every checkout.
+    A check that fails or takes longer than `timeout` throws the whole pool away, so requests
+    reconnect instead of running into connections that were closed or cut off under them.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.wait_for(_ping(engine), timeout)
+        except Exception as e:
+            service_logger.warning(f"DB liveness check failed, resetting the pool: {e!r}")
+            await engine.dispose()
+
+
+async def _ping(engine: AsyncEngine) -> None:
+    async with engine.connect() as connection:
+        await connection.execute(text("SELECT 1"))
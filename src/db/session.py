@@ -1,9 +1,31 @@
-from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from typing import Any
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 
 from core.config import app_settings
+from db import models  # noqa: F401  Registers every model on the metadata
+from db.base_class import Base
+from db.instrumentation import instrument_engine
+from db.pool import InstrumentedPool, register_pool_metrics
+
+_url = make_url(str(app_settings.SQLALCHEMY_DATABASE_URI_ASYNC))
+_connect_args: dict[str, Any] = {}
+if _url.get_backend_name() == "postgresql":
+    _connect_args["prepared_statement_cache_size"] = app_settings.DB_STATEMENT_CACHE_SIZE
 
-engine_async = create_async_engine(app_settings.SQLALCHEMY_DATABASE_URI_ASYNC, pool_pre_ping=True)
+engine_async = create_async_engine(
+    _url,
+    poolclass=InstrumentedPool,
+    pool_size=app_settings.DB_POOL_SIZE,
+    max_overflow=app_settings.DB_MAX_OVERFLOW,
+    pool_timeout=app_settings.DB_POOL_TIMEOUT,
+    pool_recycle=app_settings.DB_POOL_RECYCLE,
+    connect_args=_connect_args,
+)
+register_pool_metrics(engine_async)
+instrument_engine(engine_async)
 async_session = sessionmaker(
     bind=engine_async,
     class_=AsyncSession,
@@ -11,3 +33,14 @@ async_session = sessionmaker(
     autoflush=False,
     expire_on_commit=False,
 )
+
+
+async def create_schema(engine: AsyncEngine) -> None:
+    """
+    Creates missing tables straight from the models on backends the migrations don't target.
+    PostgreSQL schemas are managed by alembic only.
+    """
+    if engine.dialect.name == "postgresql":
+        return
+    async with engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
@@ -0,0 +1,77 @@
+import datetime
+import decimal
+import uuid
+from typing import Any, Optional, Union
+
+from sqlalchemy import CHAR, DateTime, Numeric, String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.engine import Dialect
+from sqlalchemy.types import TypeDecorator, TypeEngine
+
+
+class GUID(TypeDecorator[uuid.UUID]):
+    """UUID column: native `uuid` on PostgreSQL, 32 hex characters elsewhere."""
+
+    impl = CHAR(32)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect: Dialect) -> TypeEngine[Any]:
+        if dialect.name == "postgresql":
+            return postgresql.UUID(as_uuid=True)
+        return CHAR(32)
+
+    def process_bind_param(self, value: Any, dialect: Dialect) -> Any:
+        if value is None or dialect.name == "postgresql":
+            return value
+        if not isinstance(value, uuid.UUID):
+            value = uuid.UUID(str(value))
+        return value.hex
+
+    def process_result_value(self, value: Union[uuid.UUID, str, None], dialect: Dialect) -> Optional[uuid.UUID]:
+        if value is None or isinstance(value, uuid.UUID):
+            return value
+        return uuid.UUID(value)
+
+
+class TZDateTime(TypeDecorator[datetime.datetime]):
+    """
+    `timestamp with time zone` on PostgreSQL. Databases without one store UTC and read it back
+    as an aware datetime, so values compare the same on every backend.
+    """
+
+    impl = DateTime(timezone=True)
+    cache_ok = True
+
+    def process_bind_param(self, value: Any, dialect: Dialect) -> Any:
+        if value is None or dialect.name == "postgresql" or value.tzinfo is None:
+            return value
+        return value.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+    def process_result_value(
+        self, value: Optional[datetime.datetime], dialect: Dialect
+    ) -> Optional[datetime.datetime]:
+        if value is None or value.tzinfo is not None:
+            return value
+        return value.replace(tzinfo=datetime.timezone.utc)
+
+
+class ExactNumeric(TypeDecorator[decimal.Decimal]):
+    """`numeric` on PostgreSQL; databases without exact decimals store the number as text."""
+
+    impl = Numeric
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect: Dialect) -> TypeEngine[Any]:
+        if dialect.name == "postgresql":
+            return super().load_dialect_impl(dialect)
+        return String()
+
+    def process_bind_param(self, value: Any, dialect: Dialect) -> Any:
+        if value is None or dialect.name == "postgresql":
+            return value
+        return str(value)
+
+    def process_result_value(self, value: Any, dialect: Dialect) -> Optional[decimal.Decimal]:
+        if value is None:
+            return None
+        return value if isinstance(value, decimal.Decimal) else decimal.Decimal(str(value))
@@ -24,6 +24,7 @@ class APIException(HTTPException):
             status_code = self.default_status_code
         if detail is None:
             detail = self.default_detail
+        self.headers = headers
         super().__init__(status_code, detail, headers)
 
 
@@ -51,6 +52,18 @@ class NotEnoughBalanceException(APIException):
     default_detail = "Not enough balance for trade"
 
 
+class LotMismatchException(APIException):
+    default_status_code = status.HTTP_400_BAD_REQUEST
+    default_code = "lot_mismatch"
+    default_detail = "Trade does not match the lot"
+
+
+class LotOversubscribedException(APIException):
+    default_status_code = status.HTTP_409_CONFLICT
+    default_code = "lot_oversubscribed"
+    default_detail = "Lot does not have enough unreserved supply"
+
+
 class TransactionPaymentTimeExpired(APIException):
     default_status_code = status.HTTP_400_BAD_REQUEST
     default_code = "time_expired"
@@ -69,6 +82,48 @@ class TradeForYourselfException(APIException):
     default_detail = "You cannot trade to yourself"
 
 
+class BatchTooLargeException(APIException):
+    default_status_code = status.HTTP_400_BAD_REQUEST
+    default_code = "batch_too_large"
+    default_detail = "Too many trades in one batch"
+
+
+class LookupTooLargeException(APIException):
+    default_status_code = status.HTTP_400_BAD_REQUEST
+    default_code = "lookup_too_large"
+    default_detail = "Too many keys in one lookup"
+
+
+class UnsupportedFilterException(APIException):
+    default_status_code = status.HTTP_400_BAD_REQUEST
+    default_code = "unsupported_filter"
+    default_detail = "Filtering by trade types requires created_from"
+
+
+class RateLimitedException(APIException):
+    default_status_code = status.HTTP_429_TOO_MANY_REQUESTS
+    default_code = "rate_limited"
+    default_detail = "Too many requests, slow down"
+
+
+class ServiceOverloadedException(APIException):
+    default_status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_code = "overloaded"
+    default_detail = "Service is overloaded, try again later"
+
+
+class UpstreamUnavailable(APIException):
+    default_status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_code = "upstream_unavailable"
+    default_detail = "Dependent service is unavailable, try again later"
+
+
+class DeadlineExceeded(APIException):
+    default_status_code = status.HTTP_504_GATEWAY_TIMEOUT
+    default_code = "deadline_exceeded"
+    default_detail = "Request took too long to process, try again later"
+
+
 class SomethingWentWrongException(APIException):
     default_status_code = status.HTTP_500_INTERNAL_SERVER_ERROR
     default_code = "something_went_wrong"
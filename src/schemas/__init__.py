@@ -1,6 +1,13 @@
+from .lot import LotSnapshot
 from .transaction import (
     Transaction,
+    TransactionBatchItem,
+    TransactionCount,
     TransactionCreate,
+    TransactionFilter,
     TransactionInDBBase,
+    TransactionLookup,
+    TransactionSummary,
     TransactionUpdate,
 )
+from .transaction_transition import StateDuration, TransactionTransition
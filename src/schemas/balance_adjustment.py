@@ -0,0 +1,17 @@
+from decimal import Decimal
+
+from pydantic import BaseModel
+from pydantic.schema import UUID
+
+from db.models.balance_adjustment import AdjustmentKind
+from db.models.transaction import CryptoType, SellType
+
+
+class BalanceAdjustmentCreate(BaseModel):
+    transaction_id: UUID
+    idempotency_key: str
+    kind: AdjustmentKind
+    seller_email: str
+    amount: Decimal
+    crypto_type: CryptoType
+    sell_type: SellType
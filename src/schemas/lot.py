@@ -0,0 +1,25 @@
+from decimal import Decimal
+
+from pydantic import BaseModel, Field
+
+from db.models.transaction import CryptoType, FiatType, SellType
+
+
+class LotSnapshot(BaseModel):
+    """
+    The part of a lot from the lot service a trade is validated and priced against.
+    Limits and supply are in crypto units.
+    """
+
+    id: int
+    price: Decimal
+    min_limit: Decimal = Field(alias="minLimit")
+    max_limit: Decimal = Field(alias="maxLimit")
+    supply: Decimal
+    owner_email: str = Field(alias="ownerEmail")
+    crypto_type: CryptoType = Field(alias="cryptoType")
+    fiat_type: FiatType = Field(alias="fiatType")
+    lot_type: SellType = Field(alias="type")
+
+    class Config:
+        allow_population_by_field_name = True
@@ -1,4 +1,5 @@
 import datetime
+import enum
 from decimal import Decimal
 from typing import Optional
 
@@ -6,6 +7,7 @@ from pydantic import BaseModel, EmailStr, validator
 from pydantic.schema import UUID
 
 from db.models.transaction import CryptoType, FiatType, SellType, TransactionStatus
+from exceptions import APIException
 
 
 class TransactionBase(BaseModel):
@@ -30,7 +32,7 @@ class TransactionCreate(BaseModel):
     seller_wallet: str
     seller_email: EmailStr
     amount: Decimal
-    price: Decimal
+    price: Optional[Decimal] = None  # Ignored, trades are priced from the lot
     crypto_type: CryptoType
     fiat_type: FiatType
     sell_type: SellType
@@ -44,6 +46,35 @@ class TransactionUpdate(BaseModel):
     hash: Optional[str]
 
 
+class SortOrder(str, enum.Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+class TransactionFilter(BaseModel):
+    status: Optional[TransactionStatus] = None
+    crypto_type: Optional[CryptoType] = None
+    fiat_type: Optional[FiatType] = None
+    sell_type: Optional[SellType] = None
+    created_from: Optional[datetime.datetime] = None
+    created_to: Optional[datetime.datetime] = None
+    order: SortOrder = SortOrder.DESC
+
+    @property
+    def has_type_filters(self) -> bool:
+        return any(value is not None for value in (self.crypto_type, self.fiat_type, self.sell_type))
+
+
+class CountMode(str, enum.Enum):
+    EXACT = "exact"
+    ESTIMATE = "estimate"
+
+
+class TransactionCount(BaseModel):
+    count: int
+    mode: CountMode
+
+
 class TransactionInDBBase(TransactionBase):
     id: Optional[UUID] = None
     status: str  # type: ignore
@@ -58,3 +89,48 @@ class TransactionInDBBase(TransactionBase):
 
 class Transaction(TransactionInDBBase):
     pass
+
+
+class TransactionLookup(BaseModel):
+    """Trades matching any of the keys; every key type is answered by one query."""
+
+    ids: list[UUID] = []
+    hashes: list[str] = []
+    lot_ids: list[int] = []
+
+    @property
+    def size(self) -> int:
+        return len(self.ids) + len(self.hashes) + len(self.lot_ids)
+
+
+class TransactionSummary(BaseModel):
+    """Compact trade for service-to-service lookups: the keys, parties, amounts and state."""
+
+    id: UUID
+    lot_id: int
+    hash: Optional[str]
+    status: str
+    seller_email: str
+    buyer_email: str
+    amount: Decimal
+    fiat_amount: Decimal
+    crypto_type: CryptoType
+    fiat_type: FiatType
+    sell_type: SellType
+    created_at: datetime.datetime
+    updated_at: Optional[datetime.datetime]
+    closed_on: Optional[datetime.datetime]
+    expires_at: Optional[datetime.datetime]
+
+    @validator("status", pre=True)
+    def transaction_status_to_str(cls, v: int) -> str:
+        return str(TransactionStatus(v).name)
+
+    class Config:
+        orm_mode = True
+
+
+class TransactionBatchItem(BaseModel):
+    index: int
+    transaction: Optional[Transaction] = None
+    error: Optional[APIException.Schema] = None
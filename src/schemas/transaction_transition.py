@@ -0,0 +1,41 @@
+import datetime
+from typing import Optional
+
+from pydantic import BaseModel, validator
+from pydantic.schema import UUID
+
+from db.models.transaction import TransactionStatus
+
+
+class TransactionTransitionCreate(BaseModel):
+    transaction_id: UUID
+    from_status: Optional[TransactionStatus]
+    to_status: TransactionStatus
+    actor: str
+
+
+class TransactionTransition(BaseModel):
+    from_status: Optional[str]
+    to_status: str
+    actor: str
+    created_at: datetime.datetime
+
+    @validator("from_status", "to_status", pre=True)
+    def transaction_status_to_str(cls, v: Optional[int]) -> Optional[str]:
+        return TransactionStatus(v).name if v is not None else None
+
+    class Config:
+        orm_mode = True
+
+
+class StateDuration(BaseModel):
+    """Time trades spent in a status, over the trades that left it within the window. In seconds."""
+
+    status: str
+    since: datetime.datetime
+    until: datetime.datetime
+    count: int
+    mean: Optional[float]
+    p50: Optional[float]
+    p95: Optional[float]
+    max: Optional[float]